@@ -0,0 +1,131 @@
+"""
+Gunicorn settings for the web process, tuned through environment variables.
+
+Run with ``gunicorn -c gunicorn.conf.py pongboard.wsgi``. Worker counts
+follow the CPUs the container may use (its cgroup quota, not the host's
+CPU count), so a pod gets as many workers as its resource limits pay for.
+
+GUNICORN_WORKER_CLASS  gthread (default), sync, or gevent for the live leaderboard streams
+WEB_CONCURRENCY        worker processes, CPUs for gthread and gevent and 2 * CPUs + 1 for sync by default
+WEB_THREADS            threads per gthread worker, 32 by default
+GUNICORN_WORKER_CONNECTIONS  open connections per gevent worker, 1000 by default
+GUNICORN_PRELOAD       load the app once before forking the workers, on by default except for gevent
+GUNICORN_MAX_REQUESTS  requests before a worker is replaced, 1000 by default, with 10% jitter
+GUNICORN_TIMEOUT       seconds a worker may be silent before it is killed, 120 by default
+GUNICORN_KEEPALIVE     seconds to hold idle client connections, 75 by default
+DATABASE_MAX_CONNECTIONS  database connections this server may open, warned about when exceeded
+"""
+import math
+import os
+
+
+def available_cpus():
+    """Return the CPUs this process may use, from the cgroup CPU quota when one is set."""
+    cpus = os.cpu_count() or 1
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:  # cgroup v2
+            quota, period = f.read().split()
+    except OSError:
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f, open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as g:
+                quota, period = f.read().strip(), g.read().strip()
+        except OSError:  # occurs outside of containers
+            return cpus
+    if quota in ('max', '-1'):  # occurs when the container has no CPU limit
+        return cpus
+    return max(1, min(cpus, math.ceil(int(quota) / int(period))))
+
+
+def env_int(name, default):
+    return int(os.environ.get(name) or default)
+
+
+CPUS = available_cpus()
+
+bind = os.environ.get('GUNICORN_BIND') or f'0.0.0.0:{os.environ.get("PORT", "8000")}'
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class == 'gthread':
+    # one process per CPU as the GIL runs one thread at a time, and threads to wait on the
+    # database and to hold the mostly idle live leaderboard streams
+    workers = env_int('WEB_CONCURRENCY', CPUS)
+    threads = env_int('WEB_THREADS', 32)
+elif worker_class == 'sync':
+    workers = env_int('WEB_CONCURRENCY', 2 * CPUS + 1)
+    threads = 1
+elif worker_class == 'gevent':
+    # live leaderboard streams are idle connections waiting on a queue, so one greenlet per
+    # stream lets a worker hold hundreds of displays (see the stream process in the Procfile)
+    workers = env_int('WEB_CONCURRENCY', CPUS)
+    threads = 1
+    worker_connections = env_int('GUNICORN_WORKER_CONNECTIONS', 1000)
+else:
+    raise ValueError(f'Unsupported GUNICORN_WORKER_CLASS {worker_class!r}, expected gthread, sync or gevent.')
+
+# the app is imported once and its memory shared by the forked workers; gevent workers patch the
+# standard library when they start, so they import the app themselves afterwards
+preload_app = os.environ.get('GUNICORN_PRELOAD', '0' if worker_class == 'gevent' else '1').lower() not in (
+    '0', 'false', 'no'
+)
+
+# replacing workers now and then bounds leaks; the jitter keeps them from restarting together
+max_requests = env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = env_int('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+
+# editing a match replays the league's whole history within the request, which takes a while
+# on long histories; graceful_timeout lets running replays finish on restarts
+timeout = env_int('GUNICORN_TIMEOUT', 120)
+graceful_timeout = env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+
+# longer than the 60 second upstream keepalive of the ingress, so it never reuses a closed connection
+keepalive = env_int('GUNICORN_KEEPALIVE', 75)
+
+# the worker heartbeat file, kept in memory rather than on the container's overlay filesystem
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = '-'
+errorlog = '-'
+
+# full Elo replays fork LEADERBOARD_REPLAY_WORKERS processes, so the workers share the CPUs
+os.environ.setdefault('LEADERBOARD_REPLAY_WORKERS', str(max(1, CPUS // workers)))
+
+
+def on_starting(server):
+    """Remove the metrics files of an earlier run, whose pids the new workers may reuse."""
+    import shutil
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pongboard.settings')
+    from django.conf import settings
+
+    shutil.rmtree(settings.LEADERBOARD_METRICS_DIR, ignore_errors=True)
+
+
+def when_ready(server):
+    """Log the worker model and the database connections it can open."""
+    if worker_class == 'gevent':
+        # streams close their connection before waiting on events, so a worker mostly holds the one
+        # of its broadcaster
+        server.log.info('%s gevent workers with up to %s open connections each on %s CPUs',
+                        workers, worker_connections, CPUS)
+        return
+    connections = workers * threads  # every thread keeps its own connection for DATABASE_CONN_MAX_AGE
+    server.log.info('%s %s workers with %s threads each on %s CPUs, up to %s database connections',
+                    workers, worker_class, threads, CPUS, connections)
+    max_connections = os.environ.get('DATABASE_MAX_CONNECTIONS')
+    if max_connections and connections > int(max_connections):
+        server.log.warning('Workers can open %s database connections, more than DATABASE_MAX_CONNECTIONS=%s; '
+                           'lower WEB_CONCURRENCY or WEB_THREADS', connections, max_connections)
+
+
+def pre_fork(server, worker):
+    """Close connections opened while preloading the app, so workers never share one."""
+    from django.db import connections
+
+    connections.close_all()
+
+
+def post_fork(server, worker):
+    """Make psycopg2 wait on the gevent hub instead of blocking the whole worker."""
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+
+        patch_psycopg()
@@ -1,6 +1,10 @@
 from django.contrib import admin
 
-from leaderboard.models import Player, Match, PlayerRating
+from leaderboard.models import League, Player, Match, PlayerRating, RatingAdjustment, RequestProfile, Webhook
 
+admin.site.register(League)
 admin.site.register(Player)
 admin.site.register(Match)
+admin.site.register(RatingAdjustment)
+admin.site.register(Webhook)
+admin.site.register(RequestProfile)
@@ -0,0 +1,503 @@
+"""JSON endpoints of the leaderboard."""
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+from django.db import connection, transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import etag, require_GET, require_POST
+
+from leaderboard.caching import SEASON_ODDS, get_for_ratings, get_ratings_version
+from leaderboard.forms import MatchForm
+from leaderboard import scoring
+from leaderboard.live import event_stream
+from leaderboard.matchmaking import expected_score_matrix, suggest_matches
+from leaderboard.models import RANKED_MIN_GAMES, ChangeLogEntry, LiveGame, Match, Player, PlayerRating, SubmissionKey
+from leaderboard.ratelimit import write_rate_limited
+from leaderboard.views import get_league
+
+DEFAULT_SIMULATIONS = 10000
+MAX_SIMULATIONS = 100000
+MAX_ROUNDS = 10
+MAX_SIMULATED_FIXTURES = 10000000  # fixtures times simulations run in one request
+DEFAULT_MATCHES = 20
+MAX_MATCHES = 200
+MAX_BATCH_MATCHES = 500
+DEFAULT_CHANGES = 500
+MAX_CHANGES = 1000
+
+PLAYER_FIELDS = (
+    'id', 'name', 'rank', 'rating', 'games_played', 'wins', 'draws', 'losses', 'points_won', 'points_lost',
+    'win_percent', 'points_per_game', 'avg_point_differential',
+)
+MATCH_FIELDS = (
+    'id', 'datetime', 'winner_id', 'winner', 'winning_score', 'winner_delta',
+    'loser_id', 'loser', 'losing_score', 'loser_delta', 'draw',
+)
+
+
+def parse_fixtures(value, player_ids):
+    """Parse fixtures given as comma separated `player-opponent` id pairs."""
+    if not value:
+        return None
+    fixtures = []
+    for fixture in value.split(','):
+        try:
+            player_id, opponent_id = (int(part) for part in fixture.split('-'))
+        except ValueError:
+            raise ValueError(f'Invalid fixture {fixture!r}, expected `player_id-opponent_id`.')
+        if player_id not in player_ids or opponent_id not in player_ids:
+            raise ValueError(f'Unknown player in fixture {fixture!r}.')
+        if player_id == opponent_id:
+            raise ValueError(f'Invalid fixture {fixture!r}, a player can\'t play themselves.')
+        fixtures.append((player_id, opponent_id))
+    return fixtures
+
+
+def parse_player_ids(value, player_ids):
+    """Parse a comma separated list of player ids, defaulting to all players and ignoring repeats."""
+    if not value:
+        return list(player_ids)
+    try:
+        # a repeated player would be paired with itself and index the same row twice
+        selected = list(OrderedDict.fromkeys(int(player_id) for player_id in value.split(',')))
+    except ValueError:
+        raise ValueError('Players must be a comma separated list of ids.')
+    unknown = set(selected) - set(player_ids)
+    if unknown:
+        raise ValueError(f'Unknown players {sorted(unknown)}.')
+    return selected
+
+
+def parse_fields(value, available):
+    """Parse a comma separated list of fields to return, defaulting to all fields."""
+    if not value:
+        return available
+    fields = value.split(',')
+    unknown = set(fields) - set(available)
+    if unknown:
+        raise ValueError(f'Unknown fields {sorted(unknown)}, expected some of {list(available)}.')
+    return fields
+
+
+def parse_limit(value, default, maximum):
+    """Parse the number of rows to return."""
+    try:
+        limit = int(value) if value else default
+    except ValueError:
+        raise ValueError('Limit must be a number.')
+    if not 1 <= limit <= maximum:
+        raise ValueError(f'Limit must be 1 to {maximum}.')
+    return limit
+
+
+def parse_cursor(value):
+    """Parse the sequence number to continue a change feed from, defaulting to the start."""
+    try:
+        cursor = int(value) if value else 0
+    except ValueError:
+        raise ValueError('Since must be a sequence number.')
+    if cursor < 0:
+        raise ValueError('Since must be a sequence number.')
+    return cursor
+
+
+def project(rows, fields):
+    """Return the rows with only the given fields."""
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+def ranked_rows(league_id):
+    """Return the leaderboard rows of the league with their rank, None for unranked players."""
+    rows = PlayerRating.get_leaderboard(league_id)
+    rank = 0
+    for row in rows:
+        if row['games_played'] >= RANKED_MIN_GAMES:
+            rank += 1
+            row['rank'] = rank
+        else:
+            row['rank'] = None
+    return rows
+
+
+def match_rows(matches):
+    """Return compact rows of the given match queryset without loading model instances."""
+    rows = matches.values(
+        'id', 'datetime', 'winner_id', 'winner__first_name', 'winner__last_name', 'winning_score', 'winner_delta',
+        'loser_id', 'loser__first_name', 'loser__last_name', 'losing_score', 'loser_delta', 'draw',
+    )
+    for row in rows:
+        row['winner'] = f'{row.pop("winner__first_name")} {row.pop("winner__last_name")}'
+        row['loser'] = f'{row.pop("loser__first_name")} {row.pop("loser__last_name")}'
+        yield row
+
+
+def ratings_etag(request, league_slug=None, **kwargs):
+    """
+    Return an ETag for responses derived from the league's players and matches.
+
+    Every player or match write bumps the ratings version of its league, so
+    the version identifies the data behind the response.
+    """
+    version = get_ratings_version(get_league(league_slug).id)
+    return hashlib.md5(f'{version}:{request.get_full_path()}'.encode()).hexdigest()
+
+
+@require_GET
+@etag(ratings_etag)
+def leaderboard(request, league_slug=None):
+    """Return the ranked and unranked players with their stats as JSON."""
+    try:
+        fields = parse_fields(request.GET.get('fields'), PLAYER_FIELDS)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    rows = ranked_rows(get_league(league_slug).id)
+    return JsonResponse({
+        'ranked': project([row for row in rows if row['rank'] is not None], fields),
+        'unranked': project([row for row in rows if row['rank'] is None], fields),
+    })
+
+
+@require_GET
+@etag(ratings_etag)
+def players(request, league_slug=None):
+    """Return every player with their stats as JSON, ordered by name."""
+    try:
+        fields = parse_fields(request.GET.get('fields'), PLAYER_FIELDS)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    rows = sorted(ranked_rows(get_league(league_slug).id), key=lambda row: row['name'])
+    return JsonResponse({'players': project(rows, fields)})
+
+
+@require_GET
+@etag(ratings_etag)
+def player(request, player_id, league_slug=None):
+    """Return a player's stats and recent matches as JSON."""
+    try:
+        fields = parse_fields(request.GET.get('fields'), PLAYER_FIELDS)
+        limit = parse_limit(request.GET.get('limit'), DEFAULT_MATCHES, MAX_MATCHES)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    league = get_league(league_slug)
+    row = next((row for row in ranked_rows(league.id) if row['id'] == int(player_id)), None)
+    if row is None:
+        return JsonResponse({'error': f'Unknown player {player_id}.'}, status=404)
+    matches = Match.objects.filter(Q(winner_id=row['id']) | Q(loser_id=row['id']), league=league)
+    return JsonResponse({
+        'player': project([row], fields)[0],
+        'recent_matches': list(match_rows(matches.order_by('-datetime')[:limit])),
+    })
+
+
+@require_GET
+@etag(ratings_etag)
+def matches(request, league_slug=None):
+    """Return the most recent matches as JSON."""
+    try:
+        fields = parse_fields(request.GET.get('fields'), MATCH_FIELDS)
+        limit = parse_limit(request.GET.get('limit'), DEFAULT_MATCHES, MAX_MATCHES)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    recent_matches = Match.get_recent_matches(num_matches=limit, league_id=get_league(league_slug).id)
+    return JsonResponse({'matches': project(match_rows(recent_matches), fields)})
+
+
+@require_GET
+def changes(request, league_slug=None):
+    """
+    Return a page of the changes after the ``since`` sequence number as JSON.
+
+    Clients pass the returned ``next`` cursor as ``since`` until ``has_more``
+    is false, then keep polling with it to sync incrementally.
+    """
+    try:
+        since = parse_cursor(request.GET.get('since'))
+        limit = parse_limit(request.GET.get('limit'), DEFAULT_CHANGES, MAX_CHANGES)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    page = ChangeLogEntry.get_page(get_league(league_slug).id, since=since, limit=limit + 1)
+    return JsonResponse({
+        'changes': page[:limit],
+        'next': page[:limit][-1]['seq'] if page else since,
+        'has_more': len(page) > limit,
+    })
+
+
+@require_GET
+def stream(request, league_slug=None):
+    """Stream the league's leaderboard as server-sent events, updated whenever a match is recorded."""
+    league = get_league(league_slug)
+    if not connection.in_atomic_block:
+        connection.close()  # streams stay open for hours but only wait on their queue
+    response = StreamingHttpResponse(event_stream(league.id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # stop proxies from buffering the events
+    return response
+
+
+def parse_json_body(request):
+    """Return the JSON object posted in the request body."""
+    try:
+        payload = json.loads(request.body.decode())
+    except ValueError:
+        raise ValueError('Expected a JSON object.')
+    if not isinstance(payload, dict):
+        raise ValueError('Expected a JSON object.')
+    return payload
+
+
+def live_state(state):
+    """Return the parts of a live game state shown to scorers and spectators."""
+    return {field: state[field] for field in ('id', 'players', 'names', 'score', 'log', 'started')}
+
+
+def get_live_state(game_id, league):
+    """Return the live state of a game of the league, raising LiveGame.DoesNotExist if there's none."""
+    state = scoring.get_state(int(game_id))
+    if state['league_id'] != league.id:
+        raise LiveGame.DoesNotExist(f'No live game {game_id}.')
+    return state
+
+
+def live_games(request, league_slug=None):
+    """List the league's live games as JSON, or start scoring a new one on POST."""
+    league = get_league(league_slug)
+    if request.method == 'GET':
+        return JsonResponse({'games': [live_state(state) for state in scoring.get_live_states(league.id)]})
+    if request.method != 'POST':
+        return HttpResponse(status=405)
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    try:
+        payload = parse_json_body(request)
+        player_a = Player.objects.get(pk=int(payload['player_a']), league=league)
+        player_b = Player.objects.get(pk=int(payload['player_b']), league=league)
+        state = scoring.start_game(league, player_a, player_b)
+    except (KeyError, TypeError, ValueError, Player.DoesNotExist):
+        return JsonResponse({'error': 'Expected player_a and player_b, two different players of the league.'},
+                            status=400)
+    return JsonResponse(live_state(state), status=201)
+
+
+@require_GET
+def live_game(request, game_id, league_slug=None):
+    """Return the score of a live game as JSON, from the cache rather than the match tables."""
+    try:
+        state = get_live_state(game_id, get_league(league_slug))
+    except LiveGame.DoesNotExist as error:
+        return JsonResponse({'error': str(error)}, status=404)
+    return JsonResponse(live_state(state))
+
+
+@require_POST
+def live_point(request, game_id, league_slug=None):
+    """
+    Record the winner of a rally of a live game.
+
+    Expects ``{"side": "a" | "b" | "undo", "seq": <points played so far>}``;
+    a seq that doesn't match the game gets a 409 with the current state.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    try:
+        get_live_state(game_id, get_league(league_slug))
+        payload = parse_json_body(request)
+        state = scoring.record_point(int(game_id), payload.get('side'), int(payload.get('seq', -1)))
+    except LiveGame.DoesNotExist as error:
+        return JsonResponse({'error': str(error)}, status=404)
+    except scoring.ScoreConflict as conflict:
+        return JsonResponse(dict(live_state(conflict.state), error=str(conflict)), status=409)
+    except (TypeError, ValueError) as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse(live_state(state))
+
+
+@require_POST
+@write_rate_limited
+def finish_live_game(request, game_id, league_slug=None):
+    """Save the final score of a live game as a match, updating the ratings once."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    try:
+        get_live_state(game_id, get_league(league_slug))
+        match = scoring.finish_game(int(game_id))
+    except LiveGame.DoesNotExist as error:
+        return JsonResponse({'error': str(error)}, status=404)
+    except ValueError as error:
+        errors = error.args[0]
+        return JsonResponse({'error': 'Invalid result.', 'errors': {
+            field: [str(message) for message in messages] for field, messages in errors.items()
+        }}, status=400)
+    return JsonResponse(next(match_rows(Match.objects.filter(pk=match.pk))), status=201)
+
+
+@require_POST
+@write_rate_limited
+def submit_matches(request, league_slug=None):
+    """
+    Add a batch of match results, e.g. a whole tournament night, with one rating update.
+
+    Expects a JSON body ``{"matches": [...], "partial": false}`` where every
+    match has the fields of MatchForm and is validated with its rules. Any
+    invalid match rejects the batch unless partial is set, in which case the
+    valid matches are added and the errors returned per item.
+
+    Retries sending the same ``Idempotency-Key`` header within a day get the
+    response of the first submission without adding the matches again; the
+    key sent with a different body gets a 422.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    idempotency_key = request.META.get('HTTP_IDEMPOTENCY_KEY')
+    request_hash = SubmissionKey.hash_request(request.body)
+    if idempotency_key:
+        previous = SubmissionKey.get_previous(request.user, idempotency_key)
+        if previous is not None:
+            return replayed_response(previous, request_hash)
+    try:
+        payload = json.loads(request.body.decode())
+        items = payload['matches']
+        partial = bool(payload.get('partial', False))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return JsonResponse({'error': 'Expected a JSON object with a list of matches.'}, status=400)
+    if not isinstance(items, list) or not 1 <= len(items) <= MAX_BATCH_MATCHES:
+        return JsonResponse({'error': f'Matches must be a list of 1 to {MAX_BATCH_MATCHES} results.'}, status=400)
+    league = get_league(league_slug)
+    new_matches, errors = [], []
+    for index, item in enumerate(items):
+        form = MatchForm(data=item, league=league) if isinstance(item, dict) else None
+        if form is not None and form.is_valid():
+            new_matches.append(form.save(commit=False))
+        else:
+            item_errors = {'__all__': ['Expected an object.']} if form is None else form.errors
+            errors.append({'index': index, 'errors': {
+                field: [str(message) for message in messages] for field, messages in item_errors.items()
+            }})
+    if errors and not partial:
+        return JsonResponse({'error': 'Invalid matches, nothing was added.', 'errors': errors}, status=400)
+    with transaction.atomic():
+        submission = SubmissionKey.claim(request.user, idempotency_key, request_hash) if idempotency_key else None
+        if idempotency_key and submission is None:  # occurs when a concurrent retry got there first
+            return replayed_response(SubmissionKey.get_previous(request.user, idempotency_key), request_hash)
+        Match.create_batch(new_matches, league.id)
+        player_ids = {player_id for match in new_matches for player_id in (match.winner_id, match.loser_id)}
+        ratings = dict(PlayerRating.objects.filter(player_id__in=player_ids).values_list('player_id', 'rating'))
+        response = JsonResponse({'created': len(new_matches), 'errors': errors, 'ratings': ratings}, status=201)
+        if submission is not None:
+            submission.status = response.status_code
+            submission.response = response.content.decode()
+            submission.save()
+    return response
+
+
+def replayed_response(submission, request_hash):
+    """Return the stored response of an already processed submission, or a 422 if it had another body."""
+    if submission.request_hash != request_hash:
+        return JsonResponse({'error': 'The Idempotency-Key was already used for a different request.'}, status=422)
+    response = HttpResponse(submission.response, status=submission.status, content_type='application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+@require_GET
+def season_odds(request, league_slug=None):
+    """
+    Return each player's probability of finishing in each rank as JSON.
+
+    The odds of a single round robin are precomputed by ``simulate_season
+    --cache`` in the background; other fixtures, rounds or numbers of
+    simulations are simulated within the request, up to a budget.
+    """
+    league = get_league(league_slug)
+    players = {
+        player['id']: player
+        for player in Player.objects.filter(league=league).values('id', 'first_name', 'last_name', 'rating')
+    }
+    try:
+        fixtures = parse_fixtures(request.GET.get('fixtures'), players)
+        rounds = int(request.GET.get('rounds', 1))
+        num_simulations = int(request.GET.get('simulations', DEFAULT_SIMULATIONS))
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    if not 1 <= num_simulations <= MAX_SIMULATIONS or not 1 <= rounds <= MAX_ROUNDS:
+        return JsonResponse({'error': f'Simulations must be 1 to {MAX_SIMULATIONS} and rounds 1 to {MAX_ROUNDS}.'},
+                            status=400)
+    num_fixtures = len(fixtures) if fixtures is not None else len(players) * (len(players) - 1) // 2 * rounds
+    if num_fixtures * num_simulations > MAX_SIMULATED_FIXTURES:
+        return JsonResponse({'error': f'Fixtures times simulations must be at most {MAX_SIMULATED_FIXTURES}, '
+                                      f'got {num_fixtures} fixtures.'}, status=400)
+    if fixtures is None and rounds == 1 and num_simulations == DEFAULT_SIMULATIONS:
+        precomputed = get_for_ratings(SEASON_ODDS, league.id)
+        if precomputed is None:  # occurs until the background worker simulated the league once
+            response = JsonResponse({'error': 'The season odds are being computed, try again later.'}, status=503)
+            response['Retry-After'] = 60
+            return response
+        num_simulations, odds = precomputed['simulations'], precomputed['odds']
+    else:
+        odds = PlayerRating.get_season_odds(league.id, fixtures=fixtures, rounds=rounds,
+                                            num_simulations=num_simulations)
+    return JsonResponse({
+        'simulations': num_simulations,
+        'players': [
+            {
+                'id': player_id,
+                'name': f'{players[player_id]["first_name"]} {players[player_id]["last_name"]}',
+                'rating': players[player_id]['rating'],
+                'rank_probabilities': rank_probabilities,
+            }
+            for player_id, rank_probabilities in odds.items()
+            if player_id in players
+        ],
+    })
+
+
+@require_GET
+def win_probabilities(request, league_slug=None):
+    """Return the expected score of every player against every other player as JSON."""
+    ratings = PlayerRating.get_current_ratings(get_league(league_slug).id).ratings
+    try:
+        player_ids = parse_player_ids(request.GET.get('players'), ratings)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    matrix = expected_score_matrix([ratings[player_id] for player_id in player_ids])
+    return JsonResponse({'players': player_ids, 'expected_scores': matrix.round(4).tolist()})
+
+
+@require_GET
+def suggested_matches(request, league_slug=None):
+    """Return suggested pairings of the available players as JSON."""
+    ratings = PlayerRating.get_current_ratings(get_league(league_slug).id).ratings
+    try:
+        player_ids = parse_player_ids(request.GET.get('players'), ratings)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    index = {player_id: i for i, player_id in enumerate(player_ids)}
+    recent_meetings = np.zeros((len(player_ids), len(player_ids)))
+    since = timezone.now() - timedelta(days=settings.LEADERBOARD_MATCHMAKING_RECENT_DAYS)
+    pairs = (
+        Match.objects.filter(datetime__gte=since, winner__in=player_ids, loser__in=player_ids)
+        .values_list('winner_id', 'loser_id')
+        .annotate(meetings=Count('id'))
+        .order_by()
+    )
+    for winner_id, loser_id, meetings in pairs:
+        recent_meetings[index[winner_id], index[loser_id]] += meetings
+        recent_meetings[index[loser_id], index[winner_id]] += meetings
+    suggestions = suggest_matches([ratings[player_id] for player_id in player_ids], recent_meetings)
+    return JsonResponse({
+        'matches': [
+            {
+                'player': player_ids[player],
+                'opponent': player_ids[opponent],
+                'expected_score': round(expected_score, 4),
+                'quality': round(quality, 4),
+            }
+            for player, opponent, expected_score, quality in suggestions
+        ],
+    })
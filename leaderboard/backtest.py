@@ -0,0 +1,109 @@
+"""
+Backtesting of Elo parameters against the match history.
+
+Every candidate of a parameter grid (K factor, initial rating, draw
+handling) is replayed in the same pass over the history: ratings are kept
+as a ``(candidates, players)`` array and each match updates one column pair
+for all candidates at once. Before a match is applied its expected score is
+compared with the actual result to accumulate log-loss and Brier score.
+
+Elo predictions only depend on rating differences, so an initial rating
+shared by every player changes nothing. Players who play in the burn-in
+matches form the established pool and start from the default rating; the
+candidate's initial rating is the rating later debutants enter with against
+them.
+Large grids are split across a process pool. No Django imports.
+"""
+import itertools
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from leaderboard.rankings import DEFAULT_ELO_RATING, EloRating
+
+DRAW_HANDLING = ('half', 'ignore')
+
+Candidate = namedtuple('Candidate', 'k_factor initial_rating draw_handling')
+BacktestResult = namedtuple('BacktestResult', 'k_factor initial_rating draw_handling log_loss brier_score num_predictions')
+
+
+def parameter_grid(k_factors, initial_ratings, draw_handling=DRAW_HANDLING):
+    """Return every combination of the given parameters as Candidates."""
+    return [Candidate(*params) for params in itertools.product(k_factors, initial_ratings, draw_handling)]
+
+
+def get_debuts(winners, losers, num_players):
+    """Return the index of the first match of every player, the number of matches for players without one."""
+    debuts = np.full(num_players, len(winners))
+    match_indices = np.arange(len(winners))
+    np.minimum.at(debuts, winners, match_indices)
+    np.minimum.at(debuts, losers, match_indices)
+    return debuts
+
+
+def backtest(winners, losers, draws, candidates, num_players, burn_in=0, established_rating=DEFAULT_ELO_RATING):
+    """
+    Replay the history once for all candidates and score their predictions.
+
+    ``winners`` and ``losers`` are arrays of player indices below
+    ``num_players`` and ``draws`` a boolean array, all in chronological
+    order. Predictions for the first ``burn_in`` matches are not scored.
+    Players of those matches start from ``established_rating`` and the
+    others from the initial rating of the candidate.
+    """
+    k_factors = np.array([candidate.k_factor for candidate in candidates], dtype=float)
+    initial_ratings = np.array([candidate.initial_rating for candidate in candidates], dtype=float)
+    ignore_draws = np.array([candidate.draw_handling == 'ignore' for candidate in candidates])
+    established = get_debuts(winners, losers, num_players) < burn_in
+    ratings = np.where(established, float(established_rating), initial_ratings[:, np.newaxis])
+    log_loss = np.zeros(len(candidates))
+    brier_score = np.zeros(len(candidates))
+    num_predictions = np.zeros(len(candidates), dtype=int)
+    for i, (winner, loser, draw) in enumerate(zip(winners.tolist(), losers.tolist(), draws.tolist())):
+        winner_rating = ratings[:, winner]
+        loser_rating = ratings[:, loser]
+        expected_score = EloRating.calculate_expected_score(winner_rating, loser_rating)
+        actual_score = 0.5 if draw else 1.0
+        scored = ~ignore_draws if draw else slice(None)
+        if i >= burn_in:
+            clipped = np.clip(expected_score[scored], 1e-15, 1 - 1e-15)
+            log_loss[scored] -= actual_score * np.log(clipped) + (1 - actual_score) * np.log(1 - clipped)
+            brier_score[scored] += (expected_score[scored] - actual_score) ** 2
+            num_predictions[scored] += 1
+        change = k_factors * (actual_score - expected_score)
+        if draw:
+            change[ignore_draws] = 0
+        # round like EloRating.calculate_new_ratings so candidates match the live engine
+        ratings[:, winner] = np.round(winner_rating + change)
+        ratings[:, loser] = np.round(loser_rating - change)
+    counts = np.maximum(num_predictions, 1)
+    return [
+        BacktestResult(*candidate, log_loss=loss, brier_score=brier, num_predictions=count)
+        for candidate, loss, brier, count in zip(
+            candidates, (log_loss / counts).tolist(), (brier_score / counts).tolist(), num_predictions.tolist()
+        )
+    ]
+
+
+def parallel_backtest(winners, losers, draws, candidates, num_players, burn_in=0, workers=None,
+                      min_candidates_per_worker=64, established_rating=DEFAULT_ELO_RATING):
+    """Backtest candidates, splitting large grids across a process pool."""
+    workers = workers or 1
+    num_chunks = min(workers, len(candidates) // min_candidates_per_worker)
+    if num_chunks <= 1:
+        return backtest(
+            winners, losers, draws, candidates, num_players, burn_in=burn_in, established_rating=established_rating
+        )
+    chunks = [candidates[i::num_chunks] for i in range(num_chunks)]
+    with ProcessPoolExecutor(max_workers=num_chunks) as executor:
+        futures = [
+            executor.submit(backtest, winners, losers, draws, chunk, num_players, burn_in, established_rating)
+            for chunk in chunks
+        ]
+        results = [future.result() for future in futures]
+    # interleave the chunk results back into the order of the candidates
+    ordered = [None] * len(candidates)
+    for chunk_index, chunk_results in enumerate(results):
+        ordered[chunk_index::num_chunks] = chunk_results
+    return ordered
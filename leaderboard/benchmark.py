@@ -0,0 +1,196 @@
+"""
+Synthetic leagues and timings of the hot paths at several scales.
+
+``seed_league`` fills a league with players of hidden skill and a year of
+matches between them, written with ``bulk_create`` and rated with one
+replay. ``run_benchmarks`` times the pages, the match submission and the
+rating code against seeded leagues of each scale and returns the results as
+a JSON serializable dict, so runs can be compared over time.
+"""
+import platform
+import random
+import statistics
+import time
+from datetime import timedelta
+
+import django
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from leaderboard.forms import MatchForm
+from leaderboard.models import League, Match, Player, PlayerRating
+from leaderboard.rankings import EloRating
+from leaderboard.views import all_matches, home_page
+
+DRAW_PROBABILITY = 0.02
+BULK_BATCH_SIZE = 5000
+
+
+def seed_league(league, num_players, num_matches, days=365, seed=None):
+    """
+    Add players and matches to the league and rate them, returning the seconds taken per step.
+
+    Some players play much more often than others, stronger players win more
+    often and close matches have closer scores, so queries and pages see
+    the skew of a real league.
+    """
+    rng = np.random.RandomState(seed)
+    timings = {}
+    started = time.perf_counter()
+    first_id = Player.objects.filter(league=league).count()
+    Player.objects.bulk_create(
+        Player(league=league, first_name='Player', last_name=f'{first_id + i + 1:07d}')
+        for i in range(num_players)
+    )
+    player_ids = np.array(
+        Player.objects.filter(league=league).order_by('-id').values_list('id', flat=True)[:num_players]
+    )
+    timings['players'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    skill = rng.normal(1500, 200, num_players)
+    activity = rng.pareto(1.5, num_players) + 1
+    activity /= activity.sum()
+    a = rng.choice(num_players, num_matches, p=activity)
+    b = rng.choice(num_players, num_matches, p=activity)
+    same = a == b
+    b[same] = (b[same] + rng.randint(1, num_players, same.sum())) % num_players
+    a_expected = 1 / (1 + 10 ** ((skill[b] - skill[a]) / 400))
+    a_wins = rng.random_sample(num_matches) < a_expected
+    winners, losers = np.where(a_wins, a, b), np.where(a_wins, b, a)
+    closeness = np.minimum(a_expected, 1 - a_expected) * 2  # 1 for even players, near 0 for mismatches
+    losing_scores = rng.binomial(6, closeness * 0.9)
+    draws = rng.random_sample(num_matches) < DRAW_PROBABILITY
+    winning_scores = np.where(draws, losing_scores, 7)
+    end = timezone.now()
+    offsets = np.sort(rng.random_sample(num_matches)) * days * 24 * 60 * 60
+    for start in range(0, num_matches, BULK_BATCH_SIZE):
+        Match.objects.bulk_create([
+            Match(
+                league=league, winner_id=int(player_ids[winners[i]]), loser_id=int(player_ids[losers[i]]),
+                winning_score=int(winning_scores[i]), losing_score=int(losing_scores[i]), draw=bool(draws[i]),
+                datetime=end - timedelta(seconds=days * 24 * 60 * 60 - float(offsets[i])),
+            )
+            for i in range(start, min(start + BULK_BATCH_SIZE, num_matches))
+        ])
+    timings['matches'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    PlayerRating.generate_ratings(league.id)
+    timings['ratings'] = time.perf_counter() - started
+    return timings
+
+
+def get_seeded_league(num_players, num_matches, fresh=False, seed=0):
+    """Return the benchmark league of the scale, seeding it unless it already exists."""
+    slug = f'benchmark-{num_players}-{num_matches}'
+    league = League.objects.filter(slug=slug).first()
+    if league is not None and fresh:
+        league.delete()
+        league = None
+    if league is None:
+        league = League.objects.create(name=f'Benchmark {num_players} players, {num_matches} matches', slug=slug)
+        seed_league(league, num_players, num_matches, seed=seed)
+    return league
+
+
+def measure(function, repeat):
+    """Run function repeat times and return timing statistics in milliseconds and the queries of the last run."""
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'repeat': repeat,
+        'min_ms': round(timings[0], 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'max_ms': round(timings[-1], 3),
+        'queries': len(queries),
+    }
+
+
+def render_view(view, request, league):
+    response = view(request, league_slug=league.slug)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+def benchmark_league(league, repeat):
+    """Return the timings of the hot paths against the league."""
+    factory = RequestFactory()
+    user = User(username='benchmark', is_staff=True)  # unsaved, renders the page with its forms
+    num_matches = Match.objects.filter(league=league).count()
+    last_page = max(1, (num_matches + 49) // 50)
+    player_ids = list(Player.objects.filter(league=league).values_list('id', flat=True))
+    results = {}
+
+    def request(path):
+        request = factory.get(path)
+        request.user = user
+        return request
+
+    results['home_page'] = measure(lambda: render_view(home_page, request(f'/leagues/{league.slug}/'), league), repeat)
+    for name, page in (('all_matches_first_page', 1), ('all_matches_last_page', last_page)):
+        results[name] = measure(
+            lambda: render_view(all_matches, request(f'/leagues/{league.slug}/matches/?page={page}'), league), repeat
+        )
+
+    def submit_match():
+        winner, loser = random.sample(player_ids, 2)
+        form = MatchForm(data={'winner': winner, 'loser': loser, 'winning_score': 7, 'losing_score': 3},
+                         league=league)
+        if not form.is_valid():
+            raise ValueError(form.errors)
+        form.save()
+
+    with transaction.atomic():  # rolled back so the league stays the same for later runs
+        results['match_submission'] = measure(submit_match, repeat)
+        transaction.set_rollback(True)
+
+    with transaction.atomic():
+        results['generate_ratings'] = measure(lambda: PlayerRating.generate_ratings(league.id), max(1, repeat // 5))
+        transaction.set_rollback(True)
+    return results
+
+
+def elo_throughput(num_players, num_updates, seed=0):
+    """Return the number of EloRating.update_ratings calls per second over random pairings."""
+    rng = random.Random(seed)
+    pairs = [tuple(rng.sample(range(num_players), 2)) for _ in range(num_updates)]
+    elo_rating = EloRating()
+    started = time.perf_counter()
+    for winner, loser in pairs:
+        elo_rating.update_ratings(winner, loser)
+    return round(num_updates / (time.perf_counter() - started))
+
+
+def run_benchmarks(scales, repeat=10, fresh=False, seed=0):
+    """Return environment details and the timings at every (players, matches) scale."""
+    results = []
+    for num_players, num_matches in scales:
+        started = time.perf_counter()
+        league = get_seeded_league(num_players, num_matches, fresh=fresh, seed=seed)
+        seeded = time.perf_counter() - started
+        results.append({
+            'players': num_players,
+            'matches': num_matches,
+            'seed_seconds': round(seeded, 3),
+            'benchmarks': benchmark_league(league, repeat),
+            'elo_updates_per_second': elo_throughput(num_players, num_matches, seed),
+        })
+    return {
+        'datetime': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'results': results,
+    }
@@ -0,0 +1,71 @@
+"""
+Bootstrap confidence intervals for Elo ratings.
+
+The history is resampled (with replacement, keeping chronological order)
+or reshuffled many times and every sample is replayed with a vectorized Elo
+engine: ratings are a ``(samples, players)`` array and each step applies
+the i-th match of every sample at once. Batches of samples are spread
+across a process pool. No Django imports.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from leaderboard.rankings import DEFAULT_ELO_RATING, DEFAULT_K_FACTOR, EloRating
+
+RESAMPLING_METHODS = ('bootstrap', 'shuffle')
+
+
+def sample_ratings(winners, losers, draws, num_players, num_samples, method='bootstrap',
+                   k_factor=DEFAULT_K_FACTOR, initial_rating=DEFAULT_ELO_RATING, seed=None):
+    """Return the final ratings of each resampled history as a (samples, players) array."""
+    rng = np.random.default_rng(seed)
+    num_matches = len(winners)
+    if method == 'bootstrap':
+        indices = np.sort(rng.integers(0, num_matches, size=(num_samples, num_matches)), axis=1)
+    elif method == 'shuffle':
+        indices = np.argsort(rng.random((num_samples, num_matches)), axis=1)
+    else:
+        raise ValueError(f'Unknown resampling method {method!r}, choose from {RESAMPLING_METHODS}.')
+    sample_winners = winners[indices]
+    sample_losers = losers[indices]
+    actual_scores = np.where(draws[indices], 0.5, 1.0)
+    ratings = np.full((num_samples, num_players), float(initial_rating))
+    rows = np.arange(num_samples)
+    for i in range(num_matches):
+        winner, loser = sample_winners[:, i], sample_losers[:, i]
+        winner_rating, loser_rating = ratings[rows, winner], ratings[rows, loser]
+        change = k_factor * (actual_scores[:, i] - EloRating.calculate_expected_score(winner_rating, loser_rating))
+        ratings[rows, winner] = winner_rating + change
+        ratings[rows, loser] = loser_rating - change
+    return ratings
+
+
+def rating_intervals(winners, losers, draws, num_players, num_samples=500, confidence=0.95,
+                     method='bootstrap', workers=None, samples_per_worker=100, seed=None, **kwargs):
+    """
+    Return the lower, median and upper sampled rating of every player.
+
+    Samples are generated in batches of ``samples_per_worker`` on up to
+    ``workers`` processes, each with an independent random stream.
+    """
+    winners, losers, draws = np.asarray(winners), np.asarray(losers), np.asarray(draws, dtype=bool)
+    batch_sizes = [
+        min(samples_per_worker, num_samples - start) for start in range(0, num_samples, samples_per_worker)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    args = [
+        (winners, losers, draws, num_players, batch_size, method, kwargs.get('k_factor', DEFAULT_K_FACTOR),
+         kwargs.get('initial_rating', DEFAULT_ELO_RATING), batch_seed)
+        for batch_size, batch_seed in zip(batch_sizes, seeds)
+    ]
+    workers = min(workers or 1, len(args))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            batches = list(executor.map(sample_ratings, *zip(*args)))
+    else:
+        batches = [sample_ratings(*batch_args) for batch_args in args]
+    samples = np.concatenate(batches)
+    tail = (1 - confidence) / 2 * 100
+    lower, median, upper = np.percentile(samples, [tail, 50, 100 - tail], axis=0)
+    return lower, median, upper
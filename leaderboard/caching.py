@@ -0,0 +1,71 @@
+"""
+Cache keys tied to the current ratings of a league.
+
+Every write of a league's ratings bumps its version token, so results
+derived from the ratings (intervals, simulations, ...) can be cached under a
+key that includes the league and version and are never served once the
+ratings move on. Leagues never invalidate each other's results.
+
+Results computed in the background (``set_for_ratings``) are instead kept
+under one key per league with the version they were computed for, so the
+last result can be shown until the worker catches up with new ratings.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from leaderboard import metrics
+
+RATINGS_VERSION_KEY = 'leaderboard:{league_id}:ratings_version'
+RESULTS_KEY = 'leaderboard:{league_id}:{name}:latest'
+RATING_INTERVALS = 'rating_intervals'
+SEASON_ODDS = 'season_odds'
+
+
+def get_ratings_version(league_id):
+    """Return the token identifying the current ratings of the league."""
+    key = RATINGS_VERSION_KEY.format(league_id=league_id)
+    version = cache.get(key)
+    if version is None:  # occurs on first use or after the cache was cleared
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_ratings_version(league_id):
+    """Mark all results cached for the previous ratings of the league as stale."""
+    version = uuid.uuid4().hex
+    cache.set(RATINGS_VERSION_KEY.format(league_id=league_id), version, timeout=None)
+    return version
+
+
+def ratings_cache_key(name, league_id, version=None):
+    """Return the cache key for name under the given or current ratings version of the league."""
+    return f'leaderboard:{league_id}:{name}:{version or get_ratings_version(league_id)}'
+
+
+def set_for_ratings(name, league_id, value, version):
+    """Cache value under name as computed for the given ratings version of the league, replacing older results."""
+    cache.set(RESULTS_KEY.format(league_id=league_id, name=name), (version, value),
+              timeout=settings.LEADERBOARD_RESULTS_CACHE_TIMEOUT)
+
+
+def get_computed_version(name, league_id):
+    """Return the ratings version the value cached under name was computed for, None if there's none."""
+    return cache.get(RESULTS_KEY.format(league_id=league_id, name=name), (None, None))[0]
+
+
+def get_for_ratings(name, league_id, default=None, fallback=True):
+    """
+    Return the value cached under name for the current ratings of the league.
+
+    Unless fallback is false, a value computed for earlier ratings is
+    returned while there's none for the current ratings yet.
+    """
+    version, value = cache.get(RESULTS_KEY.format(league_id=league_id, name=name), (None, None))
+    result = 'miss' if value is None else 'hit' if version == get_ratings_version(league_id) else 'stale'
+    metrics.inc('pongboard_results_cache_requests_total', {'name': name, 'result': result})
+    if result == 'miss' or result == 'stale' and not fallback:
+        return default
+    return value
@@ -1,7 +1,7 @@
 from django import forms
 from django.core.exceptions import ValidationError, NON_FIELD_ERRORS
 
-from leaderboard.models import Match, Player
+from leaderboard.models import League, Match, Player
 
 DUPLICATE_ERROR = 'Player has already been added with the same first and last name.'
 
@@ -14,10 +14,20 @@ class MatchForm(forms.ModelForm):
                                     widget=forms.Select(attrs={'class': 'form-control'}))
     draw = forms.CheckboxInput(attrs={'class': 'form-check-input'}),
 
-    def __init__(self, *args, **kwargs):
-        """Initialize form with initial winning score of 7."""
+    def __init__(self, *args, league=None, **kwargs):
+        """Initialize form with initial winning score of 7, limited to the players of the league."""
         super().__init__(*args, **kwargs)
         self.min_score = 7    
+        if league is not None:
+            self.instance.league = league
+            for field in ('winner', 'loser'):
+                self.fields[field].queryset = self.fields[field].queryset.filter(league=league)
+        if not self.is_bound:  # occurs for forms to render, bound forms validate without the choices
+            # both selects offer the same players, fetched once
+            field = self.fields['winner']
+            iterator = forms.models.ModelChoiceIterator(field)
+            choices = [('', field.empty_label)] + [iterator.choice(player) for player in field.queryset]
+            self.fields['winner'].choices = self.fields['loser'].choices = choices
         self.fields['winning_score'].initial = self.min_score
 
     class Meta():
@@ -39,9 +49,11 @@ class MatchForm(forms.ModelForm):
 
         if winner == loser:
             raise ValidationError('The winner and loser must be different players.')
+        if winning_score is None or losing_score is None:  # occurs when a score is missing or invalid
+            return cleaned_data
         if winning_score < self.min_score:
             if winning_score != losing_score:
-                raise ValidationError('Winning score must be ' + self.min_score + ' or greater (except Draw).')
+                raise ValidationError('Winning score must be ' + str(self.min_score) + ' or greater (except Draw).')
         if losing_score < 0:
             raise ValidationError('Losing score must be 0 or greater.')
         if winning_score == losing_score and draw == False:
@@ -64,9 +76,11 @@ class PlayerForm(forms.ModelForm):
     last_name = forms.CharField(widget=forms.TextInput(attrs={'class': 'form-control'}))
     rating = forms.IntegerField(widget=forms.NumberInput(attrs={'class': 'form-control'}))
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, league=None, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['rating'].initial = 1450
+        if league is not None:
+            self.instance.league = league
 
     class Meta:
         model = Player
@@ -77,6 +91,16 @@ class PlayerForm(forms.ModelForm):
             }
         }
     
+    def validate_unique(self):
+        """Check names are unique within the player's league, which isn't a form field."""
+        if self.instance.league_id is None:
+            self.instance.league = League.get_default()
+        exclude = [field for field in self._get_validation_exclusions() if field != 'league']
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except ValidationError as e:
+            self._update_errors(e)
+
     def clean_first_name(self):
         """Capitalize first name."""
         return self.cleaned_data.get('first_name').capitalize()
@@ -0,0 +1,178 @@
+"""
+Live leaderboard updates for server-sent event streams.
+
+One ``Broadcaster`` per process polls the change log and fans every update
+out to the queues of the connected clients, so each update costs the same
+few queries per league however many displays are connected. Streams only
+wait on their queue and hold no database connection, so they are served by
+gevent workers with a greenlet each (see gunicorn.conf.py) rather than
+holding a worker thread each.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, close_old_connections, connection
+from django.db.models import Q
+
+from leaderboard import metrics
+from leaderboard.caching import RATING_INTERVALS, get_for_ratings
+from leaderboard.models import ChangeLogEntry, League, Match
+
+logger = logging.getLogger(__name__)
+
+
+def format_event(event, data, event_id=None):
+    """Return a server-sent event carrying data as JSON."""
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines += [f'event: {event}', 'data: ' + json.dumps(data, cls=DjangoJSONEncoder)]
+    return '\n'.join(lines) + '\n\n'
+
+
+class Broadcaster(object):
+    """Polls the change log and pushes leaderboard updates to the queues of subscribed clients."""
+
+    def __init__(self, poll_interval=1.0, queue_size=10, batch_size=1000):
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.subscribers = {}  # league id to the set of client queues
+        self.snapshots = {}  # league id to the latest leaderboard event, for new clients
+        self.last_seqs = {}  # league id to the sequence number of its last change seen, only used by the poll
+        self.thread = None
+
+    def subscribe(self, league_id):
+        """Return a queue receiving the league's events, starting with the current leaderboard if known."""
+        client = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.subscribers.setdefault(league_id, set()).add(client)
+            snapshot = self.snapshots.get(league_id)
+        if snapshot is not None:
+            client.put_nowait(snapshot)
+        return client
+
+    def unsubscribe(self, league_id, client):
+        """Stop sending events to the client queue."""
+        with self.lock:
+            clients = self.subscribers.get(league_id, set())
+            clients.discard(client)
+            if not clients:  # occurs when the last client of the league disconnects
+                self.subscribers.pop(league_id, None)
+                self.snapshots.pop(league_id, None)
+
+    def start(self):
+        """Start the polling thread unless it is already running."""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='leaderboard-broadcaster', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        """Poll the change log until no clients are left."""
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    break
+            close_old_connections()
+            try:
+                self.poll()
+            except DatabaseError:
+                logger.exception('Polling the change log failed')
+                connection.close()  # occurs when the database went away, reconnect on the next poll
+            time.sleep(self.poll_interval)
+        metrics.set_gauge('pongboard_stream_clients', 0)
+        metrics.set_gauge('pongboard_stream_queued_events', 0)
+        metrics.process_metrics.flush(force=True)
+        connection.close()
+
+    def poll(self):
+        """Publish the leaderboard of every subscribed league with new changes or no snapshot yet."""
+        with self.lock:
+            league_ids = list(self.subscribers)
+        self.last_seqs = {
+            league_id: self.last_seqs[league_id] for league_id in league_ids if league_id in self.last_seqs
+        }
+        new_league_ids = [league_id for league_id in league_ids if league_id not in self.last_seqs]
+        if new_league_ids:  # occurs when a league gets its first client, its board is sent whole anyway
+            self.last_seqs.update(League.objects.filter(pk__in=new_league_ids).values_list('id', 'last_change_seq'))
+        new_matches = {}
+        if self.last_seqs:
+            # sequence numbers are per league and in commit order, so no change is ever skipped
+            after_last_seen = Q()
+            for league_id, last_seq in self.last_seqs.items():
+                after_last_seen |= Q(league_id=league_id, seq__gt=last_seq)
+            changes = ChangeLogEntry.objects.filter(after_last_seen).order_by('league_id', 'seq').values_list(
+                'seq', 'league_id', 'kind', 'object_id', 'data'
+            )[:self.batch_size]
+            for seq, league_id, kind, object_id, data in changes:
+                league_matches = new_matches.setdefault(league_id, set())
+                if kind == ChangeLogEntry.MATCH and 'winner_id' in json.loads(data):  # skips replayed deltas
+                    league_matches.add(object_id)
+                self.last_seqs[league_id] = seq
+        with self.lock:
+            leagues = [
+                league_id for league_id in self.subscribers
+                if league_id in new_matches or league_id not in self.snapshots
+            ]
+            clients = [client for league_clients in self.subscribers.values() for client in league_clients]
+        metrics.set_gauge('pongboard_stream_clients', len(clients))
+        metrics.set_gauge('pongboard_stream_queued_events', sum(client.qsize() for client in clients))
+        for league_id in leagues:
+            self.publish(league_id, *self.build_update(league_id, new_matches.get(league_id, ())))
+
+    def build_update(self, league_id, match_ids):
+        """Return the update event with the league's leaderboard and new matches, and the snapshot event."""
+        from leaderboard.api import match_rows, ranked_rows
+
+        rows = ranked_rows(league_id)
+        intervals = get_for_ratings(RATING_INTERVALS, league_id, {})
+        for row in rows:
+            row['interval'] = intervals.get(row['id'])
+        leaderboard = {
+            'ranked': [row for row in rows if row['rank'] is not None],
+            'unranked': [row for row in rows if row['rank'] is None],
+        }
+        matches = list(match_rows(Match.objects.filter(id__in=match_ids).order_by('datetime', 'id')))
+        last_seq = self.last_seqs.get(league_id)
+        return (
+            format_event('leaderboard', dict(leaderboard, matches=matches), last_seq),
+            format_event('leaderboard', dict(leaderboard, matches=[]), last_seq),
+        )
+
+    def publish(self, league_id, event, snapshot):
+        """Put the event on the queue of every client of the league."""
+        with self.lock:
+            if league_id not in self.subscribers:  # occurs when the last client left during the poll
+                return
+            self.snapshots[league_id] = snapshot
+            clients = list(self.subscribers[league_id])
+        for client in clients:
+            try:
+                client.put_nowait(event)
+            except queue.Full:  # occurs for stalled clients, any later update carries the whole board
+                pass
+
+
+broadcaster = Broadcaster(poll_interval=settings.LEADERBOARD_STREAM_POLL_SECONDS)
+
+
+def event_stream(league_id, keepalive=None, broadcaster=broadcaster):
+    """Yield the league's events for one client, with comments to keep the connection alive."""
+    keepalive = keepalive or settings.LEADERBOARD_STREAM_KEEPALIVE_SECONDS
+    client = broadcaster.subscribe(league_id)
+    broadcaster.start()
+    try:
+        yield f'retry: {int(broadcaster.poll_interval * 1000) + 1000}\n\n'
+        while True:
+            try:
+                yield client.get(timeout=keepalive)
+            except queue.Empty:
+                yield ': keepalive\n\n'  # also lets the server notice disconnected clients
+    finally:
+        broadcaster.unsubscribe(league_id, client)
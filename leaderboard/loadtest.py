@@ -0,0 +1,298 @@
+"""
+Concurrent load tests of the whole app, fully offline.
+
+Simulated users log in and then poll the leaderboard, browse the match
+list and submit matches in a weighted mix. They run as threads against the
+WSGI application in this process, or over HTTP against a local server such
+as gunicorn. The report has throughput, latency percentiles and status
+codes per action. The users log in with accounts created for the run, with
+a random password, and deleted when it ends. It also checks that the final ratings and match deltas
+equal a replay of the stored matches from scratch; a difference means
+concurrent rating updates overwrote each other or were applied out of order.
+On SQLite writers also wait for each other, so contention shows up in the
+submit latencies and as "database is locked" errors.
+"""
+import http.cookiejar
+import io
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+
+from leaderboard.models import Match, Player, PlayerRating, RatingAdjustment
+from leaderboard.rankings import replay_matches
+from leaderboard.replay import ReplayPipeline
+
+DEFAULT_MIX = {'poll': 50, 'home': 20, 'browse': 25, 'submit': 5}
+CSRF_INPUT = re.compile(rb'name=["\']csrfmiddlewaretoken["\'] value=["\']([^"\']+)')
+
+
+class WSGITransport(object):
+    """Sends requests of one user straight to the WSGI application, keeping its cookies."""
+
+    def __init__(self, application, host='localhost'):
+        self.application = application
+        self.host = host
+        self.cookies = {}
+
+    def request(self, method, path, data=None, headers=None):
+        """Return the status code, headers and body of the response."""
+        path, _, query = path.partition('?')
+        body = b'' if data is None else data
+        environ = {
+            'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': self.host, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': self.host,
+            'REMOTE_ADDR': '127.0.0.1', 'wsgi.version': (1, 0), 'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body), 'wsgi.errors': sys.stderr, 'wsgi.multithread': True,
+            'wsgi.multiprocess': False, 'wsgi.run_once': False, 'CONTENT_LENGTH': str(len(body)),
+        }
+        if self.cookies:
+            environ['HTTP_COOKIE'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        for name, value in (headers or {}).items():
+            key = name.upper().replace('-', '_')
+            environ[key if key == 'CONTENT_TYPE' else f'HTTP_{key}'] = value
+        started = []
+
+        def start_response(status, response_headers, exc_info=None):
+            started.append((int(status.split()[0]), response_headers))
+
+        result = self.application(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        status, response_headers = started[0]
+        for name, value in response_headers:
+            if name.lower() == 'set-cookie':
+                cookie_name, _, cookie_value = value.split(';')[0].partition('=')
+                self.cookies[cookie_name.strip()] = cookie_value
+        return status, dict(response_headers), content
+
+    def get_cookie(self, name):
+        return self.cookies.get(name)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+
+    def redirect_request(self, *args, **kwargs):
+        return None  # answers with the redirect itself, as the WSGI transport does
+
+
+class HTTPTransport(object):
+    """Sends requests of one user to a running server, keeping its cookies."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.jar = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.jar), NoRedirect)
+
+    def request(self, method, path, data=None, headers=None):
+        """Return the status code, headers and body of the response."""
+        request = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers or {})
+        try:
+            with self.opener.open(request, timeout=self.timeout) as response:
+                return response.status, dict(response.headers), response.read()
+        except urllib.error.HTTPError as error:  # non 2xx answers are results too
+            return error.code, dict(error.headers), error.read()
+
+    def get_cookie(self, name):
+        return next((cookie.value for cookie in self.jar if cookie.name == name), None)
+
+
+class SimulatedUser(object):
+    """Logs in and then runs a weighted mix of actions against one league."""
+
+    def __init__(self, transport, username, password, prefix, player_ids, num_pages, rng):
+        self.transport = transport
+        self.username = username
+        self.password = password
+        self.prefix = prefix
+        self.player_ids = player_ids
+        self.num_pages = num_pages
+        self.rng = rng
+        self.etag = None
+
+    def login(self):
+        _, _, content = self.transport.request('GET', '/accounts/login/')
+        token = CSRF_INPUT.search(content).group(1).decode()
+        status, _, _ = self.post_form('/accounts/login/', {
+            'username': self.username, 'password': self.password, 'csrfmiddlewaretoken': token,
+        })
+        if status != 302:
+            raise RuntimeError(f'Logging in {self.username} failed with {status}.')
+
+    def post_form(self, path, fields):
+        return self.transport.request('POST', path, urllib.parse.urlencode(fields).encode(), {
+            'Content-Type': 'application/x-www-form-urlencoded',
+        })
+
+    def poll(self):
+        """Fetch the leaderboard like a dashboard would, revalidating with the last ETag."""
+        headers = {'If-None-Match': self.etag} if self.etag else {}
+        status, response_headers, _ = self.transport.request('GET', f'{self.prefix}api/leaderboard/', headers=headers)
+        self.etag = response_headers.get('ETag', self.etag)
+        return status
+
+    def home(self):
+        return self.transport.request('GET', self.prefix)[0]
+
+    def browse(self):
+        return self.transport.request('GET', f'{self.prefix}matches/?page={self.rng.randint(1, self.num_pages)}')[0]
+
+    def submit(self):
+        winner, loser = self.rng.sample(self.player_ids, 2)
+        return self.post_form(self.prefix, {
+            'winner': winner, 'loser': loser, 'winning_score': 7, 'losing_score': self.rng.randint(0, 5),
+            'idempotency_key': uuid.uuid4().hex, 'csrfmiddlewaretoken': self.transport.get_cookie('csrftoken'),
+        })[0]
+
+
+def percentiles(latencies):
+    """Return latency percentiles in milliseconds of a list of seconds."""
+    if not latencies:
+        return {}
+    latencies = sorted(latencies)
+
+    def at(q):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 3)
+
+    return {'p50_ms': at(0.5), 'p90_ms': at(0.9), 'p95_ms': at(0.95), 'p99_ms': at(0.99), 'max_ms': at(1)}
+
+
+def check_ratings(league_id):
+    """Compare the stored ratings and match deltas of the league with a replay of its matches from scratch."""
+    if not PlayerRating.get_rating_system().incremental:
+        return {'checked': False, 'reason': 'the rating system is not incremental'}
+    records = list(ReplayPipeline(league_id=league_id).iter_matches())
+    elo_rating, updates = replay_matches(
+        ((record.winner_id, record.loser_id, record.is_draw) for record in records),
+        PlayerRating.get_starting_ratings(league_id),
+        adjustments=RatingAdjustment.get_replay_adjustments([record.datetime for record in records], league_id),
+    )
+    expected = elo_rating.ratings
+    stored = dict(PlayerRating.objects.filter(league_id=league_id).values_list('player_id', 'rating'))
+    differences = {
+        player_id: stored.get(player_id, 0) - rating for player_id, rating in expected.items()
+        if stored.get(player_id) != rating
+    }
+    wrong_deltas = sum(
+        (record.winner_delta, record.loser_delta) != tuple(update[2:]) for record, update in zip(records, updates)
+    )
+    return {
+        'checked': True,
+        'consistent': not differences and not wrong_deltas,
+        'players': len(expected),
+        'players_off': len(differences),
+        'max_rating_difference': max((abs(difference) for difference in differences.values()), default=0),
+        'matches_with_wrong_deltas': wrong_deltas,
+    }
+
+
+def run_load_test(league, users=10, duration=30, mix=None, url=None, think_time=0, seed=None):
+    """Run simulated users against the league for duration seconds and return the report."""
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    prefix = '/' if league.is_default else f'/leagues/{league.slug}/'
+    player_ids = list(Player.objects.filter(league=league).values_list('id', flat=True))
+    if len(player_ids) < 2:
+        raise ValueError('The league needs at least two players.')
+    matches_before = Match.objects.filter(league=league).count()
+    num_pages = max(1, (matches_before + 49) // 50)
+    # accounts of this run only, hashed once as they share the password
+    run = uuid.uuid4().hex[:8]
+    usernames = [f'loadtest-{run}-{i}' for i in range(users)]
+    password = secrets.token_urlsafe(16)
+    hashed_password = make_password(password)
+    User.objects.bulk_create(User(username=username, password=hashed_password) for username in usernames)
+    application = None if url else WSGIHandler()
+    results = defaultdict(list)  # action to (status, latency) pairs
+    errors = Counter()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    actions, weights = zip(*mix.items())
+
+    def simulate(i):
+        transport = HTTPTransport(url) if url else WSGITransport(application)
+        user = SimulatedUser(
+            transport, usernames[i], password, prefix, player_ids, num_pages, random.Random(rng.random())
+        )
+        try:
+            user.login()
+            while time.perf_counter() < deadline:
+                action = user.rng.choices(actions, weights)[0]
+                started = time.perf_counter()
+                try:
+                    status = getattr(user, action)()
+                except Exception as error:  # occurs for connection errors, counted rather than ending the user
+                    with lock:
+                        errors[f'{action}: {type(error).__name__}: {error}'] += 1
+                    continue
+                with lock:
+                    results[action].append((status, time.perf_counter() - started))
+                if think_time:
+                    time.sleep(user.rng.expovariate(1 / think_time))
+        except Exception as error:  # occurs when logging in fails
+            with lock:
+                errors[f'login: {type(error).__name__}: {error}'] += 1
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    try:
+        threads = [threading.Thread(target=simulate, args=(i,), name=f'loadtest-{i}') for i in range(users)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        User.objects.filter(username__in=usernames).delete()
+
+    total = sum(len(action_results) for action_results in results.values())
+    submitted = sum(status == 302 for status, _ in results.get('submit', ()))
+    return {
+        'target': url or 'in-process',
+        'database': connection.vendor,
+        'league': league.slug,
+        'users': users,
+        'seconds': round(elapsed, 3),
+        'requests': total,
+        'requests_per_second': round(total / elapsed, 1),
+        'actions': {
+            action: dict(
+                requests=len(action_results),
+                statuses={str(status): count for status, count in Counter(s for s, _ in action_results).items()},
+                **percentiles([latency for _, latency in action_results])
+            )
+            for action, action_results in sorted(results.items())
+        },
+        'errors': dict(errors),
+        'matches_submitted': submitted,
+        'matches_added': Match.objects.filter(league=league).count() - matches_before,
+        'ratings': check_ratings(league.id),
+    }
+
+
+def parse_mix(value):
+    """Parse a mix like poll=50,home=20,browse=25,submit=5 into action weights."""
+    mix = {}
+    for part in value.split(','):
+        action, _, weight = part.partition('=')
+        if action not in DEFAULT_MIX:
+            raise ValueError(f'Unknown action {action!r}, expected {", ".join(DEFAULT_MIX)}.')
+        mix[action] = float(weight)
+    return mix
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from leaderboard.models import League, Player, RatingAdjustment
+
+
+class Command(BaseCommand):
+    help = ('Decay the ratings of inactive players in one bulk update (run daily, e.g. from cron). Players who '
+            'never played a match keep the rating they were added with.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weeks', type=int, default=settings.LEADERBOARD_DECAY_INACTIVE_WEEKS,
+                            help='Decay players who haven\'t played for this many weeks.')
+        parser.add_argument('--points', type=int, default=settings.LEADERBOARD_DECAY_POINTS)
+        parser.add_argument('--floor', type=int, default=settings.LEADERBOARD_DECAY_FLOOR)
+        parser.add_argument('--dry-run', action='store_true', help='Show the decay without applying it.')
+        parser.add_argument('--league', default=None, help='Only decay players of this league (default: all).')
+
+    def handle(self, *args, **options):
+        if options['weeks'] is None:
+            self.stdout.write('Rating decay is disabled, set LEADERBOARD_DECAY_INACTIVE_WEEKS or pass --weeks.')
+            return
+        league_id = None if options['league'] is None else League.objects.get(slug=options['league']).id
+        decayed = RatingAdjustment.apply_decay(
+            options['weeks'], options['points'], floor=options['floor'], dry_run=options['dry_run'],
+            league_id=league_id,
+        )
+        names = dict((player.id, player.full_name) for player in Player.objects.filter(pk__in=decayed))
+        for player_id, delta in decayed.items():
+            self.stdout.write(f'{names[player_id]}: {delta:+d}')
+        action = 'Would decay' if options['dry_run'] else 'Decayed'
+        self.stdout.write(f'{action} {len(decayed)} players.')
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from leaderboard.backtest import DRAW_HANDLING, parallel_backtest, parameter_grid
+from leaderboard.models import League
+from leaderboard.rankings import DEFAULT_ELO_RATING, DEFAULT_K_FACTOR
+from leaderboard.replay import ReplayPipeline
+
+
+class Command(BaseCommand):
+    help = 'Score Elo parameter candidates by how well they predict the match history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k-factors', nargs='+', type=float,
+                            default=[10, 15, 20, 25, DEFAULT_K_FACTOR, 35, 40, 50])
+        parser.add_argument('--initial-ratings', nargs='+', type=float, default=[DEFAULT_ELO_RATING],
+                            help='Ratings that players debuting after the burn-in enter with, against the players '
+                                 'of the burn-in who start from the default rating.')
+        parser.add_argument('--draw-handling', nargs='+', choices=DRAW_HANDLING, default=list(DRAW_HANDLING))
+        parser.add_argument('--burn-in', type=int, default=0,
+                            help='Number of initial matches whose predictions are not scored.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Processes to spread large parameter grids across.')
+        parser.add_argument('--top', type=int, default=None, help='Only show the best N candidates.')
+        parser.add_argument('--league', default=League.DEFAULT_SLUG, help='Slug of the league to backtest.')
+
+    def handle(self, *args, **options):
+        league = League.objects.get(slug=options['league'])
+        players = {}
+        winners, losers, draws = [], [], []
+        for match in ReplayPipeline(league_id=league.id).iter_matches():
+            winners.append(players.setdefault(match.winner_id, len(players)))
+            losers.append(players.setdefault(match.loser_id, len(players)))
+            draws.append(match.is_draw)
+        if not winners:
+            self.stdout.write('No matches to backtest.')
+            return
+        if len(options['initial_ratings']) > 1 and not options['burn_in']:
+            # occurs when every player debuts at the same rating, which only shifts all ratings alike
+            raise CommandError('Comparing initial ratings needs --burn-in matches to establish the other players.')
+        candidates = parameter_grid(options['k_factors'], options['initial_ratings'], options['draw_handling'])
+        results = parallel_backtest(
+            np.array(winners), np.array(losers), np.array(draws, dtype=bool), candidates, len(players),
+            burn_in=options['burn_in'], workers=options['workers'],
+        )
+        results.sort(key=lambda result: result.log_loss)
+        self.stdout.write(f'{len(winners)} matches, {len(players)} players, {len(candidates)} candidates')
+        self.stdout.write(f'{"K":>6} {"Initial":>8} {"Draws":>7} {"Log-loss":>9} {"Brier":>7} {"N":>7}')
+        for result in results[:options['top']]:
+            self.stdout.write(
+                f'{result.k_factor:>6g} {result.initial_rating:>8g} {result.draw_handling:>7} '
+                f'{result.log_loss:>9.4f} {result.brier_score:>7.4f} {result.num_predictions:>7}'
+            )
@@ -0,0 +1,67 @@
+import os
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from leaderboard.bootstrap import RESAMPLING_METHODS, rating_intervals
+from leaderboard.caching import RATING_INTERVALS, get_computed_version, get_ratings_version, set_for_ratings
+from leaderboard.models import League
+from leaderboard.replay import ReplayPipeline
+
+
+class Command(BaseCommand):
+    help = 'Compute bootstrap confidence intervals of the ratings and cache them for the leaderboard.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--samples', type=int, default=500)
+        parser.add_argument('--confidence', type=float, default=0.95)
+        parser.add_argument('--method', choices=RESAMPLING_METHODS, default='bootstrap')
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--force', action='store_true',
+                            help='Recompute even if intervals for the current ratings are cached.')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running and check for new ratings every INTERVAL seconds.')
+        parser.add_argument('--league', default=None, help='Only compute intervals for this league (default: all).')
+
+    def handle(self, *args, **options):
+        force = options['force']
+        while True:
+            leagues = League.objects.all()
+            if options['league'] is not None:
+                leagues = leagues.filter(slug=options['league'])
+            for league in leagues:
+                version = get_ratings_version(league.id)
+                if force or get_computed_version(RATING_INTERVALS, league.id) != version:
+                    started = time.time()
+                    intervals = self.compute(league, options)
+                    set_for_ratings(RATING_INTERVALS, league.id, intervals, version)
+                    self.stdout.write(
+                        f'{league}: computed intervals for {len(intervals)} players in {time.time() - started:.1f}s'
+                    )
+            force = False
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+
+    def compute(self, league, options):
+        """Return a dict of player id to the interval offsets around the rating in the league."""
+        players = {}
+        winners, losers, draws = [], [], []
+        for match in ReplayPipeline(league_id=league.id).iter_matches():
+            winners.append(players.setdefault(match.winner_id, len(players)))
+            losers.append(players.setdefault(match.loser_id, len(players)))
+            draws.append(match.is_draw)
+        if not winners:
+            return {}
+        lower, median, upper = rating_intervals(
+            np.array(winners), np.array(losers), np.array(draws, dtype=bool), len(players),
+            num_samples=options['samples'], confidence=options['confidence'], method=options['method'],
+            workers=options['workers'], seed=options['seed'],
+        )
+        # offsets around the median so the band can be shown next to the live rating
+        return {
+            player_id: {'low': int(round(median[i] - lower[i])), 'high': int(round(upper[i] - median[i]))}
+            for player_id, i in players.items()
+        }
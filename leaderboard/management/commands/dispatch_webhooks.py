@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from leaderboard.webhooks import dispatch
+
+
+class Command(BaseCommand):
+    help = 'Deliver new matches and rating changes to the configured webhooks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.LEADERBOARD_WEBHOOK_BATCH_SIZE,
+                            help='Send at most this many changes per request.')
+        parser.add_argument('--timeout', type=float, default=settings.LEADERBOARD_WEBHOOK_TIMEOUT,
+                            help='Seconds to wait for a receiver before retrying later.')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running and check for new changes every INTERVAL seconds.')
+
+    def handle(self, *args, **options):
+        while True:
+            delivered = dispatch(batch_size=options['batch_size'], timeout=options['timeout'])
+            if delivered or not options['interval']:
+                self.stdout.write(f'Delivered {delivered} changes.')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
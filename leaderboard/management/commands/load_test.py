@@ -0,0 +1,53 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from leaderboard.benchmark import seed_league
+from leaderboard.loadtest import DEFAULT_MIX, parse_mix, run_load_test
+from leaderboard.models import League
+
+
+class Command(BaseCommand):
+    help = 'Run concurrent simulated users against a league and print throughput, latencies and rating consistency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent simulated users.')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run for.')
+        parser.add_argument('--mix', default=','.join(f'{action}={weight}' for action, weight in DEFAULT_MIX.items()),
+                            help='Weights of the actions, e.g. poll=50,home=20,browse=25,submit=5.')
+        parser.add_argument('--think', type=float, default=0, help='Mean seconds each user waits between requests.')
+        parser.add_argument('--url', default=None,
+                            help='Base URL of a running server using the same database, e.g. http://127.0.0.1:8000. '
+                                 'By default requests go to the app in this process.')
+        parser.add_argument('--league', default='loadtest', help='Slug of the league, seeded if it has no players.')
+        parser.add_argument('--players', type=int, default=50, help='Players to seed a new league with.')
+        parser.add_argument('--matches', type=int, default=2000, help='Matches to seed a new league with.')
+        parser.add_argument('--keep-rate-limits', action='store_true',
+                            help='Keep the write rate limits of the app in this process (a server keeps its own).')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--output', default=None, help='Write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as error:
+            raise CommandError(error)
+        league, _ = League.objects.get_or_create(
+            slug=options['league'], defaults={'name': options['league'].replace('-', ' ').title()}
+        )
+        if not league.players.exists():
+            seed_league(league, options['players'], options['matches'], seed=options['seed'])
+        limits = override_settings()
+        if not options['keep_rate_limits']:
+            limits = override_settings(LEADERBOARD_USER_WRITES_PER_MINUTE=0, LEADERBOARD_GLOBAL_WRITES_PER_MINUTE=0)
+        with limits:
+            report = run_load_test(
+                league, users=options['users'], duration=options['duration'], mix=mix, url=options['url'],
+                think_time=options['think'], seed=options['seed'],
+            )
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
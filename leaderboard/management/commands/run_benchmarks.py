@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from leaderboard.benchmark import run_benchmarks
+
+
+def parse_scale(value):
+    """Parse a PLAYERSxMATCHES scale, e.g. 100x10000."""
+    try:
+        num_players, num_matches = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise CommandError(f'Invalid scale {value!r}, expected PLAYERSxMATCHES like 100x10000.')
+    return num_players, num_matches
+
+
+class Command(BaseCommand):
+    help = 'Time the pages, match submission and rating code against seeded leagues and print JSON results.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', nargs='+', default=['50x1000', '200x10000', '1000x100000'],
+                            help='League sizes as PLAYERSxMATCHES, seeded once as benchmark-P-M leagues.')
+        parser.add_argument('--repeat', type=int, default=10, help='Times to run each benchmark.')
+        parser.add_argument('--fresh', action='store_true', help='Seed the leagues again even if they exist.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=None, help='Write the JSON results to this file.')
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(
+            [parse_scale(scale) for scale in options['scales']],
+            repeat=options['repeat'], fresh=options['fresh'], seed=options['seed'],
+        )
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
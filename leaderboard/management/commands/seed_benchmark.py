@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from leaderboard.benchmark import seed_league
+from leaderboard.models import League
+
+
+class Command(BaseCommand):
+    help = 'Fill a league with synthetic players and matches for benchmarks and load tests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=100)
+        parser.add_argument('--matches', type=int, default=10000)
+        parser.add_argument('--days', type=int, default=365, help='Spread the matches over this many days.')
+        parser.add_argument('--league', default='benchmark', help='Slug of the league, created if missing.')
+        parser.add_argument('--reset', action='store_true', help='Delete the league\'s players and matches first.')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        league, _ = League.objects.get_or_create(
+            slug=options['league'], defaults={'name': options['league'].replace('-', ' ').title()}
+        )
+        if options['reset']:
+            league.matches.all().delete()
+            league.players.all().delete()
+        timings = seed_league(
+            league, options['players'], options['matches'], days=options['days'], seed=options['seed']
+        )
+        self.stdout.write(
+            f'Added {options["players"]} players ({timings["players"]:.1f}s) and {options["matches"]} matches '
+            f'({timings["matches"]:.1f}s) to {league.slug}, rated in {timings["ratings"]:.1f}s.'
+        )
@@ -0,0 +1,63 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from leaderboard.caching import SEASON_ODDS, get_computed_version, get_ratings_version, set_for_ratings
+from leaderboard.models import League, Player, PlayerRating
+
+
+class Command(BaseCommand):
+    help = 'Simulate a round robin season and print every player\'s odds of finishing in each rank.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simulations', type=int, default=10000)
+        parser.add_argument('--rounds', type=int, default=1,
+                            help='Number of times every pair of players meets.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--top', type=int, default=3, help='Show the odds of finishing in the top N.')
+        parser.add_argument('--league', default=None,
+                            help='Slug of the league to simulate (default: the default league, or all with --cache).')
+        parser.add_argument('--cache', action='store_true',
+                            help='Cache the odds served by the API for every league whose ratings changed.')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='With --cache, keep running and check for new ratings every INTERVAL seconds.')
+
+    def handle(self, *args, **options):
+        if options['cache']:
+            return self.precompute(options)
+        league = League.objects.get(slug=options['league'] or League.DEFAULT_SLUG)
+        odds = PlayerRating.get_season_odds(
+            league.id, rounds=options['rounds'], num_simulations=options['simulations'], workers=options['workers']
+        )
+        names = {player.id: player.full_name for player in Player.objects.filter(league=league)}
+        top = options['top']
+        self.stdout.write(f'{"Player":<30} {"1st":>7} {f"Top {top}":>7} {"Avg rank":>9}')
+        for player_id, rank_probabilities in odds.items():
+            expected_rank = sum(rank * p for rank, p in enumerate(rank_probabilities, start=1))
+            self.stdout.write(
+                f'{names.get(player_id, player_id):<30} {rank_probabilities[0]:>7.1%} '
+                f'{sum(rank_probabilities[:top]):>7.1%} {expected_rank:>9.2f}'
+            )
+
+    def precompute(self, options):
+        """Simulate every league whose ratings changed since its odds were cached."""
+        while True:
+            leagues = League.objects.all()
+            if options['league'] is not None:
+                leagues = leagues.filter(slug=options['league'])
+            for league in leagues:
+                version = get_ratings_version(league.id)
+                if get_computed_version(SEASON_ODDS, league.id) == version:
+                    continue
+                started = time.time()
+                odds = PlayerRating.simulate_season_odds(
+                    league.id, rounds=options['rounds'], num_simulations=options['simulations'],
+                    workers=options['workers'],
+                )
+                set_for_ratings(SEASON_ODDS, league.id, {'simulations': options['simulations'], 'odds': odds}, version)
+                self.stdout.write(f'{league}: simulated the season odds of {len(odds)} players '
+                                  f'in {time.time() - started:.1f}s')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
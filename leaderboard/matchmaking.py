@@ -0,0 +1,88 @@
+"""
+Matchmaking from the pairwise win-probability matrix.
+
+The full expected-score matrix of P players is one broadcast of
+``EloRating.calculate_expected_score``. Suggestions pair the available
+players greedily by match quality (1 for an even match, 0 for a certain
+result) minus a penalty for every recent meeting, then improve the pairing
+by swapping opponents between pairs while that raises the total score.
+No Django imports.
+"""
+import numpy as np
+
+from leaderboard.rankings import EloRating
+
+DEFAULT_REPEAT_PENALTY = 0.25
+
+
+def expected_score_matrix(ratings):
+    """Return the matrix of each row player's expected score against each column player."""
+    ratings = np.asarray(ratings, dtype=float)
+    return EloRating.calculate_expected_score(ratings[:, np.newaxis], ratings[np.newaxis, :])
+
+
+def match_quality(expected_scores):
+    """Return how close expected scores are to an even match, from 0 to 1."""
+    return 1 - 2 * np.abs(expected_scores - 0.5)
+
+
+def suggest_matches(ratings, recent_meetings=None, repeat_penalty=DEFAULT_REPEAT_PENALTY):
+    """
+    Pair players to maximize match quality while avoiding recent repeats.
+
+    ``recent_meetings`` is an optional symmetric matrix counting how often
+    each pair played recently. Returns ``(player_index, opponent_index,
+    expected_score, quality)`` tuples, best match first; with an odd number
+    of players one sits out.
+    """
+    expected_scores = expected_score_matrix(ratings)
+    score = match_quality(expected_scores)
+    if recent_meetings is not None:
+        score = score - repeat_penalty * np.asarray(recent_meetings)
+    players, opponents = greedy_pairs(score)
+    players, opponents = improve_pairs(score, players, opponents)
+    order = np.argsort(-score[players, opponents], kind='mergesort')
+    return [
+        (player, opponent, float(expected_scores[player, opponent]), float(score[player, opponent]))
+        for player, opponent in zip(players[order].tolist(), opponents[order].tolist())
+    ]
+
+
+def greedy_pairs(score):
+    """Pair players by taking the best remaining pair until all are paired."""
+    rows, columns = np.triu_indices(len(score), k=1)
+    order = np.argsort(-score[rows, columns], kind='mergesort')
+    paired = np.zeros(len(score), dtype=bool)
+    players, opponents = [], []
+    for row, column in zip(rows[order].tolist(), columns[order].tolist()):
+        if paired[row] or paired[column]:
+            continue
+        paired[row] = paired[column] = True
+        players.append(row)
+        opponents.append(column)
+        if len(players) == len(score) // 2:
+            break
+    return np.array(players, dtype=np.intp), np.array(opponents, dtype=np.intp)
+
+
+def improve_pairs(score, players, opponents, max_swaps=None):
+    """Repeatedly apply the opponent swap between two pairs that gains the most score."""
+    num_pairs = len(players)
+    max_swaps = max_swaps if max_swaps is not None else 10 * num_pairs
+    upper = np.triu(np.ones((num_pairs, num_pairs), dtype=bool), k=1)
+    for _ in range(max_swaps):
+        current = score[players, opponents]
+        current = current[:, np.newaxis] + current[np.newaxis, :]
+        # pairs (a, b) and (c, d) can become (a, c) and (b, d), or (a, d) and (b, c)
+        cross = score[players[:, np.newaxis], players] + score[opponents[:, np.newaxis], opponents]
+        swap = score[players[:, np.newaxis], opponents] + score[opponents[:, np.newaxis], players]
+        gains = np.where(upper, np.maximum(cross, swap) - current, 0)
+        i, j = np.unravel_index(np.argmax(gains), gains.shape)
+        if gains[i, j] <= 1e-12:
+            break
+        a, b, c, d = players[i], opponents[i], players[j], opponents[j]
+        if cross[i, j] >= swap[i, j]:
+            players[i], opponents[i], players[j], opponents[j] = a, c, b, d
+        else:
+            players[i], opponents[i], players[j], opponents[j] = a, d, b, c
+    return players, opponents
@@ -0,0 +1,242 @@
+"""
+Prometheus metrics shared by the worker processes of one host.
+
+Every process keeps its counters, histograms and gauges in memory and
+writes them to its own file in ``LEADERBOARD_METRICS_DIR`` at most every
+``LEADERBOARD_METRICS_FLUSH_SECONDS``. A scrape of ``/metrics`` in any
+worker merges the files: counters and histograms are summed over all
+processes, including exited ones (restarted workers don't reset them), and
+gauges over the running ones. A process that finds a file under its own pid
+archives it before writing, as it belongs to an exited process whose pid was
+reused before a scrape archived it.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import math
+import os
+import threading
+import time
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+MATCH_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000)
+
+# name to (type, help, histogram buckets)
+METRICS = {
+    'pongboard_request_duration_seconds': ('histogram', 'Wall time of requests per view.', LATENCY_BUCKETS),
+    'pongboard_request_queries': ('histogram', 'Database queries of requests per view.', QUERY_BUCKETS),
+    'pongboard_rating_update_seconds': ('histogram', 'Time to write the ratings of a league.', LATENCY_BUCKETS),
+    'pongboard_replay_seconds': ('histogram', 'Time to replay the match history of a league.', LATENCY_BUCKETS),
+    'pongboard_replay_matches': ('histogram', 'Matches replayed per replay of the history.', MATCH_BUCKETS),
+    'pongboard_results_cache_requests_total': (
+        'counter', 'Lookups of results cached for the current ratings, by hit, stale (earlier ratings) or miss.', None,
+    ),
+    'pongboard_stream_clients': ('gauge', 'Connected live leaderboard streams.', None),
+    'pongboard_stream_queued_events': ('gauge', 'Events waiting in the queues of live leaderboard streams.', None),
+    'pongboard_write_rejections_total': ('counter', 'Writes rejected by the rate limits, by limit.', None),
+    'pongboard_webhook_pending_changes': ('gauge', 'Changes waiting to be delivered per webhook.', None),
+}
+
+ARCHIVE = 'archive.json'
+
+
+class ProcessMetrics(object):
+    """The metrics of the current process, reset in forked children."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        self.values = {}  # (name, labels) to a float, or to [bucket counts..., sum, count] for histograms
+        self.flushed_at = 0
+
+    def get_values(self):
+        """Return the values of this process, starting afresh after a fork."""
+        if self.pid != os.getpid():  # occurs on first use and in workers forked from a preloaded app
+            self.pid = os.getpid()
+            self.values = {}
+            self.flushed_at = time.time()
+            if os.path.exists(self.path()):  # occurs when an exited process had this pid
+                archive(settings.LEADERBOARD_METRICS_DIR, [self.path()])
+        return self.values
+
+    def path(self):
+        return os.path.join(settings.LEADERBOARD_METRICS_DIR, f'{self.pid}.json')
+
+    def flush(self, force=False):
+        """Write the values of this process to its file, at most every flush interval unless forced."""
+        with self.lock:
+            values = self.get_values()
+            if not values:  # occurs in processes that never recorded anything, e.g. management commands
+                return
+            if not force and time.time() - self.flushed_at < settings.LEADERBOARD_METRICS_FLUSH_SECONDS:
+                return
+            self.flushed_at = time.time()
+            data = json.dumps([[name, list(labels), value] for (name, labels), value in values.items()])
+        write_atomic(self.path(), data)
+
+
+process_metrics = ProcessMetrics()
+atexit.register(process_metrics.flush, force=True)  # e.g. workers restarted after max requests
+
+
+def label_key(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+def inc(name, labels=None, amount=1):
+    """Add to a counter."""
+    with process_metrics.lock:
+        values = process_metrics.get_values()
+        key = (name, label_key(labels))
+        values[key] = values.get(key, 0) + amount
+    process_metrics.flush()
+
+
+def observe(name, value, labels=None):
+    """Record a value in a histogram."""
+    buckets = METRICS[name][2]
+    with process_metrics.lock:
+        values = process_metrics.get_values()
+        key = (name, label_key(labels))
+        histogram = values.setdefault(key, [0] * (len(buckets) + 2))
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[i] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+    process_metrics.flush()
+
+
+def set_gauge(name, value, labels=None):
+    """Set a gauge of this process."""
+    with process_metrics.lock:
+        process_metrics.get_values()[(name, label_key(labels))] = value
+    process_metrics.flush()
+
+
+class Timer(object):
+    """Context manager observing the seconds spent in it in a histogram."""
+
+    def __init__(self, name, labels=None):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.name, time.perf_counter() - self.started, self.labels)
+
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{threading.get_ident()}.tmp'
+    with open(temporary, 'w') as f:
+        f.write(data)
+    os.replace(temporary, path)  # readers never see a partly written file
+
+
+def read(path):
+    try:
+        with open(path) as f:
+            return [(name, tuple(tuple(label) for label in labels), value) for name, labels, value in json.load(f)]
+    except (OSError, ValueError):  # occurs when the process exited and its file was archived in between
+        return []
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # occurs for a process of another user that reuses the pid
+        return True
+    return True
+
+
+def add(merged, name, labels, value):
+    key = (name, labels)
+    if isinstance(value, list):
+        merged[key] = [a + b for a, b in zip(merged.get(key, [0] * len(value)), value)]
+    else:
+        merged[key] = merged.get(key, 0) + value
+
+
+def archive_exited(directory):
+    """Fold the counters and histograms of exited processes into the archive file and remove their files."""
+    archive(directory, [
+        path for path in glob.glob(os.path.join(directory, '[0-9]*.json'))
+        if not is_running(int(os.path.basename(path).split('.')[0]))
+    ])
+
+
+def archive(directory, paths):
+    """Fold the counters and histograms of the given process files into the archive file and remove them."""
+    if not paths:
+        return
+    with open(os.path.join(directory, 'archive.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        exited = [path for path in paths if os.path.exists(path)]  # another process may have archived them
+        if not exited:
+            return
+        merged = {}
+        for name, labels, value in read(os.path.join(directory, ARCHIVE)):
+            add(merged, name, labels, value)
+        for path in exited:
+            for name, labels, value in read(path):
+                if METRICS.get(name, ('gauge',))[0] != 'gauge':
+                    add(merged, name, labels, value)
+        write_atomic(os.path.join(directory, ARCHIVE),
+                     json.dumps([[name, list(labels), value] for (name, labels), value in merged.items()]))
+        for path in exited:
+            os.remove(path)
+
+
+def collect():
+    """Return the values of all processes of the host merged, keyed by name and labels."""
+    process_metrics.flush(force=True)
+    directory = settings.LEADERBOARD_METRICS_DIR
+    os.makedirs(directory, exist_ok=True)
+    archive_exited(directory)
+    merged = {}
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        for name, labels, value in read(path):
+            add(merged, name, labels, value)
+    return merged
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+def format_number(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(values):
+    """Return the values, keyed by name and labels, in the Prometheus text exposition format."""
+    lines = []
+    for name, (kind, help_text, buckets) in sorted(METRICS.items()):
+        series = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+        if not series:
+            continue
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        for labels, value in series:
+            if kind != 'histogram':
+                lines.append(f'{name}{format_labels(labels)} {format_number(value)}')
+                continue
+            for bound, count in zip(buckets + (float('inf'),), value[:-2] + [value[-1]]):
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", format_number(float(bound))),))} {count}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_number(float(value[-2]))}')
+            lines.append(f'{name}_count{format_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,181 @@
+"""
+Request instrumentation.
+
+``QueryBudgetMiddleware`` counts queries and times every view against per
+view budgets: requests over budget are logged as warnings, and with DEBUG
+the numbers are added to every response as a ``Server-Timing`` header
+(shown by the browser's network tools) and ``X-Query-Count``. The numbers
+are also recorded as metrics.
+
+``ProfilingMiddleware`` profiles single requests of staff users on demand
+and stores the reports as ``RequestProfile`` rows for download.
+"""
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.db import connection
+from django.urls import reverse
+
+from leaderboard import metrics
+from leaderboard.models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PARAM = 'profile'
+PROFILE_SKIPPED_HEADER = 'X-Profile-Skipped'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+
+class QueryBudgetMiddleware(object):
+    """Records the query count, SQL time, render time and wall time of every view."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        request.view_stats = {'view': None, 'render_ms': 0.0}
+        force_debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = True  # records queries like DEBUG does, the log is reset per request
+        first_query = len(connection.queries_log)
+        try:
+            response = self.get_response(request)
+        finally:
+            connection.force_debug_cursor = force_debug_cursor
+        queries = list(connection.queries_log)[first_query:]
+        stats = dict(
+            request.view_stats,
+            queries=len(queries),
+            sql_ms=sum(float(query['time']) for query in queries) * 1000,
+            total_ms=(time.perf_counter() - started) * 1000,
+        )
+        if stats['view'] is not None:
+            self.check_budget(request, stats)
+            labels = {'view': stats['view']}
+            metrics.observe('pongboard_request_duration_seconds', stats['total_ms'] / 1000, labels)
+            metrics.observe('pongboard_request_queries', stats['queries'], labels)
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(stats['queries'])
+            response['Server-Timing'] = (
+                f'sql;dur={stats["sql_ms"]:.1f};desc="{stats["queries"]} queries", '
+                f'render;dur={stats["render_ms"]:.1f}, total;dur={stats["total_ms"]:.1f}'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_stats['view'] = view_func.__name__
+
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+
+        def rendered(response):
+            request.view_stats['render_ms'] = (time.perf_counter() - started) * 1000
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def check_budget(self, request, stats):
+        """Log the request if it went over the query count or time budget of its view."""
+        budget = settings.LEADERBOARD_VIEW_BUDGETS.get(stats['view'], settings.LEADERBOARD_DEFAULT_VIEW_BUDGET)
+        if stats['queries'] > budget['queries'] or stats['total_ms'] > budget['ms']:
+            logger.warning(
+                '%s %s (%s) over budget: %d queries (budget %d), %.1fms SQL, %.1fms render, %.1fms total (budget %d)',
+                request.method, request.path, stats['view'], stats['queries'], budget['queries'],
+                stats['sql_ms'], stats['render_ms'], stats['total_ms'], budget['ms'],
+            )
+
+
+class ProfilingMiddleware(object):
+    """
+    Profiles requests of staff users carrying ``?profile=1`` or an ``X-Profile: 1`` header.
+
+    The cProfile stats and a tracemalloc report of the largest allocations
+    are stored, and the response links to them in ``X-Profile-Url``.
+    tracemalloc traces every thread, so allocations of concurrent requests
+    in the same worker show up in the report too. Its tracing and peak are
+    process-wide, so one request per process is profiled at a time; others
+    asking meanwhile are answered unprofiled with ``X-Profile-Skipped``.
+    """
+    lock = threading.Lock()  # held while a request of this process is profiled
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.wants_profile(request):
+            return self.get_response(request)
+        if not self.lock.acquire(blocking=False):  # occurs when another thread is profiling
+            response = self.get_response(request)
+            response[PROFILE_SKIPPED_HEADER] = 'Another request of this worker is being profiled, try again.'
+            return response
+        try:
+            return self.profile(request)
+        finally:
+            self.lock.release()
+
+    def profile(self, request):
+        """Return the response to the request and store its profile."""
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start(settings.LEADERBOARD_PROFILE_TRACEBACK_FRAMES)
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            response = profile.runcall(self.get_response, request)
+            duration = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+        profile.create_stats()
+        resolver_match = getattr(request, 'resolver_match', None)
+        stored = RequestProfile.objects.create(
+            path=request.get_full_path()[:500],
+            view=resolver_match.func.__name__ if resolver_match else '',
+            user=request.user,
+            duration=duration,
+            stats=marshal.dumps(profile.stats),
+            summary=self.summarize(profile),
+            allocations=self.top_allocations(snapshot, peak),
+        )
+        stale = RequestProfile.objects.order_by('-id').values_list('id', flat=True)[
+            settings.LEADERBOARD_PROFILES_KEPT:]
+        RequestProfile.objects.filter(id__in=list(stale)).delete()
+        response['X-Profile-Url'] = reverse('download_profile', kwargs={'profile_id': stored.id})
+        return response
+
+    @staticmethod
+    def wants_profile(request):
+        """Return whether the request asks to be profiled and its user may do so."""
+        asked = request.GET.get(PROFILE_PARAM) == '1' or request.META.get(PROFILE_HEADER) == '1'
+        return asked and request.user.is_staff
+
+    @staticmethod
+    def summarize(profile, limit=50):
+        """Return the pstats report of the functions with the most cumulative time."""
+        output = io.StringIO()
+        pstats.Stats(profile, stream=output).strip_dirs().sort_stats('cumulative').print_stats(limit)
+        return output.getvalue()
+
+    @staticmethod
+    def top_allocations(snapshot, peak, limit=25):
+        """Return a report of the peak traced memory and the source lines holding the most of it at the end."""
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+        stats = snapshot.statistics('lineno')
+        lines = [
+            f'Peak: {peak / 1024:.1f} KiB',
+            f'Held: {sum(stat.size for stat in stats) / 1024:.1f} KiB in {len(stats)} lines',
+        ]
+        lines += [str(stat) for stat in stats[:limit]]
+        return '\n'.join(lines) + '\n'
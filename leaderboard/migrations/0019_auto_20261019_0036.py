@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-19 00:36
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaderboard', '0018_match_draw'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='loser_delta',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='winner_delta',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-19 00:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaderboard', '0019_auto_20261019_0036'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingAdjustment',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField(default=0)),
+                ('reason', models.CharField(choices=[('decay', 'Inactivity decay')], default='decay', max_length=20)),
+                ('datetime', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='initial_rating',
+            field=models.IntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name='ratingadjustment',
+            name='player',
+            field=models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='rating_adjustments', to='leaderboard.Player'),
+        ),
+    ]
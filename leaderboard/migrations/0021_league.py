@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_default_league(apps, schema_editor):
+    """Move every existing player, match and rating into the default league."""
+    League = apps.get_model('leaderboard', 'League')
+    league, _ = League.objects.get_or_create(slug='default', defaults={'name': 'Default'})
+    for model_name in ('Player', 'Match', 'PlayerRating'):
+        apps.get_model('leaderboard', model_name).objects.filter(league=None).update(league=league)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaderboard', '0020_auto_20261019_0047'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='League',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='league',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='players', to='leaderboard.League'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='league',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='leaderboard.League'),
+        ),
+        migrations.AddField(
+            model_name='playerrating',
+            name='league',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='player_ratings', to='leaderboard.League'),
+        ),
+        migrations.RunPython(assign_default_league, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='player',
+            name='league',
+            field=models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='players', to='leaderboard.League'),
+        ),
+        migrations.AlterField(
+            model_name='match',
+            name='league',
+            field=models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='leaderboard.League'),
+        ),
+        migrations.AlterField(
+            model_name='playerrating',
+            name='league',
+            field=models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='player_ratings', to='leaderboard.League'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='player',
+            unique_together=set([('league', 'first_name', 'last_name')]),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['league', 'datetime'], name='leaderboard_league__4e0677_idx'),
+        ),
+    ]
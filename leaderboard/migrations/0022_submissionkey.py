@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-19 00:54
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaderboard', '0021_league'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('status', models.IntegerField(default=200)),
+                ('response', models.TextField(blank=True, default='')),
+                ('datetime', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
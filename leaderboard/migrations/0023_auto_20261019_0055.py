@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-19 00:55
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaderboard', '0022_submissionkey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('match', 'Match'), ('player', 'Player'), ('rating', 'Rating')], max_length=10)),
+                ('object_id', models.IntegerField()),
+                ('data', models.TextField()),
+                ('datetime', models.DateTimeField(default=django.utils.timezone.now)),
+                ('league', models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='leaderboard.League')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['league', 'id'], name='leaderboard_league__d1bfb3_idx'),
+        ),
+    ]
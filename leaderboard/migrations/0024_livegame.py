@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-19 00:58
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaderboard', '0023_auto_20261019_0055'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LiveGame',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.TextField(blank=True, default='')),
+                ('started', models.DateTimeField(default=django.utils.timezone.now)),
+                ('league', models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='live_games', to='leaderboard.League')),
+                ('match', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='live_game', to='leaderboard.Match')),
+                ('player_a', models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='leaderboard.Player')),
+                ('player_b', models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='leaderboard.Player')),
+            ],
+        ),
+    ]
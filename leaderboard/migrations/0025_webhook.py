@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-19 01:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaderboard', '0024_livegame'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Webhook',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('url', models.URLField()),
+                ('kinds', models.CharField(blank=True, default='', help_text='Comma separated kinds of changes to send (default: all).', max_length=50)),
+                ('secret', models.CharField(blank=True, default='', help_text='Key of the HMAC-SHA256 signature sent with every batch.', max_length=100)),
+                ('active', models.BooleanField(default=True)),
+                ('last_seq', models.IntegerField(blank=True, null=True)),
+                ('failures', models.IntegerField(default=0)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('league', models.ForeignKey(blank=True, help_text='Only send changes of this league (default: all leagues).', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='webhooks', to='leaderboard.League')),
+            ],
+        ),
+    ]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def number_existing_changes(apps, schema_editor):
+    """Number existing entries by their id, so clients' cursors stay valid, and continue each league from there."""
+    ChangeLogEntry = apps.get_model('leaderboard', 'ChangeLogEntry')
+    League = apps.get_model('leaderboard', 'League')
+    ChangeLogEntry.objects.update(seq=models.F('id'))
+    for league_id, last_seq in ChangeLogEntry.objects.values_list('league_id').annotate(last_seq=Max('id')).order_by():
+        League.objects.filter(pk=league_id).update(last_change_seq=last_seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaderboard', '0026_requestprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='league',
+            name='last_change_seq',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='changelogentry',
+            name='seq',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.RunPython(number_existing_changes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='changelogentry',
+            name='seq',
+            field=models.IntegerField(),
+        ),
+        migrations.RemoveIndex(
+            model_name='changelogentry',
+            name='leaderboard_league__d1bfb3_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='changelogentry',
+            unique_together=set([('league', 'seq')]),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def split_cursors(apps, schema_editor):
+    """
+    Turn every webhook's change id into a cursor per league.
+
+    Existing entries are numbered by their id, so a league's cursor is the
+    webhook's last id, or the league's last entry when that came before it.
+    """
+    League = apps.get_model('leaderboard', 'League')
+    Webhook = apps.get_model('leaderboard', 'Webhook')
+    WebhookCursor = apps.get_model('leaderboard', 'WebhookCursor')
+    for webhook in Webhook.objects.exclude(last_seq=None):
+        leagues = League.objects.all() if webhook.league_id is None else League.objects.filter(pk=webhook.league_id)
+        WebhookCursor.objects.bulk_create(
+            WebhookCursor(webhook=webhook, league_id=league_id, last_seq=min(webhook.last_seq, last_change_seq))
+            for league_id, last_change_seq in leagues.values_list('id', 'last_change_seq')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaderboard', '0027_changelogentry_seq'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_seq', models.IntegerField(default=0)),
+                ('league', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='leaderboard.League')),
+                ('webhook', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cursors', to='leaderboard.Webhook')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='webhookcursor',
+            unique_together=set([('webhook', 'league')]),
+        ),
+        migrations.RunPython(split_cursors, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='webhook',
+            name='last_seq',
+        ),
+    ]
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+from django.db.models import F, Sum
+
+
+def backfill_initial_ratings(apps, schema_editor):
+    """
+    Set the initial rating of existing players to the rating they had before their first recorded change.
+
+    That is their current rating less the deltas of their matches and
+    adjustments. Players with matches from before the deltas were stored
+    keep none and start from the default rating, as replays did back then.
+    """
+    Player = apps.get_model('leaderboard', 'Player')
+    Match = apps.get_model('leaderboard', 'Match')
+    RatingAdjustment = apps.get_model('leaderboard', 'RatingAdjustment')
+    unrecorded = Match.objects.filter(winner_delta=0, loser_delta=0).exclude(winning_score=F('losing_score'))
+    unknown = set(unrecorded.values_list('winner_id', flat=True)) | set(unrecorded.values_list('loser_id', flat=True))
+    deltas = [
+        Match.objects.values_list('winner_id').annotate(total=Sum('winner_delta')).order_by(),
+        Match.objects.values_list('loser_id').annotate(total=Sum('loser_delta')).order_by(),
+        RatingAdjustment.objects.values_list('player_id').annotate(total=Sum('delta')).order_by(),
+    ]
+    totals = {}
+    for player_totals in deltas:
+        for player_id, total in player_totals:
+            totals[player_id] = totals.get(player_id, 0) + total
+    for player_id, rating in Player.objects.filter(initial_rating=None).exclude(rating=None).values_list(
+        'id', 'rating'
+    ):
+        if player_id not in unknown:
+            Player.objects.filter(pk=player_id).update(initial_rating=rating - totals.get(player_id, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leaderboard', '0030_submissionkey_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_initial_ratings, migrations.RunPython.noop),
+    ]
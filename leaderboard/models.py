@@ -1,19 +1,90 @@
+import hashlib
+import json
+from bisect import bisect_right
+from datetime import timedelta
 from typing import Any
-from django.db import models
-from django.db.models import Sum
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
 from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils import timezone
 
-from leaderboard.rankings import EloRating
+from leaderboard import metrics
+from leaderboard.caching import bump_ratings_version, ratings_cache_key
+from leaderboard.rankings import DEFAULT_ELO_RATING, EloRating
+from leaderboard.rating_systems import get_rating_system
+
+RANKED_MIN_GAMES = 5
+
+
+class League(models.Model):
+    """Table for keeping leagues, each with its own players, matches and ratings."""
+    DEFAULT_SLUG = 'default'
+    default_id = None  # id of the default league, cached per process by get_default
+
+    name = models.CharField(max_length=100, blank=False)
+    slug = models.SlugField(max_length=50, unique=True)
+    last_change_seq = models.IntegerField(default=0)  # sequence number of the league's latest change log entry
+
+    def __str__(self):
+        """Display league name as string object representation."""
+        return self.name
+
+    @property
+    def is_default(self):
+        """Whether this is the league served at the root URLs."""
+        return self.slug == League.DEFAULT_SLUG
+
+    @staticmethod
+    def get_default():
+        """
+        Return the default league, creating it if needed.
+
+        Its id is cached per process once the league is committed, so a
+        rolled back creation is never cached.
+        """
+        if League.default_id is not None:
+            league = League.objects.filter(pk=League.default_id).first()
+            if league is not None:
+                return league
+            League.default_id = None  # occurs when the league was deleted by another process
+        league, _ = League.objects.get_or_create(slug=League.DEFAULT_SLUG, defaults={'name': 'Default'})
+
+        def cache_id():
+            League.default_id = league.id
+
+        transaction.on_commit(cache_id)  # runs right away outside of transactions
+        return league
+
+    @staticmethod
+    def resolve_id(league_id=None):
+        """Return the given league id or the id of the default league, without a query once it is cached."""
+        if league_id is not None:
+            return league_id
+        return League.default_id if League.default_id is not None else League.get_default().id
+
+
+@receiver(post_delete, sender=League)
+def forget_default_league(sender, instance, **kwargs):
+    """Forget the cached id of the default league when it is deleted."""
+    if instance.id == League.default_id:
+        League.default_id = None
+
 
 class Player(models.Model):
     """Table for keeping player information."""
+    league = models.ForeignKey(League, default=None, related_name='players', on_delete=models.CASCADE)
     first_name = models.CharField(max_length=50, blank=False)
     last_name = models.CharField(max_length=50, blank=False)
     rating = models.IntegerField(default=1450, blank=True, null=True)
+    initial_rating = models.IntegerField(default=None, blank=True, null=True)  # full replays start from it
 
     class Meta:
-        unique_together = ('first_name', 'last_name')
+        unique_together = ('league', 'first_name', 'last_name')
 
     def __str__(self):
         """Display player's full name as string object representation."""
@@ -34,13 +105,23 @@ class Player(models.Model):
         super().save(*args, **kwargs)
 
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        elo_rating = EloRating(use_current_ratings=True)
-        elo_rating.set_rating(player=self, rating=self.rating)
-        PlayerRating.add_ratings(elo_rating)
+        rating_system = PlayerRating.get_rating_system()
+        if self.pk is None and not rating_system.incremental:
+            self.rating = rating_system.default_rating  # batch systems rate every player from the same start
+        if self.pk is None and self.initial_rating is None:
+            self.initial_rating = self.rating
+        if self.league_id is None:
+            self.league_id = League.resolve_id()
+        with transaction.atomic():  # the player, ratings and change log are written together
+            super().save(*args, **kwargs)
+            elo_rating = PlayerRating.get_current_ratings(self.league_id)
+            elo_rating.set_rating(player=self.id, rating=self.rating)
+            PlayerRating.add_ratings(elo_rating, self.league_id)
+            ChangeLogEntry.record_players([self])
 
 class Match(models.Model):
     """Table for keeping track of game scores and winners."""
+    league = models.ForeignKey(League, default=None, related_name='matches', on_delete=models.CASCADE)
     winner = models.ForeignKey(Player, default=None, related_name='won_matches', on_delete=models.CASCADE)
     winning_score = models.IntegerField(default=None)
     winner_delta = models.IntegerField(default=0)
@@ -50,14 +131,20 @@ class Match(models.Model):
     datetime = models.DateTimeField(default=timezone.now)
     draw = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [models.Index(fields=['league', 'datetime'])]
+
     def __str__(self):
         """Display match description as string object representation."""
         return self.description
 
     @staticmethod
-    def get_recent_matches(num_matches: int):
-        """Get specified number of recent matches in descending date."""
-        recent_matches = Match.objects.order_by('-datetime')[0:num_matches]
+    def get_recent_matches(num_matches: int, league_id=None):
+        """Get specified number of recent matches of a league in descending date, with their players."""
+        league_id = League.resolve_id(league_id)
+        recent_matches = Match.objects.filter(league_id=league_id).select_related('winner', 'loser').order_by(
+            '-datetime'
+        )[0:num_matches]
         return recent_matches
 
     @property
@@ -87,41 +174,237 @@ class Match(models.Model):
             return description
 
     def save(self, *args, **kwargs):
-        if self.id:  # occurs when the match already exists and is being updated
-            winner_rating, loser_rating, winner_delta, loser_delta = PlayerRating.generate_ratings()
-        else:  # occurs when it's a new match being added
-            elo_rating = EloRating(use_current_ratings=True)
-            winner_rating, loser_rating, winner_delta, loser_delta = elo_rating.update_ratings(self.winner, self.loser, self.winning_score == self.losing_score)
-            PlayerRating.add_ratings(elo_rating)
-        self.winner_delta_ = winner_delta
-        self.loser_delta_ = loser_delta
-        super().save(*args, **kwargs)
+        if self.league_id is None:  # matches belong to the league of their players
+            self.league_id = self.winner.league_id
+        with transaction.atomic():  # the match, ratings and change log are written together
+            if not PlayerRating.get_rating_system().incremental:  # batch systems re-rate the whole history
+                self.save_with_recompute(*args, **kwargs)
+            elif self.id:  # occurs when the match already exists and is being updated
+                super().save(*args, **kwargs)
+                PlayerRating.generate_ratings(self.league_id)  # also rewrites the stored deltas of every match
+                self.winner_delta, self.loser_delta = Match.objects.values_list(
+                    'winner_delta', 'loser_delta'
+                ).get(pk=self.pk)
+            else:  # occurs when it's a new match being added
+                elo_rating = PlayerRating.get_current_ratings(self.league_id)
+                winner_rating, loser_rating, winner_delta, loser_delta = elo_rating.update_ratings(
+                    self.winner_id, self.loser_id, self.winning_score == self.losing_score
+                )
+                PlayerRating.add_ratings(elo_rating, self.league_id)
+                self.winner_delta = winner_delta
+                self.loser_delta = loser_delta
+                super().save(*args, **kwargs)
+            ChangeLogEntry.record_matches([self])
 
+    @staticmethod
+    def create_batch(matches, league_id=None):
+        """
+        Save new matches of a league in the given order with a single rating update.
+
+        When the whole batch was played after the league's latest match it is
+        rated incrementally from the current ratings, otherwise the league's
+        history is replayed once.
+        """
+        league_id = League.resolve_id(league_id)
+        matches = sorted(matches, key=lambda match: match.datetime)
+        if not matches:
+            return matches
+        for match in matches:
+            match.league_id = league_id
+        with transaction.atomic():
+            latest = Match.objects.filter(league_id=league_id).aggregate(latest=Max('datetime'))['latest']
+            if PlayerRating.get_rating_system().incremental and (latest is None or matches[0].datetime >= latest):
+                elo_rating = PlayerRating.get_current_ratings(league_id)
+                for match in matches:
+                    _, _, match.winner_delta, match.loser_delta = elo_rating.update_ratings(
+                        match.winner_id, match.loser_id, match.winning_score == match.losing_score
+                    )
+                Match.objects.bulk_create(matches)
+                PlayerRating.add_ratings(elo_rating, league_id)
+            else:  # occurs for backdated matches and batch rating systems
+                Match.objects.bulk_create(matches)
+                PlayerRating.generate_ratings(league_id)
+            if matches[0].id is None:  # occurs on backends that don't return the ids of bulk inserts
+                ids = Match.objects.filter(league_id=league_id).order_by('-id').values_list('id', flat=True)
+                for match, match_id in zip(matches, reversed(list(ids[:len(matches)]))):
+                    match.id = match_id
+            ChangeLogEntry.record_matches(matches)
+        return matches
+
+    def save_with_recompute(self, *args, **kwargs):
+        """Save the match and recompute all ratings with the active rating system."""
+        previous_ratings = PlayerRating.get_current_ratings(self.league_id)
+        super().save(*args, **kwargs)
+        PlayerRating.generate_ratings(self.league_id)
+        current_ratings = PlayerRating.get_current_ratings(self.league_id)
+        self.winner_delta = current_ratings.get_rating(self.winner_id) - previous_ratings.get_rating(self.winner_id)
+        self.loser_delta = current_ratings.get_rating(self.loser_id) - previous_ratings.get_rating(self.loser_id)
+        Match.objects.filter(pk=self.pk).update(winner_delta=self.winner_delta, loser_delta=self.loser_delta)
 
 
 class PlayerRating(models.Model):
     """Table for keeping track of a player's rating."""
     player = models.OneToOneField(Player, default=None, primary_key=True, on_delete=models.CASCADE)
+    league = models.ForeignKey(League, default=None, related_name='player_ratings', on_delete=models.CASCADE)
     rating = models.IntegerField(default=None, blank=False)
-    
+
+    def save(self, *args, **kwargs):
+        if self.league_id is None:  # ratings belong to the league of their player
+            self.league_id = self.player.league_id
+        super().save(*args, **kwargs)
+
     @staticmethod
-    def add_ratings(elo_rating: EloRating):
-        """Add ratings to database given EloRating object."""
-        PlayerRating.objects.all().delete()
-        for player, rating in elo_rating.ratings.items():
-            PlayerRating.objects.create(player=player, rating=rating)
-            player.set_rating(rating)
+    def get_rating_system():
+        """Return the rating system selected in settings."""
+        return get_rating_system(settings.LEADERBOARD_RATING_SYSTEM)
 
     @staticmethod
-    def generate_ratings():
-        """Generate ratings from scratch based on all previous matches."""
-        elo_rating = EloRating()
-        matches = Match.objects.all().order_by('datetime')
-        for match in matches:
-            draw = match.winning_score == match.losing_score
-            w_rating, l_rating, w_delta, l_delta = elo_rating.update_ratings(match.winner, match.loser, draw=draw)
-        PlayerRating.add_ratings(elo_rating)
-        return w_rating, l_rating, w_delta, l_delta 
+    def get_current_ratings(league_id=None):
+        """Return an EloRating seeded with the current rating of every player in the league."""
+        league_id = League.resolve_id(league_id)
+        ratings = dict(Player.objects.filter(league_id=league_id).exclude(rating=None).values_list('id', 'rating'))
+        ratings.update(PlayerRating.objects.filter(league_id=league_id).values_list('player_id', 'rating'))
+        return EloRating(ratings)
+
+    @staticmethod
+    def get_starting_ratings(league_id=None):
+        """Return the rating every player of the league started with, for replays from scratch."""
+        league_id = League.resolve_id(league_id)
+        return {
+            player_id: DEFAULT_ELO_RATING if initial_rating is None else initial_rating
+            for player_id, initial_rating in Player.objects.filter(league_id=league_id).values_list(
+                'id', 'initial_rating'
+            )
+        }
+
+    @staticmethod
+    def add_ratings(elo_rating: EloRating, league_id=None):
+        """Add a league's ratings to database given EloRating object (or dict) keyed by player id."""
+        league_id = League.resolve_id(league_id)
+        ratings = getattr(elo_rating, 'ratings', elo_rating)
+        with metrics.Timer('pongboard_rating_update_seconds'):
+            bump_ratings_version(league_id)
+            PlayerRating.objects.filter(league_id=league_id).delete()
+            PlayerRating.objects.bulk_create(
+                PlayerRating(player_id=player_id, league_id=league_id, rating=rating)
+                for player_id, rating in ratings.items()
+            )
+            current_ratings = dict(Player.objects.filter(league_id=league_id).values_list('id', 'rating'))
+            changed = {
+                player_id: rating for player_id, rating in ratings.items() if current_ratings.get(player_id) != rating
+            }
+            for player_id, rating in changed.items():
+                Player.objects.filter(id=player_id).update(rating=rating)
+            ChangeLogEntry.record_ratings(league_id, changed)
+
+    @staticmethod
+    def generate_ratings(league_id=None, consumers=()):
+        """
+        Generate a league's ratings from scratch based on all its previous matches.
+
+        Any extra replay consumers are fed from the same pass over the history.
+        """
+        from leaderboard.replay import BatchRatingConsumer, EloReplayConsumer, ReplayPipeline
+
+        league_id = League.resolve_id(league_id)
+        rating_system = PlayerRating.get_rating_system()
+        if rating_system.incremental:
+            rating_consumer = EloReplayConsumer(
+                league_id,
+                workers=settings.LEADERBOARD_REPLAY_WORKERS,
+                min_parallel_matches=settings.LEADERBOARD_PARALLEL_REPLAY_MIN_MATCHES,
+            )
+        else:
+            rating_consumer = BatchRatingConsumer(league_id, rating_system, settings.LEADERBOARD_RATING_PERIOD_DAYS)
+        ReplayPipeline([rating_consumer, *consumers], league_id=league_id).run()
+        if rating_system.incremental:
+            return rating_consumer.last_update
+        return rating_consumer.ratings
+
+    @staticmethod
+    def get_leaderboard(league_id=None):
+        """
+        Return a row of stats for every rated player of the league, highest rating first.
+
+        Stats come from one grouped query per side of the match table rather
+        than a query per player and stat.
+        """
+        league_id = League.resolve_id(league_id)
+        rated_players = PlayerRating.objects.filter(league_id=league_id).order_by('-rating', 'player_id').values_list(
+            'player_id', 'player__first_name', 'player__last_name', 'rating'
+        )
+        matches = Match.objects.filter(league_id=league_id).order_by()
+        decided = Case(When(draw=False, then=Value(1)), default=Value(0), output_field=IntegerField())
+        drawn = Case(When(draw=True, then=Value(1)), default=Value(0), output_field=IntegerField())
+        stats = {}
+        for side, scored, conceded in (('winner', 'winning_score', 'losing_score'),
+                                       ('loser', 'losing_score', 'winning_score')):
+            stats[side] = {
+                player_id: totals
+                for player_id, *totals in matches.values_list(side).annotate(
+                    decided=Sum(decided), drawn=Sum(drawn), scored=Sum(scored), conceded=Sum(conceded)
+                )
+            }
+        rows = []
+        for player_id, first_name, last_name, rating in rated_players:
+            wins, winner_draws, winner_scored, winner_conceded = stats['winner'].get(player_id, (0, 0, 0, 0))
+            losses, loser_draws, loser_scored, loser_conceded = stats['loser'].get(player_id, (0, 0, 0, 0))
+            games_played = wins + losses + winner_draws + loser_draws
+            points_won = winner_scored + loser_scored
+            points_lost = winner_conceded + loser_conceded
+            rows.append({
+                'id': player_id,
+                'name': f'{first_name} {last_name}',
+                'rating': rating,
+                'games_played': games_played,
+                'wins': wins,
+                'draws': winner_draws + loser_draws,
+                'losses': losses,
+                'points_won': points_won,
+                'points_lost': points_lost,
+                'win_percent': wins / games_played if games_played else 0,
+                'points_per_game': points_won / games_played if games_played else 0,
+                'avg_point_differential': (points_won - points_lost) / games_played if games_played else 0,
+            })
+        return rows
+
+    @staticmethod
+    def get_season_odds(league_id=None, fixtures=None, rounds=1, num_simulations=10000, workers=None):
+        """
+        Return each player's probability of finishing in each rank after the fixtures.
+
+        Fixtures are (player id, opponent id) pairs and default to a round robin
+        between all players of the league. Results are cached for the league's
+        current ratings.
+        """
+        league_id = League.resolve_id(league_id)
+        params = json.dumps([fixtures, rounds, num_simulations]).encode()
+        key = ratings_cache_key('season_odds:' + hashlib.md5(params).hexdigest(), league_id)
+        odds = cache.get(key)
+        metrics.inc('pongboard_results_cache_requests_total',
+                    {'name': 'season_odds', 'result': 'miss' if odds is None else 'hit'})
+        if odds is None:
+            odds = PlayerRating.simulate_season_odds(league_id, fixtures, rounds, num_simulations, workers)
+            cache.set(key, odds, timeout=settings.LEADERBOARD_RESULTS_CACHE_TIMEOUT)
+        return odds
+
+    @staticmethod
+    def simulate_season_odds(league_id=None, fixtures=None, rounds=1, num_simulations=10000, workers=None):
+        """Return each player's probability of finishing in each rank after the fixtures, without caching."""
+        from leaderboard.simulation import round_robin, simulate_rank_probabilities
+
+        ratings = PlayerRating.get_current_ratings(league_id).ratings
+        players = sorted(ratings, key=ratings.get, reverse=True)
+        index = {player_id: i for i, player_id in enumerate(players)}
+        if fixtures is None:
+            fixtures = round_robin(players, rounds)
+        probabilities = simulate_rank_probabilities(
+            [ratings[player_id] for player_id in players],
+            [(index[player_id], index[opponent_id]) for player_id, opponent_id in fixtures],
+            num_simulations=num_simulations,
+            workers=workers,
+        )
+        return {player_id: probabilities[i].round(4).tolist() for player_id, i in index.items()}
 
     @property
     def games_played(self):
@@ -205,3 +488,398 @@ class PlayerRating(models.Model):
         else:
             win_percent = self.wins / self.games_played
         return win_percent
+
+
+class RatingAdjustment(models.Model):
+    """Table for keeping track of rating changes that don't come from matches."""
+    DECAY = 'decay'
+    REASONS = ((DECAY, 'Inactivity decay'),)
+
+    player = models.ForeignKey(Player, default=None, related_name='rating_adjustments', on_delete=models.CASCADE)
+    delta = models.IntegerField(default=0)
+    reason = models.CharField(max_length=20, choices=REASONS, default=DECAY)
+    datetime = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        """Display adjustment description as string object representation."""
+        return f'{self.datetime.strftime("%m/%d/%Y")}: {self.player} {self.delta:+d} ({self.get_reason_display()})'
+
+    @staticmethod
+    def get_totals():
+        """Return the summed adjustments of every adjusted player."""
+        totals = RatingAdjustment.objects.values_list('player_id').annotate(total=Sum('delta')).order_by()
+        return dict(totals)
+
+    @staticmethod
+    def apply_to(ratings):
+        """Return ratings keyed by player id with every recorded adjustment added, for batch rating systems."""
+        ratings = dict(ratings)
+        for player_id, total in RatingAdjustment.get_totals().items():
+            if player_id in ratings:
+                ratings[player_id] += total
+        return ratings
+
+    @staticmethod
+    def get_replay_adjustments(match_datetimes, league_id=None):
+        """
+        Return the league's adjustments as ``(position, player_id, delta)`` tuples for ``replay_matches``.
+
+        ``match_datetimes`` are the datetimes of the replayed matches in order.
+        Each adjustment goes after the matches played up to its own datetime,
+        as it did when it was applied.
+        """
+        league_id = League.resolve_id(league_id)
+        adjustments = RatingAdjustment.objects.filter(player__league_id=league_id).order_by('datetime', 'id')
+        return [
+            (bisect_right(match_datetimes, adjusted), player_id, delta)
+            for player_id, delta, adjusted in adjustments.values_list('player_id', 'delta', 'datetime')
+        ]
+
+    @staticmethod
+    def apply_decay(inactive_weeks, points, floor=DEFAULT_ELO_RATING, now=None, dry_run=False, league_id=None):
+        """
+        Decay the rating of every player who hasn't played for inactive_weeks.
+
+        Ratings above floor lose up to points, at most once a week per player.
+        Candidates (of one league, or all leagues) are found with one query and
+        updated in bulk. Players without any match never decay: inactivity is
+        counted from the last match, and their rating is the one they were
+        added with rather than one earned in matches.
+        """
+        now = now or timezone.now()
+        rated_players = PlayerRating.objects.filter(rating__gt=floor)
+        if league_id is not None:
+            rated_players = rated_players.filter(league_id=league_id)
+        last_match = Match.objects.filter(
+            Q(winner=OuterRef('player')) | Q(loser=OuterRef('player'))
+        ).order_by('-datetime').values('datetime')[:1]
+        last_decay = RatingAdjustment.objects.filter(
+            player=OuterRef('player'), reason=RatingAdjustment.DECAY
+        ).order_by('-datetime').values('datetime')[:1]
+        candidates = list(rated_players.annotate(
+                last_match=Subquery(last_match, output_field=models.DateTimeField()),
+                last_decay=Subquery(last_decay, output_field=models.DateTimeField()),
+            ).filter(
+                last_match__lt=now - timedelta(weeks=inactive_weeks),
+            ).filter(
+                Q(last_decay=None) | Q(last_decay__lte=now - timedelta(weeks=1))
+            ).values_list('player_id', 'league_id', 'rating'))
+        decayed = {player_id: -min(points, rating - floor) for player_id, _, rating in candidates}
+        if decayed and not dry_run:
+            with transaction.atomic():
+                RatingAdjustment.objects.bulk_create(
+                    RatingAdjustment(player_id=player_id, delta=delta, reason=RatingAdjustment.DECAY, datetime=now)
+                    for player_id, delta in decayed.items()
+                )
+                new_rating = Case(
+                    *[When(pk=player_id, then=Value(delta)) for player_id, delta in decayed.items()],
+                    output_field=IntegerField()
+                )
+                PlayerRating.objects.filter(pk__in=decayed).update(rating=models.F('rating') + new_rating)
+                Player.objects.filter(pk__in=decayed).update(rating=models.F('rating') + new_rating)
+                for decayed_league_id in {league_id for _, league_id, _ in candidates}:
+                    bump_ratings_version(decayed_league_id)
+                    ChangeLogEntry.record_ratings(decayed_league_id, {
+                        player_id: rating + decayed[player_id]
+                        for player_id, league_id, rating in candidates if league_id == decayed_league_id
+                    })
+        return decayed
+
+
+class SubmissionKey(models.Model):
+    """
+    Table for keeping the idempotency keys of users' submissions along with their results.
+
+    Keys are scoped to the user, so users can't see or block each other's
+    submissions, and expire after LEADERBOARD_SUBMISSION_KEY_SECONDS.
+    """
+    PRUNED_KEY = 'leaderboard:submission_keys:pruned'
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.CASCADE)  # null for old keys
+    key = models.CharField(max_length=100)
+    request_hash = models.CharField(max_length=64, blank=True, default='')  # SHA-256 of the submitted content
+    status = models.IntegerField(default=200)
+    response = models.TextField(blank=True, default='')
+    datetime = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = [('user', 'key')]
+
+    def __str__(self):
+        """Display the key as string object representation."""
+        return self.key
+
+    @staticmethod
+    def hash_request(content):
+        """Return the hash of the submitted content, bytes or text, stored to tell retries from reused keys."""
+        return hashlib.sha256(content if isinstance(content, bytes) else content.encode()).hexdigest()
+
+    @staticmethod
+    def get_expiry():
+        """Return the time before which keys have expired."""
+        return timezone.now() - timedelta(seconds=settings.LEADERBOARD_SUBMISSION_KEY_SECONDS)
+
+    @staticmethod
+    def get_previous(user, key):
+        """Return the unexpired submission of the user with the key, or None."""
+        return SubmissionKey.objects.filter(user=user, key=key, datetime__gte=SubmissionKey.get_expiry()).first()
+
+    @staticmethod
+    def claim(user, key, request_hash):
+        """
+        Claim the user's key for a new submission, returning None when it was already used.
+
+        Call inside the transaction that saves the submission so a failed
+        submission releases the key. The unique index makes a concurrent retry
+        wait for the first submission and then see the key as used. Expired
+        keys are deleted, the user's one right away and the others hourly.
+        """
+        if cache.add(SubmissionKey.PRUNED_KEY, 1, timeout=60 * 60):  # occurs once an hour
+            SubmissionKey.objects.filter(datetime__lt=SubmissionKey.get_expiry()).delete()
+        try:
+            with transaction.atomic():
+                SubmissionKey.objects.filter(user=user, key=key, datetime__lt=SubmissionKey.get_expiry()).delete()
+                return SubmissionKey.objects.create(user=user, key=key, request_hash=request_hash)
+        except IntegrityError:  # occurs when the key was already used
+            return None
+
+
+class RateLimitBucket(models.Model):
+    """Table for keeping the token buckets of the write rate limits, shared by all workers and replicas."""
+    key = models.CharField(max_length=150, unique=True)
+    tokens = models.FloatField()
+    updated = models.FloatField()  # unix time of the last refill
+
+    def __str__(self):
+        """Display bucket description as string object representation."""
+        return f'{self.key}: {self.tokens:.1f}'
+
+
+class ChangeLogEntry(models.Model):
+    """
+    Append-only table of changes to players, matches and ratings, for clients syncing incrementally.
+
+    Entries are written in the same transaction as the change itself and
+    numbered per league in commit order, so clients can sync from the last
+    sequence number they saw without ever skipping an entry.
+    """
+    MATCH = 'match'
+    PLAYER = 'player'
+    RATING = 'rating'
+    KINDS = ((MATCH, 'Match'), (PLAYER, 'Player'), (RATING, 'Rating'))
+
+    league = models.ForeignKey(League, default=None, related_name='changes', on_delete=models.CASCADE)
+    seq = models.IntegerField()
+    kind = models.CharField(max_length=10, choices=KINDS)
+    object_id = models.IntegerField()
+    data = models.TextField()  # JSON of the changed fields, clients merge it by kind and object id
+    datetime = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = [('league', 'seq')]
+
+    def __str__(self):
+        """Display change description as string object representation."""
+        return f'{self.seq}: {self.kind} {self.object_id}'
+
+    @staticmethod
+    def allocate_seqs(league_id, count):
+        """
+        Reserve count sequence numbers of the league's change log and return the first.
+
+        The update locks the league's row until the transaction commits, so a
+        concurrent writer only gets the next numbers once this one committed
+        (or rolled back, releasing its numbers). Ids, by contrast, are handed
+        out at insert time and can become visible out of order.
+        """
+        League.objects.filter(pk=league_id).update(last_change_seq=F('last_change_seq') + count)
+        return League.objects.filter(pk=league_id).values_list('last_change_seq', flat=True).get() - count + 1
+
+    @staticmethod
+    def record(league_id, kind, changes):
+        """Append an entry for every object id to changed fields pair in changes."""
+        changes = list(changes)
+        if not changes:
+            return
+        now = timezone.now()
+        with transaction.atomic():
+            first_seq = ChangeLogEntry.allocate_seqs(league_id, len(changes))
+            ChangeLogEntry.objects.bulk_create(
+                ChangeLogEntry(
+                    league_id=league_id, seq=seq, kind=kind, object_id=object_id, datetime=now,
+                    data=json.dumps(data, cls=DjangoJSONEncoder),
+                )
+                for seq, (object_id, data) in enumerate(changes, start=first_seq)
+            )
+
+    @staticmethod
+    def record_matches(matches):
+        """Append an entry for every saved match."""
+        for league_id in sorted({match.league_id for match in matches}):  # always lock leagues in the same order
+            ChangeLogEntry.record(league_id, ChangeLogEntry.MATCH, [
+                (match.id, {
+                    'id': match.id, 'datetime': match.datetime, 'winner_id': match.winner_id,
+                    'winning_score': match.winning_score, 'winner_delta': match.winner_delta,
+                    'loser_id': match.loser_id, 'losing_score': match.losing_score,
+                    'loser_delta': match.loser_delta, 'draw': match.draw,
+                })
+                for match in matches if match.league_id == league_id
+            ])
+
+    @staticmethod
+    def record_match_deltas(league_id, deltas):
+        """Append an entry for every match id to rewritten (winner, loser) delta pair."""
+        ChangeLogEntry.record(league_id, ChangeLogEntry.MATCH, [
+            (match_id, {'id': match_id, 'winner_delta': winner_delta, 'loser_delta': loser_delta})
+            for match_id, (winner_delta, loser_delta) in deltas.items()
+        ])
+
+    @staticmethod
+    def record_players(players):
+        """Append an entry for every saved player."""
+        for player in players:
+            ChangeLogEntry.record(player.league_id, ChangeLogEntry.PLAYER, [(player.id, {
+                'id': player.id, 'first_name': player.first_name, 'last_name': player.last_name,
+                'rating': player.rating,
+            })])
+
+    @staticmethod
+    def record_ratings(league_id, ratings):
+        """Append an entry for every player id to new rating pair."""
+        ChangeLogEntry.record(league_id, ChangeLogEntry.RATING, [
+            (player_id, {'player_id': player_id, 'rating': rating}) for player_id, rating in ratings.items()
+        ])
+
+    @staticmethod
+    def get_page(league_id, since=0, limit=500):
+        """Return up to limit changes of the league after the since sequence number, oldest first."""
+        return [
+            {'seq': seq, 'kind': kind, 'object_id': object_id, 'data': json.loads(data), 'datetime': datetime}
+            for seq, kind, object_id, data, datetime in ChangeLogEntry.objects.filter(
+                league_id=league_id, seq__gt=since
+            ).order_by('seq').values_list('seq', 'kind', 'object_id', 'data', 'datetime')[:limit]
+        ]
+
+
+class LiveGame(models.Model):
+    """Table for keeping games being scored point by point, flushed periodically from the live state."""
+    league = models.ForeignKey(League, default=None, related_name='live_games', on_delete=models.CASCADE)
+    player_a = models.ForeignKey(Player, default=None, related_name='+', on_delete=models.CASCADE)
+    player_b = models.ForeignKey(Player, default=None, related_name='+', on_delete=models.CASCADE)
+    points = models.TextField(blank=True, default='')  # one character per rally, 'a' or 'b' for who won it
+    started = models.DateTimeField(default=timezone.now)
+    match = models.OneToOneField(Match, null=True, blank=True, related_name='live_game', on_delete=models.SET_NULL)
+
+    def __str__(self):
+        """Display game description as string object representation."""
+        return f'{self.player_a} vs {self.player_b} ({self.points.count("a")}-{self.points.count("b")})'
+
+
+class Webhook(models.Model):
+    """
+    Table for keeping receivers of change log entries, delivered in batches by `manage.py dispatch_webhooks`.
+
+    The change log serves as the outbox: each webhook keeps the sequence
+    number of the last entry its receiver accepted in every league, so saving
+    a match never waits on a receiver and failed batches are simply sent
+    again later.
+    """
+    name = models.CharField(max_length=100)
+    url = models.URLField()
+    league = models.ForeignKey(League, null=True, blank=True, related_name='webhooks', on_delete=models.CASCADE,
+                               help_text='Only send changes of this league (default: all leagues).')
+    kinds = models.CharField(max_length=50, blank=True, default='',
+                             help_text='Comma separated kinds of changes to send (default: all).')
+    secret = models.CharField(max_length=100, blank=True, default='',
+                              help_text='Key of the HMAC-SHA256 signature sent with every batch.')
+    active = models.BooleanField(default=True)
+    failures = models.IntegerField(default=0)  # consecutive failed deliveries, for the backoff
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        """Display webhook name as string object representation."""
+        return self.name
+
+    def save(self, *args, **kwargs):
+        """Start new webhooks at the end of every league's change log, so receivers only get changes made after."""
+        adding = self.pk is None
+        with transaction.atomic():
+            super(Webhook, self).save(*args, **kwargs)
+            if adding:
+                leagues = League.objects.all() if self.league_id is None else League.objects.filter(pk=self.league_id)
+                WebhookCursor.objects.bulk_create(
+                    WebhookCursor(webhook=self, league_id=league_id, last_seq=last_seq)
+                    for league_id, last_seq in leagues.filter(last_change_seq__gt=0).values_list(
+                        'id', 'last_change_seq'
+                    )
+                )
+
+    def get_kinds(self):
+        """Return the kinds of changes sent to the receiver, or an empty list for all of them."""
+        return [kind.strip() for kind in self.kinds.split(',') if kind.strip()]
+
+    def get_pending_changes(self):
+        """Return the queryset of changes for the receiver after the last delivered one of their league."""
+        cursor = WebhookCursor.objects.filter(webhook=self, league_id=OuterRef('league_id')).values('last_seq')
+        changes = ChangeLogEntry.objects.annotate(
+            last_seq=Coalesce(Subquery(cursor, output_field=IntegerField()), 0)  # occurs for leagues added later
+        ).filter(seq__gt=F('last_seq'))
+        if self.league_id is not None:
+            changes = changes.filter(league_id=self.league_id)
+        if self.get_kinds():
+            changes = changes.filter(kind__in=self.get_kinds())
+        return changes
+
+    def get_pending(self, limit):
+        """Return up to limit changes for the receiver after the last delivered ones, oldest first in each league."""
+        return [
+            {
+                'seq': seq, 'league_id': league_id, 'kind': kind, 'object_id': object_id,
+                'data': json.loads(data), 'datetime': datetime,
+            }
+            for seq, league_id, kind, object_id, data, datetime in self.get_pending_changes().order_by(
+                'league_id', 'seq'
+            ).values_list('seq', 'league_id', 'kind', 'object_id', 'data', 'datetime')[:limit]
+        ]
+
+    def advance(self, changes):
+        """Move the cursors past the delivered changes of every league."""
+        last_seqs = {}
+        for change in changes:
+            last_seqs[change['league_id']] = max(change['seq'], last_seqs.get(change['league_id'], 0))
+        with transaction.atomic():
+            for league_id, last_seq in last_seqs.items():
+                WebhookCursor.objects.update_or_create(
+                    webhook=self, league_id=league_id, defaults={'last_seq': last_seq}
+                )
+
+
+class WebhookCursor(models.Model):
+    """Table for keeping the sequence number of the last change of a league a webhook's receiver accepted."""
+    webhook = models.ForeignKey(Webhook, related_name='cursors', on_delete=models.CASCADE)
+    league = models.ForeignKey(League, related_name='+', on_delete=models.CASCADE)
+    last_seq = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [('webhook', 'league')]
+
+    def __str__(self):
+        """Display cursor description as string object representation."""
+        return f'{self.webhook} in {self.league}: {self.last_seq}'
+
+
+class RequestProfile(models.Model):
+    """Table for keeping cProfile and tracemalloc reports of requests profiled on demand by staff users."""
+    path = models.CharField(max_length=500)
+    view = models.CharField(max_length=100, blank=True, default='')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL)
+    datetime = models.DateTimeField(default=timezone.now)
+    duration = models.FloatField()  # seconds
+    stats = models.BinaryField()  # marshalled pstats, the format of cProfile's dump_stats
+    summary = models.TextField()  # pstats report of the slowest functions
+    allocations = models.TextField()  # tracemalloc report of the largest allocations
+
+    def __str__(self):
+        """Display profile description as string object representation."""
+        return f'{self.path} at {self.datetime:%Y-%m-%d %H:%M:%S} ({self.duration * 1000:.0f}ms)'
@@ -1,4 +1,15 @@
-import leaderboard.models
+"""
+Elo rating engine.
+
+This module deliberately has no Django imports so it can be used from
+worker processes, benchmarks and offline analysis. Players are keyed by
+any hashable value; the app uses ``Player.id`` and feeds matches in as
+plain ``(winner_id, loser_id, draw)`` tuples. The model adapters live in
+``leaderboard.models``.
+"""
+
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
 
 DEFAULT_ELO_RATING = 1450
 DEFAULT_K_FACTOR = 30
@@ -7,32 +18,30 @@ DEFAULT_K_FACTOR = 30
 class EloRating(object):
     """Uses Elo rating system to rate players."""
 
-    def __init__(self, use_current_ratings=False):
-        self.ratings = {}
-        if use_current_ratings:
-            rated_players = leaderboard.models.PlayerRating.objects.all()
-            for rated_player in rated_players:
-                self.ratings[rated_player.player] = rated_player.rating
-        
+    def __init__(self, ratings=None, k_factor=DEFAULT_K_FACTOR, default_rating=DEFAULT_ELO_RATING):
+        self.ratings = dict(ratings) if ratings else {}
+        self.k_factor = k_factor
+        self.default_rating = default_rating
+
     def get_rating(self, player):
         """Return the rating of the specified player."""
         try:
             rating = self.ratings[player]
         except KeyError:  # ocurrs when no rating for that player is present
-            rating = player.rating
+            rating = self.default_rating
         return rating
-    
+
     def set_rating(self, player, rating):
         """Set the rating of the specified player."""
         self.ratings[player] = rating
-    
+
     @staticmethod
     def calculate_expected_score(player_rating, opponent_rating):
         """Return the expected score given player ratings."""
         rating_differential = opponent_rating - player_rating
         expected_score = 1 / (1 + 10 ** (rating_differential / 400))
         return expected_score
-    
+
     def get_expected_score(self, player, opponent):
         """Return the expected score for player against opponent."""
         player_rating = self.get_rating(player)
@@ -44,8 +53,8 @@ class EloRating(object):
         draw_var = 0.5 if draw else 0
         winner_expected_score = self.calculate_expected_score(winner_rating, loser_rating)
         loser_expected_score = self.calculate_expected_score(loser_rating, winner_rating)
-        new_winner_rating = round(winner_rating + DEFAULT_K_FACTOR * (1 - draw_var - winner_expected_score))
-        new_loser_rating  = round(loser_rating  + DEFAULT_K_FACTOR * (0 + draw_var - loser_expected_score))
+        new_winner_rating = round(winner_rating + self.k_factor * (1 - draw_var - winner_expected_score))
+        new_loser_rating  = round(loser_rating  + self.k_factor * (0 + draw_var - loser_expected_score))
         winner_rating_delta = new_winner_rating - winner_rating
         loser_rating_delta = new_loser_rating - loser_rating
         return new_winner_rating, new_loser_rating, winner_rating_delta, loser_rating_delta
@@ -62,4 +71,107 @@ class EloRating(object):
         self.ratings[winner] = new_winner_rating
         self.ratings[loser] = new_loser_rating
         return new_winner_rating, new_loser_rating, winner_rating_delta, loser_rating_delta
-    
\ No newline at end of file
+
+
+def replay_matches(matches, ratings=None, k_factor=DEFAULT_K_FACTOR, adjustments=()):
+    """
+    Replay matches in the given order from the given starting ratings.
+
+    ``matches`` is an iterable of ``(winner, loser, draw)`` tuples. Returns
+    the resulting EloRating along with the per-match tuples returned by
+    ``EloRating.update_ratings``. ``adjustments`` are ``(position, player,
+    delta)`` tuples sorted by position, each added to the player's rating
+    before the match at that position (after the last match for positions
+    past the end), so later matches start from the adjusted rating.
+    """
+    elo_rating = EloRating(ratings, k_factor=k_factor)
+    adjustments = list(adjustments)
+    next_adjustment = 0
+    updates = []
+    for position, (winner, loser, draw) in enumerate(matches):
+        while next_adjustment < len(adjustments) and adjustments[next_adjustment][0] <= position:
+            _, player, delta = adjustments[next_adjustment]
+            elo_rating.set_rating(player, elo_rating.get_rating(player) + delta)
+            next_adjustment += 1
+        updates.append(elo_rating.update_ratings(winner, loser, draw=draw))
+    for _, player, delta in adjustments[next_adjustment:]:
+        elo_rating.set_rating(player, elo_rating.get_rating(player) + delta)
+    return elo_rating, updates
+
+
+def connected_components(matches):
+    """
+    Group matches into independent components of the player graph.
+
+    Uses union-find over the ``(winner, loser)`` pairs. Returns a list of
+    lists of match indices, one per component, each in the original order.
+    """
+    parent = {}
+
+    def find(player):
+        parent.setdefault(player, player)
+        while parent[player] != player:
+            parent[player] = parent[parent[player]]  # path halving
+            player = parent[player]
+        return player
+
+    for winner, loser in {(match[0], match[1]) for match in matches}:  # repeat meetings add no links
+        winner_root, loser_root = find(winner), find(loser)
+        if winner_root != loser_root:
+            parent[winner_root] = loser_root
+    roots = {player: find(player) for player in list(parent)}
+    components = {}
+    for i, match in enumerate(matches):
+        components.setdefault(roots[match[0]], []).append(i)
+    return list(components.values())
+
+
+def replay_components(matches, ratings=None, k_factor=DEFAULT_K_FACTOR, workers=None, min_parallel_matches=5000,
+                      adjustments=()):
+    """
+    Replay matches like ``replay_matches``, running independent player groups concurrently.
+
+    Components of the player graph never affect each other's ratings, so they
+    are spread over ``workers`` processes (largest first) and the results
+    merged. Histories shorter than ``min_parallel_matches`` replay in-process.
+    """
+    matches = list(matches)
+    adjustments = list(adjustments)
+    workers = workers or 1
+    components = connected_components(matches) if workers > 1 and len(matches) >= min_parallel_matches else []
+    if len(components) <= 1:
+        return replay_matches(matches, ratings=ratings, k_factor=k_factor, adjustments=adjustments)
+    # assign components to one bucket per worker, largest component first
+    buckets = [[] for _ in range(min(workers, len(components)))]
+    for component in sorted(components, key=len, reverse=True):
+        min(buckets, key=len).extend(component)
+    buckets = [sorted(bucket) for bucket in buckets]
+    ratings = dict(ratings or {})
+    matched_players = set()
+    with ProcessPoolExecutor(max_workers=len(buckets)) as executor:
+        futures = []
+        for bucket in buckets:
+            bucket_matches = [matches[i] for i in bucket]
+            # only send each worker the ratings of its own players so merging can't clobber others
+            bucket_players = {player for match in bucket_matches for player in match[:2]}
+            bucket_ratings = {player: ratings[player] for player in bucket_players if player in ratings}
+            # positions count the matches of the bucket played before each adjustment
+            bucket_adjustments = [
+                (bisect_left(bucket, position), player, delta)
+                for position, player, delta in adjustments if player in bucket_players
+            ]
+            futures.append(executor.submit(
+                replay_matches, bucket_matches, bucket_ratings, k_factor, bucket_adjustments
+            ))
+            matched_players |= bucket_players
+        results = [future.result() for future in futures]
+    updates = [None] * len(matches)
+    for bucket, (bucket_rating, bucket_updates) in zip(buckets, results):
+        ratings.update(bucket_rating.ratings)
+        for i, update in zip(bucket, bucket_updates):
+            updates[i] = update
+    elo_rating = EloRating(ratings, k_factor=k_factor)
+    for _, player, delta in adjustments:
+        if player not in matched_players:  # occurs for players without matches, adjusted in order
+            elo_rating.set_rating(player, elo_rating.get_rating(player) + delta)
+    return elo_rating, updates
@@ -0,0 +1,149 @@
+"""
+Token bucket rate limiting of the write endpoints.
+
+Every saved match rewrites the ratings, so writes are limited per client
+(user, or address for anonymous posts) and globally. The buckets are rows of
+``RateLimitBucket`` so the limits hold across workers and replicas; a write
+locks its buckets with ``select_for_update`` and only spends their tokens
+when every bucket has one, so concurrent requests never share a token and a
+rejected write costs the client nothing.
+"""
+import functools
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
+
+from leaderboard import metrics
+from leaderboard.models import RateLimitBucket
+
+logger = logging.getLogger(__name__)
+
+BUCKET_KEY = 'leaderboard:ratelimit:{scope}'
+REJECTED_KEY = 'leaderboard:ratelimit:rejected:{scope}'
+PRUNED_KEY = 'leaderboard:ratelimit:pruned'
+SCOPES = ('user', 'global')
+
+
+def take_all(limits, now=None):
+    """
+    Take a token from the bucket of every key, per minute rate and burst in limits if each has one.
+
+    Returns None and 0, or the index of the first empty bucket and the
+    seconds until it has a token, in which case no token is spent. Buckets
+    are locked in the order given, so callers should always give them in the
+    same order.
+    """
+    now = time.time() if now is None else now
+    with transaction.atomic():
+        buckets = []
+        for i, (key, per_minute, burst) in enumerate(limits):
+            rate = per_minute / 60
+            # a missing bucket is a full one
+            bucket, _ = RateLimitBucket.objects.select_for_update().get_or_create(
+                key=key, defaults={'tokens': burst, 'updated': now}
+            )
+            tokens = min(burst, bucket.tokens + max(0, now - bucket.updated) * rate)
+            if tokens < 1:  # occurs when the bucket is empty, nothing to write back
+                return i, (1 - tokens) / rate
+            buckets.append((bucket, tokens))
+        for bucket, tokens in buckets:
+            RateLimitBucket.objects.filter(pk=bucket.pk).update(tokens=tokens - 1, updated=now)
+    return None, 0
+
+
+def take(key, per_minute, burst, now=None):
+    """Take a token from the bucket and return 0, or the seconds until one is available."""
+    return take_all([(key, per_minute, burst)], now)[1]
+
+
+def prune(now=None):
+    """Delete the buckets idle for an hour, which have long refilled at any usual rate."""
+    now = time.time() if now is None else now
+    RateLimitBucket.objects.filter(updated__lt=now - 60 * 60).delete()
+
+
+def client_address(request):
+    """
+    Return the address of the client.
+
+    Behind LEADERBOARD_TRUSTED_PROXIES proxies, such as the ingress, that is
+    the address the outermost trusted proxy added to X-Forwarded-For, as the
+    entries before it may have been sent by the client itself.
+    """
+    proxies = settings.LEADERBOARD_TRUSTED_PROXIES
+    forwarded = [address.strip() for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')]
+    if proxies and len(forwarded) >= proxies and forwarded[-proxies]:
+        return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_id(request):
+    """Return the identity the per client limit applies to."""
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'addr:{client_address(request)}'
+
+
+def record_rejection(scope):
+    """Count a rejected write of the scope."""
+    metrics.inc('pongboard_write_rejections_total', {'limit': scope})
+    key = REJECTED_KEY.format(scope=scope)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:  # occurs when the counter expired or was culled in between
+            cache.set(key, 1, timeout=None)
+
+
+def get_rejections():
+    """Return the number of rejected writes of every scope."""
+    counts = cache.get_many([REJECTED_KEY.format(scope=scope) for scope in SCOPES])
+    return {scope: counts.get(REJECTED_KEY.format(scope=scope), 0) for scope in SCOPES}
+
+
+def check_write(request):
+    """Return the seconds the client has to wait before writing, or 0 and spend a token of each bucket."""
+    identity = client_id(request)
+    limits = [
+        (scope, BUCKET_KEY.format(scope=f'{scope}:{bucket}'), per_minute, burst)
+        for scope, bucket, per_minute, burst in (
+            ('user', identity, settings.LEADERBOARD_USER_WRITES_PER_MINUTE, settings.LEADERBOARD_USER_WRITE_BURST),
+            ('global', 'all',
+             settings.LEADERBOARD_GLOBAL_WRITES_PER_MINUTE, settings.LEADERBOARD_GLOBAL_WRITE_BURST),
+        )
+        if per_minute  # skips disabled limits
+    ]
+    if cache.add(PRUNED_KEY, 1, timeout=60 * 60):  # occurs once an hour
+        prune()
+    rejected, wait = take_all([limit[1:] for limit in limits])
+    if rejected is not None:
+        scope = limits[rejected][0]
+        record_rejection(scope)
+        logger.info('Rejected write to %s from %s, %s limit reached', request.path, identity, scope)
+    return wait
+
+
+def write_rate_limited(view):
+    """Answer writes over the limits with 429 and Retry-After, in JSON for JSON requests."""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return view(request, *args, **kwargs)
+        wait = check_write(request)
+        if not wait:
+            return view(request, *args, **kwargs)
+        message = 'Too many submissions, please try again later.'
+        if request.content_type == 'application/json':
+            response = JsonResponse({'error': message}, status=429)
+        else:
+            response = HttpResponse(message, status=429, content_type='text/plain')
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
+
+    return wrapper
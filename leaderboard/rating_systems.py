@@ -0,0 +1,305 @@
+"""
+Batch rating systems.
+
+Every system takes the full match history as ``(winner, loser, draw, period)``
+tuples and returns the resulting rating of each player. Elo replays the
+matches one by one; Glicko-2 and the TrueSkill-style system treat all matches
+of a rating period as simultaneous and update every player of the period in
+one vectorized step. Like ``leaderboard.rankings`` this module has no Django
+imports; the active system is chosen in ``leaderboard.models``.
+"""
+import math
+
+import numpy as np
+
+from leaderboard.rankings import DEFAULT_ELO_RATING, DEFAULT_K_FACTOR, replay_matches
+
+GLICKO2_SCALE = 173.7178
+
+
+class RatingSystem(object):
+    """Interface for rating systems that rate a whole match history."""
+
+    name = None
+    incremental = False  # whether a single new match can be applied without a recompute
+
+    def __init__(self, default_rating=DEFAULT_ELO_RATING):
+        self.default_rating = default_rating
+
+    def rate(self, matches, ratings=None):
+        """Return a dict of player to rating after the given matches."""
+        raise NotImplementedError
+
+
+class EloSystem(RatingSystem):
+    """Elo rating system, applied match by match."""
+
+    name = 'elo'
+    incremental = True
+
+    def __init__(self, default_rating=DEFAULT_ELO_RATING, k_factor=DEFAULT_K_FACTOR):
+        super().__init__(default_rating)
+        self.k_factor = k_factor
+
+    def rate(self, matches, ratings=None):
+        """Replay the matches in order and return the final Elo ratings."""
+        elo_rating, _ = replay_matches(
+            ((winner, loser, draw) for winner, loser, draw, _period in matches),
+            ratings=ratings,
+            k_factor=self.k_factor,
+        )
+        return elo_rating.ratings
+
+
+class BatchRatingSystem(RatingSystem):
+    """Rating system that updates all players of a rating period at once."""
+
+    def rate(self, matches, ratings=None):
+        """Rate the matches period by period and return the final ratings."""
+        matches = list(matches)
+        players = sorted({match[0] for match in matches} | {match[1] for match in matches} | set(ratings or {}))
+        index = {player: i for i, player in enumerate(players)}
+        state = self.initial_state(len(players), [(ratings or {}).get(player) for player in players])
+        if matches:
+            winners = np.array([index[match[0]] for match in matches], dtype=np.intp)
+            losers = np.array([index[match[1]] for match in matches], dtype=np.intp)
+            draws = np.array([match[2] for match in matches], dtype=bool)
+            periods = np.array([match[3] for match in matches], dtype=np.int64)
+            order = np.argsort(periods, kind='mergesort')  # stable, keeps match order within a period
+            winners, losers, draws, periods = winners[order], losers[order], draws[order], periods[order]
+            boundaries = np.flatnonzero(np.diff(periods)) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [len(periods)]))
+            previous_period = None
+            for start, end in zip(starts, ends):
+                period = periods[start]
+                elapsed = 1 if previous_period is None else int(period - previous_period)
+                state = self.rate_period(state, winners[start:end], losers[start:end], draws[start:end], elapsed)
+                previous_period = period
+        return dict(zip(players, self.ratings_from_state(state).tolist()))
+
+    def initial_state(self, num_players, ratings):
+        """Return the per-player state arrays before any matches."""
+        raise NotImplementedError
+
+    def rate_period(self, state, winners, losers, draws, elapsed):
+        """Return the state after one rating period of matches."""
+        raise NotImplementedError
+
+    def ratings_from_state(self, state):
+        """Return the displayed rating of every player."""
+        raise NotImplementedError
+
+
+class Glicko2Rating(BatchRatingSystem):
+    """Glicko-2 rating system (Glickman, 2012) with vectorized rating periods."""
+
+    name = 'glicko2'
+
+    def __init__(self, default_rating=DEFAULT_ELO_RATING, deviation=350, volatility=0.06,
+                 tau=0.5, tolerance=1e-6):
+        super().__init__(default_rating)
+        self.deviation = deviation
+        self.volatility = volatility
+        self.tau = tau
+        self.tolerance = tolerance
+
+    def initial_state(self, num_players, ratings):
+        """Return mu, phi and sigma arrays on the Glicko-2 scale."""
+        ratings = np.array([self.default_rating if r is None else r for r in ratings], dtype=float)
+        mu = (ratings - self.default_rating) / GLICKO2_SCALE
+        phi = np.full(num_players, self.deviation / GLICKO2_SCALE)
+        sigma = np.full(num_players, self.volatility)
+        return mu, phi, sigma
+
+    def rate_period(self, state, winners, losers, draws, elapsed):
+        """Apply one rating period to every player at once."""
+        mu, phi, sigma = state
+        max_phi = self.deviation / GLICKO2_SCALE
+        if elapsed > 1:  # periods without matches only increase the deviation
+            phi = np.minimum(np.sqrt(phi ** 2 + (elapsed - 1) * sigma ** 2), max_phi)
+        # each match is seen once from the winner's side and once from the loser's side
+        player = np.concatenate((winners, losers))
+        opponent = np.concatenate((losers, winners))
+        winner_score = np.where(draws, 0.5, 1.0)
+        score = np.concatenate((winner_score, 1 - winner_score))
+        g = 1 / np.sqrt(1 + 3 * phi[opponent] ** 2 / math.pi ** 2)
+        expected = 1 / (1 + np.exp(-g * (mu[player] - mu[opponent])))
+        num_players = len(mu)
+        inverse_variance = np.bincount(player, weights=g ** 2 * expected * (1 - expected), minlength=num_players)
+        improvement = np.bincount(player, weights=g * (score - expected), minlength=num_players)
+        played = inverse_variance > 0
+        variance = 1 / inverse_variance[played]
+        delta = variance * improvement[played]
+        new_sigma = sigma.copy()
+        new_sigma[played] = self._volatility(phi[played], sigma[played], variance, delta)
+        phi_star = np.sqrt(phi ** 2 + new_sigma ** 2)
+        new_phi = np.minimum(phi_star, max_phi)
+        new_mu = mu.copy()
+        new_phi[played] = 1 / np.sqrt(1 / phi_star[played] ** 2 + inverse_variance[played])
+        new_mu[played] = mu[played] + new_phi[played] ** 2 * improvement[played]
+        return new_mu, new_phi, new_sigma
+
+    def _volatility(self, phi, sigma, variance, delta):
+        """Solve for the new volatilities with the Illinois algorithm."""
+        tau = self.tau
+        a = np.log(sigma ** 2)
+
+        def f(x):
+            ex = np.exp(x)
+            return (ex * (delta ** 2 - phi ** 2 - variance - ex) / (2 * (phi ** 2 + variance + ex) ** 2)
+                    - (x - a) / tau ** 2)
+
+        upper = delta ** 2 > phi ** 2 + variance
+        A = a.copy()
+        B = np.where(upper, np.log(np.maximum(delta ** 2 - phi ** 2 - variance, 1e-300)), a - tau)
+        searching = ~upper & (f(B) < 0)
+        while searching.any():
+            B[searching] -= tau
+            searching &= f(B) < 0
+        f_A, f_B = f(A), f(B)
+        active = np.abs(B - A) > self.tolerance
+        for _ in range(100):
+            if not active.any():
+                break
+            C = A + (A - B) * f_A / (f_B - f_A)
+            f_C = f(C)
+            swap = active & (f_C * f_B <= 0)
+            halve = active & ~swap
+            A = np.where(swap, B, A)
+            f_A = np.where(swap, f_B, np.where(halve, f_A / 2, f_A))
+            B = np.where(active, C, B)
+            f_B = np.where(active, f_C, f_B)
+            active &= np.abs(B - A) > self.tolerance
+        return np.exp(A / 2)
+
+    def ratings_from_state(self, state):
+        """Convert mu back to the Elo-like rating scale."""
+        mu, _phi, _sigma = state
+        return GLICKO2_SCALE * mu + self.default_rating
+
+
+class TrueSkillRating(BatchRatingSystem):
+    """
+    Draw-aware TrueSkill-style rating system for one-on-one matches.
+
+    Ratings are Gaussian beliefs on the same scale as Elo ratings. All matches
+    of a period are evaluated against the beliefs at the start of the period
+    and their updates are combined per player.
+    """
+
+    name = 'trueskill'
+
+    def __init__(self, default_rating=DEFAULT_ELO_RATING, sigma=200, beta=100, tau=2,
+                 draw_probability=0.1):
+        super().__init__(default_rating)
+        self.sigma = sigma
+        self.beta = beta
+        self.tau = tau
+        self.draw_margin = math.sqrt(2) * beta * _inverse_cdf((draw_probability + 1) / 2)
+
+    def initial_state(self, num_players, ratings):
+        """Return mean and variance arrays."""
+        mu = np.array([self.default_rating if r is None else r for r in ratings], dtype=float)
+        variance = np.full(num_players, float(self.sigma ** 2))
+        return mu, variance
+
+    def rate_period(self, state, winners, losers, draws, elapsed):
+        """Apply one rating period to every player at once."""
+        mu, variance = state
+        variance = np.minimum(variance + elapsed * self.tau ** 2, self.sigma ** 2)
+        c = np.sqrt(2 * self.beta ** 2 + variance[winners] + variance[losers])
+        t = (mu[winners] - mu[losers]) / c
+        epsilon = self.draw_margin / c
+        v = np.where(draws, _v_draw(t, epsilon), _v_win(t, epsilon))
+        w = np.where(draws, _w_draw(t, epsilon, v), _w_win(t, epsilon, v))
+        num_players = len(mu)
+        new_mu = (
+            mu
+            + np.bincount(winners, weights=variance[winners] / c * v, minlength=num_players)
+            - np.bincount(losers, weights=variance[losers] / c * v, minlength=num_players)
+        )
+        player = np.concatenate((winners, losers))
+        shrink = 1 - variance[player] / np.concatenate((c, c)) ** 2 * np.concatenate((w, w))
+        log_shrink = np.bincount(player, weights=np.log(np.clip(shrink, 1e-6, 1)), minlength=num_players)
+        new_variance = variance * np.exp(log_shrink)
+        return new_mu, new_variance
+
+    def ratings_from_state(self, state):
+        """Return the mean of every player's belief."""
+        mu, _variance = state
+        return mu
+
+
+def _pdf(x):
+    """Standard normal density."""
+    return np.exp(-x ** 2 / 2) / math.sqrt(2 * math.pi)
+
+
+def _cdf(x):
+    """Standard normal distribution function."""
+    return 0.5 * (1 + _erf(x / math.sqrt(2)))
+
+
+def _erf(x):
+    """Vectorized error function (Abramowitz and Stegun 7.1.26)."""
+    sign = np.sign(x)
+    x = np.abs(x)
+    t = 1 / (1 + 0.3275911 * x)
+    y = 1 - (((((1.061405429 * t - 1.453152027) * t) + 1.421413741) * t - 0.284496736) * t
+             + 0.254829592) * t * np.exp(-x ** 2)
+    return sign * y
+
+
+def _inverse_cdf(p):
+    """Inverse of the standard normal distribution function by bisection."""
+    low, high = -10.0, 10.0
+    for _ in range(100):
+        mid = (low + high) / 2
+        if 0.5 * (1 + math.erf(mid / math.sqrt(2))) < p:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def _v_win(t, epsilon):
+    """Mean additive correction for a win."""
+    x = t - epsilon
+    denominator = _cdf(x)
+    return np.where(denominator > 1e-12, _pdf(x) / np.maximum(denominator, 1e-12), -x)
+
+
+def _w_win(t, epsilon, v):
+    """Variance multiplicative correction for a win."""
+    return np.clip(v * (v + t - epsilon), 0, 1)
+
+
+def _v_draw(t, epsilon):
+    """Mean additive correction for a draw."""
+    denominator = _cdf(epsilon - t) - _cdf(-epsilon - t)
+    numerator = _pdf(-epsilon - t) - _pdf(epsilon - t)
+    return np.where(denominator > 1e-12, numerator / np.maximum(denominator, 1e-12), -t)
+
+
+def _w_draw(t, epsilon, v):
+    """Variance multiplicative correction for a draw."""
+    denominator = np.maximum(_cdf(epsilon - t) - _cdf(-epsilon - t), 1e-12)
+    w = v ** 2 + ((epsilon - t) * _pdf(epsilon - t) + (epsilon + t) * _pdf(epsilon + t)) / denominator
+    return np.clip(w, 0, 1)
+
+
+RATING_SYSTEMS = {
+    EloSystem.name: EloSystem,
+    Glicko2Rating.name: Glicko2Rating,
+    TrueSkillRating.name: TrueSkillRating,
+}
+
+
+def get_rating_system(name='elo', **kwargs):
+    """Return an instance of the rating system registered under name."""
+    try:
+        system_class = RATING_SYSTEMS[name]
+    except KeyError:
+        raise ValueError(f'Unknown rating system {name!r}, choose from {sorted(RATING_SYSTEMS)}.')
+    return system_class(**kwargs)
@@ -0,0 +1,229 @@
+"""
+Single-pass replay of the match history.
+
+``ReplayPipeline`` reads the matches once in chronological chunks and hands
+every match to each registered consumer. Consumers keep their state in
+memory while the history streams past and write their results in bulk when
+the replay finishes, so adding a derived view does not add another scan of
+the match table.
+"""
+from collections import defaultdict, namedtuple
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from leaderboard import metrics
+from leaderboard.models import ChangeLogEntry, League, Match, Player, PlayerRating, RatingAdjustment
+from leaderboard.rankings import replay_components
+
+
+class MatchRecord(namedtuple(
+        'MatchRecord',
+        'id winner_id loser_id winning_score losing_score draw datetime winner_delta loser_delta')):
+    """Lightweight row of the match table used during replays."""
+
+    __slots__ = ()
+
+    @property
+    def is_draw(self):
+        """Whether the match was drawn, by flag or by equal scores."""
+        return self.draw or self.winning_score == self.losing_score
+
+
+class ReplayConsumer(object):
+    """Receives every match of a replay in chronological order."""
+
+    def start(self):
+        """Prepare for a replay."""
+
+    def consume(self, match: MatchRecord):
+        """Process a single match."""
+        raise NotImplementedError
+
+    def finish(self):
+        """Write the results of the replay."""
+
+
+class ReplayPipeline(object):
+    """Streams the match history once through any number of consumers."""
+
+    chunk_size = 2000
+
+    def __init__(self, consumers=(), league_id=None, chunk_size=None):
+        self.consumers = list(consumers)
+        self.league_id = league_id
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+
+    def register(self, consumer: ReplayConsumer):
+        """Add a consumer to the pipeline."""
+        self.consumers.append(consumer)
+        return consumer
+
+    def iter_matches(self):
+        """Yield all matches (of the league, if given) in chronological order, fetched in chunks."""
+        matches = Match.objects.order_by('datetime', 'id')
+        if self.league_id is not None:
+            matches = matches.filter(league_id=self.league_id)
+        last = None
+        while True:
+            chunk = matches
+            if last is not None:  # keyset pagination avoids OFFSET scans on deep histories
+                chunk = chunk.filter(Q(datetime__gt=last.datetime) | Q(datetime=last.datetime, id__gt=last.id))
+            records = [MatchRecord(*row) for row in chunk.values_list(*MatchRecord._fields)[:self.chunk_size]]
+            yield from records
+            if len(records) < self.chunk_size:
+                return
+            last = records[-1]
+
+    def run(self):
+        """Replay the history through every consumer and write their results."""
+        num_matches = 0
+        with metrics.Timer('pongboard_replay_seconds'):
+            for consumer in self.consumers:
+                consumer.start()
+            for match in self.iter_matches():
+                num_matches += 1
+                for consumer in self.consumers:
+                    consumer.consume(match)
+            with transaction.atomic():
+                for consumer in self.consumers:
+                    consumer.finish()
+        metrics.observe('pongboard_replay_matches', num_matches)
+        return self.consumers
+
+
+class EloReplayConsumer(ReplayConsumer):
+    """
+    Replays Elo ratings and stores ratings and per-match deltas.
+
+    Matches are collected while the history streams past and replayed in
+    ``finish``, so disconnected groups of players can replay concurrently.
+    Recorded rating adjustments are replayed between the matches at the time
+    they were applied.
+    """
+
+    def __init__(self, league_id=None, starting_ratings=None, workers=None, min_parallel_matches=5000):
+        self.league_id = league_id
+        self.starting_ratings = starting_ratings
+        self.workers = workers
+        self.min_parallel_matches = min_parallel_matches
+        self.elo_rating = None
+        self.last_update = (None, None, 0, 0)
+        self.matches = []
+        self.match_datetimes = []
+        self.stored_deltas = []
+
+    def start(self):
+        """Seed the ratings with every player's starting rating."""
+        self.league_id = League.resolve_id(self.league_id)
+        if self.starting_ratings is None:
+            self.starting_ratings = PlayerRating.get_starting_ratings(self.league_id)
+        self.matches = []
+        self.match_datetimes = []
+        self.stored_deltas = []
+
+    def consume(self, match: MatchRecord):
+        """Collect the match and its stored deltas."""
+        self.matches.append((match.winner_id, match.loser_id, match.is_draw))
+        self.match_datetimes.append(match.datetime)
+        self.stored_deltas.append((match.id, (match.winner_delta, match.loser_delta)))
+
+    def finish(self):
+        """Replay the matches, then write the final ratings and the changed match deltas."""
+        self.elo_rating, updates = replay_components(
+            self.matches, self.starting_ratings, workers=self.workers, min_parallel_matches=self.min_parallel_matches,
+            adjustments=RatingAdjustment.get_replay_adjustments(self.match_datetimes, self.league_id),
+        )
+        if updates:
+            self.last_update = updates[-1]
+        PlayerRating.add_ratings(self.elo_rating, self.league_id)
+        changed_deltas = {
+            match_id: update[2:]
+            for (match_id, stored_deltas), update in zip(self.stored_deltas, updates)
+            if update[2:] != stored_deltas
+        }
+        update_match_deltas(changed_deltas)
+        ChangeLogEntry.record_match_deltas(self.league_id, changed_deltas)
+
+
+class BatchRatingConsumer(ReplayConsumer):
+    """Collects the history for a batch rating system and stores its ratings."""
+
+    def __init__(self, league_id, rating_system, period_days):
+        self.league_id = league_id
+        self.rating_system = rating_system
+        self.period_days = period_days
+        self.matches = []
+        self.ratings = {}
+
+    def start(self):
+        """Reset the collected matches."""
+        self.matches = []
+
+    def consume(self, match: MatchRecord):
+        """Collect the match with its rating period."""
+        period = match.datetime.toordinal() // self.period_days
+        self.matches.append((match.winner_id, match.loser_id, match.is_draw, period))
+
+    def finish(self):
+        """Rate the collected matches and store the rounded ratings."""
+        starting_ratings = dict.fromkeys(
+            Player.objects.filter(league_id=self.league_id).values_list('id', flat=True),
+            self.rating_system.default_rating
+        )
+        ratings = self.rating_system.rate(self.matches, ratings=starting_ratings)
+        self.ratings = RatingAdjustment.apply_to({player_id: round(rating) for player_id, rating in ratings.items()})
+        PlayerRating.add_ratings(self.ratings, self.league_id)
+
+
+class PlayerStatsConsumer(ReplayConsumer):
+    """Tallies results, points and current streak for every player."""
+
+    def __init__(self):
+        self.stats = {}
+
+    def start(self):
+        """Reset the tallies."""
+        self.stats = defaultdict(lambda: {
+            'wins': 0, 'losses': 0, 'draws': 0, 'points_won': 0, 'points_lost': 0, 'streak': 0,
+        })
+
+    def consume(self, match: MatchRecord):
+        """Add the match to both players' tallies."""
+        winner = self.stats[match.winner_id]
+        loser = self.stats[match.loser_id]
+        winner['points_won'] += match.winning_score
+        winner['points_lost'] += match.losing_score
+        loser['points_won'] += match.losing_score
+        loser['points_lost'] += match.winning_score
+        if match.is_draw:
+            winner['draws'] += 1
+            loser['draws'] += 1
+            winner['streak'] = loser['streak'] = 0
+        else:
+            winner['wins'] += 1
+            loser['losses'] += 1
+            winner['streak'] = max(winner['streak'], 0) + 1  # positive streaks are wins in a row
+            loser['streak'] = min(loser['streak'], 0) - 1
+
+    def finish(self):
+        """Freeze the tallies into a plain dict."""
+        self.stats = dict(self.stats)
+
+
+def update_match_deltas(deltas, batch_size=100):
+    """Bulk update winner and loser deltas given a dict of match id to delta pair."""
+    match_ids = list(deltas)
+    for i in range(0, len(match_ids), batch_size):
+        batch = match_ids[i:i + batch_size]
+        Match.objects.filter(id__in=batch).update(
+            winner_delta=Case(
+                *[When(id=match_id, then=Value(deltas[match_id][0])) for match_id in batch],
+                output_field=IntegerField()
+            ),
+            loser_delta=Case(
+                *[When(id=match_id, then=Value(deltas[match_id][1])) for match_id in batch],
+                output_field=IntegerField()
+            ),
+        )
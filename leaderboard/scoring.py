@@ -0,0 +1,179 @@
+"""
+Point-by-point scoring of games in progress.
+
+The live state of a game is a small dict kept in the ``live`` cache (Redis,
+or local memory for a single web process), so recording a rally or showing
+the score runs no database queries at all. Points of a game are recorded one
+at a time under a lock taken with the cache's atomic ``add``. The
+compact point log (one character per rally) is flushed to ``LiveGame`` every
+few points or seconds, and finishing the game validates the final score with
+``MatchForm`` rules and saves a single ``Match``, running the rating update
+once.
+"""
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from leaderboard.forms import MatchForm
+from leaderboard.models import LiveGame
+
+SIDES = ('a', 'b')
+UNDO = 'undo'
+
+
+class ScoreConflict(Exception):
+    """Raised when a point is recorded against a different number of points than the game has."""
+
+    def __init__(self, state):
+        super().__init__(f'The game is at point {len(state["log"])}.')
+        self.state = state
+
+
+def live_cache():
+    """Return the cache keeping the live states."""
+    return caches['live']
+
+
+def state_key(game_id):
+    """Return the cache key of a game's live state."""
+    return f'leaderboard:live:{game_id}'
+
+
+def new_state(game, names):
+    """Return the live state of a LiveGame row."""
+    return {
+        'id': game.id,
+        'league_id': game.league_id,
+        'players': [game.player_a_id, game.player_b_id],
+        'names': names,
+        'log': game.points,
+        'score': [game.points.count('a'), game.points.count('b')],
+        'started': game.started,
+        'flushed': len(game.points),
+        'flushed_at': time.time(),
+    }
+
+
+def save_state(state):
+    """Store the live state of a game."""
+    live_cache().set(state_key(state['id']), state, timeout=settings.LEADERBOARD_LIVE_TIMEOUT)
+
+
+@contextmanager
+def game_lock(game_id, timeout=5):
+    """
+    Hold the lock of a game, so its points are recorded one after the other.
+
+    The lock expires after timeout seconds in case its holder died; waiting
+    longer than that raises ScoreConflict with the current state.
+    """
+    key = state_key(game_id) + ':lock'
+    deadline = time.time() + timeout
+    while not live_cache().add(key, 1, timeout=timeout):
+        if time.time() > deadline:
+            raise ScoreConflict(get_state(game_id))
+        time.sleep(0.01)
+    try:
+        yield
+    finally:
+        live_cache().delete(key)
+
+
+def start_game(league, player_a, player_b):
+    """Start scoring a game between two players of the league and return its live state."""
+    if player_a.id == player_b.id or {player_a.league_id, player_b.league_id} != {league.id}:
+        raise ValueError('Players must be two different players of the league.')
+    game = LiveGame.objects.create(league=league, player_a=player_a, player_b=player_b)
+    state = new_state(game, [player_a.full_name, player_b.full_name])
+    save_state(state)
+    return state
+
+
+def get_state(game_id):
+    """Return the live state of an unfinished game, restored from its last flush if not cached."""
+    state = live_cache().get(state_key(game_id))
+    if state is None:  # occurs when the cache entry expired or was evicted
+        game = LiveGame.objects.select_related('player_a', 'player_b').filter(pk=game_id, match=None).first()
+        if game is None:
+            raise LiveGame.DoesNotExist(f'No live game {game_id}.')
+        state = new_state(game, [game.player_a.full_name, game.player_b.full_name])
+        save_state(state)
+    return state
+
+
+def get_live_states(league_id):
+    """Return the live state of every game of the league started within the live timeout."""
+    since = timezone.now() - timedelta(seconds=settings.LEADERBOARD_LIVE_TIMEOUT)
+    game_ids = LiveGame.objects.filter(league_id=league_id, match=None, started__gte=since).values_list('id', flat=True)
+    cached = live_cache().get_many([state_key(game_id) for game_id in game_ids])
+    return [cached.get(state_key(game_id)) or get_state(game_id) for game_id in game_ids]
+
+
+def flush(state):
+    """Write the point log of the game to the database."""
+    LiveGame.objects.filter(pk=state['id']).update(points=state['log'])
+    state['flushed'] = len(state['log'])
+    state['flushed_at'] = time.time()
+
+
+def record_point(game_id, side, seq):
+    """
+    Record the winner of a rally ('a' or 'b'), or undo the last one, and return the live state.
+
+    ``seq`` is the number of points the scorer believes were played, so a
+    retried or out of date request raises ScoreConflict instead of counting
+    a point twice.
+    """
+    if side not in SIDES and side != UNDO:
+        raise ValueError(f'Side must be one of {list(SIDES) + [UNDO]}.')
+    with game_lock(game_id):
+        state = get_state(game_id)
+        if seq != len(state['log']):
+            raise ScoreConflict(state)
+        if side == UNDO:
+            if not state['log']:
+                raise ValueError('There is no point to undo.')
+            state['score'][SIDES.index(state['log'][-1])] -= 1
+            state['log'] = state['log'][:-1]
+            state['flushed'] = min(state['flushed'], len(state['log']))
+        else:
+            state['score'][SIDES.index(side)] += 1
+            state['log'] += side
+        if (len(state['log']) - state['flushed'] >= settings.LEADERBOARD_LIVE_FLUSH_POINTS
+                or time.time() - state['flushed_at'] >= settings.LEADERBOARD_LIVE_FLUSH_SECONDS):
+            flush(state)
+        save_state(state)
+        return state
+
+
+def finish_game(game_id):
+    """
+    Save the final score of the game as a match and return it.
+
+    The result is validated like a submitted match form; on errors the game
+    stays live and ValueError carries the form errors.
+    """
+    with game_lock(game_id):
+        with transaction.atomic():
+            # the row lock makes a concurrent finish wait and then find the game finished
+            game = LiveGame.objects.select_for_update().get(pk=game_id, match=None)
+            state = get_state(game_id)
+            (a_score, b_score), (a_id, b_id) = state['score'], state['players']
+            winner, loser = (a_id, b_id) if a_score >= b_score else (b_id, a_id)
+            form = MatchForm(data={
+                'winner': winner, 'loser': loser,
+                'winning_score': max(a_score, b_score), 'losing_score': min(a_score, b_score),
+                'draw': a_score == b_score,
+            }, league=game.league)
+            if not form.is_valid():
+                raise ValueError(form.errors)
+            flush(state)
+            match = form.save()
+            LiveGame.objects.filter(pk=game_id).update(match=match)
+        live_cache().delete(state_key(game_id))
+    return match
@@ -0,0 +1,71 @@
+"""
+Monte Carlo simulation of the remaining fixtures of a season.
+
+Each simulation plays the fixtures in order with outcomes drawn from
+``EloRating.calculate_expected_score`` and Elo updates applied along the
+way; the final ratings decide the ranking. Simulations are run as NumPy
+batches of ``(simulations, players)`` ratings and batches can be spread
+across a process pool. No Django imports.
+"""
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from leaderboard.rankings import DEFAULT_K_FACTOR, EloRating
+
+
+def round_robin(players, rounds=1):
+    """Return fixtures where every pair of players meets once per round."""
+    return list(itertools.combinations(players, 2)) * rounds
+
+
+def simulate_rank_counts(ratings, home, away, num_simulations, k_factor=DEFAULT_K_FACTOR, seed=None):
+    """
+    Return how often each player finished in each rank as a (players, ranks) array.
+
+    ``ratings`` holds the starting rating of every player and ``home`` and
+    ``away`` the player indices of each fixture in playing order.
+    """
+    rng = np.random.default_rng(seed)
+    num_players = len(ratings)
+    simulated = np.repeat(np.asarray(ratings, dtype=float)[np.newaxis, :], num_simulations, axis=0)
+    rows = np.arange(num_simulations)
+    for player, opponent in zip(home.tolist(), away.tolist()):
+        player_rating, opponent_rating = simulated[:, player], simulated[:, opponent]
+        expected_score = EloRating.calculate_expected_score(player_rating, opponent_rating)
+        score = (rng.random(num_simulations) < expected_score).astype(float)
+        change = k_factor * (score - expected_score)
+        simulated[:, player] = player_rating + change
+        simulated[:, opponent] = opponent_rating - change
+    order = np.argsort(-simulated, axis=1, kind='mergesort')
+    ranks = np.empty_like(order)
+    ranks[rows[:, np.newaxis], order] = np.arange(num_players)
+    players = np.broadcast_to(np.arange(num_players), ranks.shape)
+    counts = np.bincount((players * num_players + ranks).ravel(), minlength=num_players ** 2)
+    return counts.reshape(num_players, num_players)
+
+
+def simulate_rank_probabilities(ratings, fixtures, num_simulations=10000, k_factor=DEFAULT_K_FACTOR,
+                                workers=None, simulations_per_batch=2000, seed=None):
+    """
+    Return each player's probability of finishing in each rank.
+
+    ``fixtures`` is a sequence of ``(player_index, opponent_index)`` pairs.
+    Simulations run in batches, on a process pool when ``workers`` > 1.
+    """
+    fixtures = np.asarray(fixtures, dtype=np.intp).reshape(-1, 2)
+    home, away = fixtures[:, 0], fixtures[:, 1]
+    batch_sizes = [
+        min(simulations_per_batch, num_simulations - start)
+        for start in range(0, num_simulations, simulations_per_batch)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+    args = [(ratings, home, away, batch_size, k_factor, batch_seed) for batch_size, batch_seed in zip(batch_sizes, seeds)]
+    workers = min(workers or 1, len(args))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            counts = sum(executor.map(simulate_rank_counts, *zip(*args)))
+    else:
+        counts = sum(simulate_rank_counts(*batch_args) for batch_args in args)
+    return counts / num_simulations
@@ -0,0 +1,79 @@
+// Keeps the leaderboard and game history up to date from the server-sent event stream.
+(function () {
+    var streamUrl = document.body.getAttribute('data-stream-url');
+    if (!streamUrl || !window.EventSource) {
+        return;
+    }
+    var maxMatches = 20;
+
+    function cell(text) {
+        var td = document.createElement('td');
+        td.textContent = text;
+        return td;
+    }
+
+    function floatformat(value) {
+        // mirrors Django's floatformat filter: one decimal place unless the value is whole
+        return Number.isInteger(value) ? String(value) : value.toFixed(1);
+    }
+
+    function playerRow(player) {
+        var tr = document.createElement('tr');
+        tr.id = 'player-ranking';
+        tr.appendChild(cell(player.rank === null ? 'N/A' : player.rank));
+        tr.appendChild(cell(player.name));
+        var rating = cell(player.rating);
+        if (player.interval) {
+            var interval = document.createElement('small');
+            interval.className = 'rating-interval';
+            interval.textContent = '-' + player.interval.low + '/+' + player.interval.high;
+            rating.appendChild(document.createTextNode(' '));
+            rating.appendChild(interval);
+        }
+        tr.appendChild(rating);
+        tr.appendChild(cell(player.games_played));
+        tr.appendChild(cell(player.wins));
+        tr.appendChild(cell(player.draws));
+        tr.appendChild(cell(player.losses));
+        tr.appendChild(cell((player.win_percent * 100).toFixed(1) + '%'));
+        tr.appendChild(cell(floatformat(player.points_per_game)));
+        var diff = player.avg_point_differential;
+        tr.appendChild(cell((diff < 0 ? '' : '+') + diff.toFixed(1)));
+        return tr;
+    }
+
+    function matchRow(match) {
+        var tr = document.createElement('tr');
+        tr.id = 'matches';
+        tr.setAttribute('data-match-id', match.id);
+        var date = new Date(match.datetime);
+        var pad = function (n) { return (n < 10 ? '0' : '') + n; };
+        tr.appendChild(cell(pad(date.getMonth() + 1) + '/' + pad(date.getDate()) + '/' + date.getFullYear()));
+        tr.appendChild(cell(match.winner + ' (' + match.winner_delta + ')'));
+        tr.appendChild(cell(match.winning_score + '-' + match.losing_score));
+        tr.appendChild(cell(match.loser + ' (' + match.loser_delta + ')'));
+        return tr;
+    }
+
+    var source = new EventSource(streamUrl);
+    source.addEventListener('leaderboard', function (event) {
+        var data = JSON.parse(event.data);
+        var players = document.getElementById('leaderboard-rows');
+        var rows = data.ranked.concat(data.unranked).map(playerRow);
+        players.innerHTML = '';
+        rows.forEach(function (row) { players.appendChild(row); });
+
+        var matches = document.getElementById('match-rows');
+        data.matches.forEach(function (match) {
+            var existing = matches.querySelector('[data-match-id="' + match.id + '"]');
+            if (existing) {
+                matches.replaceChild(matchRow(match), existing);
+            } else {
+                matches.insertBefore(matchRow(match), matches.firstChild);
+            }
+        });
+        while (matches.children.length > maxMatches) {
+            matches.removeChild(matches.lastChild);
+        }
+    });
+})();
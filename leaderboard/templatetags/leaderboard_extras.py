@@ -1,4 +1,5 @@
 from django import template
+from django.urls import reverse
 
 register = template.Library()
 
@@ -8,3 +9,11 @@ def percentage(value, decimal_places=0):
     """Convert number to percentage with specified decimal places."""
     percentage = format(value, f'.{decimal_places}%')
     return percentage
+
+
+@register.simple_tag
+def league_url(name, league):
+    """Reverse a leaderboard URL within the given league, using the root URLs for the default league."""
+    if league is None or league.is_default:
+        return reverse(name)
+    return reverse(name, kwargs={'league_slug': league.slug})
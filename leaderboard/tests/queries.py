@@ -0,0 +1,49 @@
+"""
+N+1 query detection for tests.
+
+Queries are grouped by their SQL with literals replaced by placeholders, so
+a lookup repeated per row of a table (``match.winner`` for every match, a
+stats query for every player) shows up as one statement run many times.
+"""
+import re
+from collections import Counter
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+LISTS = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+
+
+def normalize(sql):
+    """Return the signature of an SQL statement, with literals and lists of them replaced by placeholders."""
+    return LISTS.sub('(...)', LITERALS.sub('?', sql))
+
+
+class RepeatedQueriesContext(CaptureQueriesContext):
+    """Captures queries and fails the test if a statement signature runs more than max_repeats times."""
+
+    def __init__(self, test_case, max_repeats, connection=connection):
+        self.test_case = test_case
+        self.max_repeats = max_repeats
+        super().__init__(connection)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        super().__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return
+        repeated = [
+            (count, signature)
+            for signature, count in Counter(normalize(query['sql']) for query in self.captured_queries).items()
+            if count > self.max_repeats
+        ]
+        if repeated:
+            self.test_case.fail(
+                f'Statements repeated more than {self.max_repeats} times (N+1 queries?):\n'
+                + '\n'.join(f'{count}x {signature}' for count, signature in sorted(repeated, reverse=True))
+            )
+
+
+def assert_no_repeated_queries(test_case, max_repeats=3):
+    """Return a context manager failing the test when any statement runs more than max_repeats times in it."""
+    return RepeatedQueriesContext(test_case, max_repeats)
@@ -0,0 +1,193 @@
+import json
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from leaderboard.models import Match, Player, PlayerRating, SubmissionKey
+from leaderboard.rankings import EloRating
+
+
+class ReadApiTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        self.player3 = Player.objects.create(first_name='Joe', last_name='Hope')
+        for losing_score in range(5):
+            Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=losing_score)
+        Match.objects.create(winner=self.player3, loser=self.player1, winning_score=5, losing_score=5, draw=True)
+
+    def test_leaderboard_matches_model_stats(self):
+        """Test that the aggregated stats match the per player properties."""
+        rows = {row['id']: row for row in PlayerRating.get_leaderboard()}
+        for rated_player in PlayerRating.objects.all():
+            row = rows[rated_player.player_id]
+            for stat in ('games_played', 'wins', 'draws', 'losses', 'points_won', 'points_lost',
+                         'win_percent', 'points_per_game', 'avg_point_differential'):
+                self.assertEqual(row[stat], getattr(rated_player, stat), stat)
+
+    def test_leaderboard_queries_do_not_grow_with_players(self):
+        """Test that the leaderboard is built with a fixed number of queries."""
+        with self.assertNumQueries(4):  # league, ratings and one aggregate per match side
+            PlayerRating.get_leaderboard()
+
+    def test_leaderboard_endpoint(self):
+        """Test that ranked and unranked players are listed separately."""
+        data = self.client.get('/api/leaderboard/').json()
+        self.assertEqual([row['id'] for row in data['ranked']], [self.player1.id, self.player2.id])
+        self.assertEqual([row['rank'] for row in data['ranked']], [1, 2])
+        self.assertEqual([row['id'] for row in data['unranked']], [self.player3.id])
+
+    def test_fields_selector(self):
+        """Test that only the selected fields are returned."""
+        data = self.client.get('/api/leaderboard/', {'fields': 'name,rating'}).json()
+        self.assertEqual(data['ranked'][0], {'name': 'Bob Hope', 'rating': self.player1.playerrating.rating})
+
+    def test_unknown_field(self):
+        """Test that unknown fields are rejected."""
+        self.assertEqual(self.client.get('/api/leaderboard/', {'fields': 'password'}).status_code, 400)
+
+    def test_etag_not_modified(self):
+        """Test that unchanged data is answered with 304 until a new match is added."""
+        response = self.client.get('/api/leaderboard/')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/leaderboard/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Match.objects.create(winner=self.player2, loser=self.player3, winning_score=7, losing_score=1)
+        self.assertEqual(self.client.get('/api/leaderboard/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_matches_endpoint(self):
+        """Test that recent matches are listed newest first with player names."""
+        data = self.client.get('/api/matches/', {'limit': 2}).json()
+        self.assertEqual(len(data['matches']), 2)
+        self.assertEqual(data['matches'][0]['winner'], 'Joe Hope')
+        self.assertTrue(data['matches'][0]['draw'])
+
+    def test_matches_limit(self):
+        """Test that the number of matches is bounded."""
+        self.assertEqual(self.client.get('/api/matches/', {'limit': 100000}).status_code, 400)
+
+    def test_players_endpoint(self):
+        """Test that players are listed by name."""
+        data = self.client.get('/api/players/', {'fields': 'name'}).json()
+        self.assertEqual(data['players'], [{'name': 'Bob Hope'}, {'name': 'Joe Hope'}, {'name': 'Sue Hope'}])
+
+    def test_player_endpoint(self):
+        """Test that a player's record includes their recent matches."""
+        data = self.client.get(f'/api/players/{self.player3.id}/').json()
+        self.assertEqual(data['player']['draws'], 1)
+        self.assertEqual(len(data['recent_matches']), 1)
+        self.assertEqual(self.client.get('/api/players/999/').status_code, 404)
+
+
+class SubmitMatchesTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user(username='testuser'))
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        self.player3 = Player.objects.create(first_name='Joe', last_name='Hope')
+        self.results = [
+            {'winner': self.player1.id, 'loser': self.player2.id, 'winning_score': 7, 'losing_score': 3},
+            {'winner': self.player2.id, 'loser': self.player3.id, 'winning_score': 7, 'losing_score': 5},
+            {'winner': self.player3.id, 'loser': self.player1.id, 'winning_score': 4, 'losing_score': 4, 'draw': True},
+        ]
+
+    def submit(self, matches, headers=None, **payload):
+        payload['matches'] = matches
+        return self.client.post(
+            '/api/matches/batch/', json.dumps(payload), content_type='application/json', **(headers or {})
+        )
+
+    def expected_ratings(self, results):
+        elo_rating = EloRating(PlayerRating.get_current_ratings().ratings)
+        for result in results:
+            elo_rating.update_ratings(result['winner'], result['loser'], result.get('draw', False))
+        return elo_rating.ratings
+
+    def test_requires_login(self):
+        """Test that anonymous batches are rejected."""
+        self.client.logout()
+        self.assertEqual(self.submit(self.results).status_code, 401)
+
+    def test_batch_rated_in_order(self):
+        """Test that a batch gives the same ratings and deltas as adding the matches one by one."""
+        expected = self.expected_ratings(self.results)
+        response = self.submit(self.results)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 3)
+        self.assertEqual(dict(PlayerRating.objects.values_list('player_id', 'rating')), expected)
+        first = Match.objects.order_by('datetime', 'id').first()
+        self.assertEqual((first.winner_delta, first.loser_delta), (15, -15))
+
+    def test_invalid_item_rejects_batch(self):
+        """Test that an invalid match rejects the whole batch by default."""
+        results = self.results + [{'winner': self.player1.id, 'loser': self.player1.id}]
+        response = self.submit(results)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'][0]['index'], 3)
+        self.assertEqual(Match.objects.count(), 0)
+
+    def test_partial_batch(self):
+        """Test that partial batches add the valid matches and report the rest."""
+        results = [{'winner': self.player1.id}] + self.results
+        response = self.submit(results, partial=True)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 3)
+        self.assertEqual([error['index'] for error in response.json()['errors']], [0])
+        self.assertEqual(Match.objects.count(), 3)
+
+    def test_backdated_history_is_replayed(self):
+        """Test that a batch older than the latest match is rated by replaying the history."""
+        Match.objects.create(
+            winner=self.player3, loser=self.player2, winning_score=7, losing_score=0,
+            datetime=timezone.now() + timedelta(days=1),
+        )
+        self.submit(self.results)
+        ratings = dict(PlayerRating.objects.values_list('player_id', 'rating'))
+        PlayerRating.generate_ratings()
+        self.assertEqual(dict(PlayerRating.objects.values_list('player_id', 'rating')), ratings)
+
+    def test_retried_batch_returns_original_result(self):
+        """Test that a batch retried with the same idempotency key is only added once."""
+        first = self.submit(self.results, headers={'HTTP_IDEMPOTENCY_KEY': 'night-1'})
+        ratings = dict(PlayerRating.objects.values_list('player_id', 'rating'))
+        retry = self.submit(self.results, headers={'HTTP_IDEMPOTENCY_KEY': 'night-1'})
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Match.objects.count(), 3)
+        self.assertEqual(dict(PlayerRating.objects.values_list('player_id', 'rating')), ratings)
+
+    def test_reused_key_with_other_batch(self):
+        """Test that a key sent again with different matches is rejected rather than replayed."""
+        self.submit(self.results, headers={'HTTP_IDEMPOTENCY_KEY': 'night-1'})
+        response = self.submit(self.results[:1], headers={'HTTP_IDEMPOTENCY_KEY': 'night-1'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Match.objects.count(), 3)
+
+    def test_keys_are_per_user(self):
+        """Test that users sending the same key each get their batch added."""
+        self.submit(self.results, headers={'HTTP_IDEMPOTENCY_KEY': 'night-1'})
+        self.client.force_login(User.objects.create_user(username='otheruser'))
+        response = self.submit(self.results, headers={'HTTP_IDEMPOTENCY_KEY': 'night-1'})
+        self.assertEqual(response.json()['created'], 3)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+
+    def test_keys_expire(self):
+        """Test that a key can be used again once it expired."""
+        self.submit(self.results, headers={'HTTP_IDEMPOTENCY_KEY': 'night-1'})
+        SubmissionKey.objects.update(datetime=timezone.now() - timedelta(days=2))
+        response = self.submit(self.results, headers={'HTTP_IDEMPOTENCY_KEY': 'night-1'})
+        self.assertEqual(response.json()['created'], 3)
+        self.assertEqual(SubmissionKey.objects.count(), 1)
+
+    def test_failed_batch_releases_key(self):
+        """Test that a rejected batch doesn't use up its idempotency key."""
+        self.submit([{'winner': self.player1.id}], headers={'HTTP_IDEMPOTENCY_KEY': 'night-2'})
+        response = self.submit(self.results, headers={'HTTP_IDEMPOTENCY_KEY': 'night-2'})
+        self.assertEqual(response.json()['created'], 3)
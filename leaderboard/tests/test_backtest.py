@@ -0,0 +1,82 @@
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from leaderboard.backtest import Candidate, backtest, parallel_backtest, parameter_grid
+from leaderboard.models import Match, Player
+from leaderboard.rankings import EloRating
+
+
+class BacktestTest(TestCase):
+
+    def setUp(self):
+        """Set up a small history between three players."""
+        self.winners = np.array([0, 1, 2, 0, 1])
+        self.losers = np.array([1, 2, 0, 2, 0])
+        self.draws = np.array([False, False, True, False, False])
+
+    def test_matches_elo_rating(self):
+        """Test that a candidate scores the predictions of EloRating."""
+        elo_rating = EloRating(k_factor=20, default_rating=1200)
+        log_loss = 0
+        for winner, loser, draw in zip(self.winners, self.losers, self.draws):
+            expected_score = elo_rating.get_expected_score(winner, loser)
+            actual_score = 0.5 if draw else 1
+            log_loss -= actual_score * np.log(expected_score) + (1 - actual_score) * np.log(1 - expected_score)
+            elo_rating.update_ratings(winner, loser, draw=draw)
+        result, = backtest(self.winners, self.losers, self.draws, [Candidate(20, 1200, 'half')], 3)
+        self.assertAlmostEqual(result.log_loss, log_loss / 5)
+        self.assertEqual(result.num_predictions, 5)
+
+    def test_ignore_draws(self):
+        """Test that ignored draws are neither scored nor applied."""
+        result, = backtest(self.winners, self.losers, self.draws, [Candidate(20, 1200, 'ignore')], 3)
+        self.assertEqual(result.num_predictions, 4)
+
+    def test_burn_in(self):
+        """Test that burn-in matches are not scored."""
+        result, = backtest(self.winners, self.losers, self.draws, [Candidate(20, 1200, 'half')], 3, burn_in=2)
+        self.assertEqual(result.num_predictions, 3)
+
+    def test_initial_rating_of_debutants(self):
+        """Test that the initial rating only matters for players debuting after the burn-in."""
+        shared = backtest(self.winners, self.losers, self.draws, parameter_grid([20], [1200, 1450], ['half']), 3)
+        self.assertEqual(shared[0][3:], shared[1][3:])
+        # player 2 debuts in the second match, after the player 0 and 1 established in the first
+        debuts = backtest(
+            self.winners, self.losers, self.draws, parameter_grid([20], [1200, 1450], ['half']), 3, burn_in=1
+        )
+        self.assertNotEqual(debuts[0].log_loss, debuts[1].log_loss)
+
+    def test_parallel_matches_serial(self):
+        """Test that splitting the grid across processes gives the same results."""
+        candidates = parameter_grid(range(1, 41), [1200, 1450])
+        serial = backtest(self.winners, self.losers, self.draws, candidates, 3)
+        parallel = parallel_backtest(
+            self.winners, self.losers, self.draws, candidates, 3, workers=2, min_candidates_per_worker=10
+        )
+        self.assertEqual(parallel, serial)
+
+
+class BacktestRatingsCommandTest(TestCase):
+
+    def test_command_reports_candidates(self):
+        """Test that the command prints a row per candidate."""
+        player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        Match.objects.create(winner=player1, loser=player2, winning_score=7, losing_score=3)
+        out = StringIO()
+        call_command('backtest_ratings', '--k-factors', '20', '30', '--draw-handling', 'half', stdout=out)
+        self.assertIn('1 matches, 2 players, 2 candidates', out.getvalue())
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+
+    def test_command_needs_burn_in_for_initial_ratings(self):
+        """Test that initial ratings are only compared against players established in the burn-in."""
+        player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        Match.objects.create(winner=player1, loser=player2, winning_score=7, losing_score=3)
+        with self.assertRaises(CommandError):
+            call_command('backtest_ratings', '--initial-ratings', '1200', '1450', stdout=StringIO())
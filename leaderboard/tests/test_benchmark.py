@@ -0,0 +1,76 @@
+import io
+import json
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from leaderboard.benchmark import run_benchmarks, seed_league
+from leaderboard.forms import MatchForm
+from leaderboard.models import League, Match, Player, PlayerRating
+
+
+class SeedTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.league = League.objects.create(name='Benchmark', slug='benchmark')
+
+    def test_seed_league(self):
+        """Test that seeding adds rated players and valid matches in date order."""
+        seed_league(self.league, 20, 300, seed=1)
+        self.assertEqual(Player.objects.filter(league=self.league).count(), 20)
+        matches = list(Match.objects.filter(league=self.league).order_by('id'))
+        self.assertEqual(len(matches), 300)
+        self.assertEqual(matches, sorted(matches, key=lambda match: match.datetime))
+        for match in matches:
+            form = MatchForm(data={
+                'winner': match.winner_id, 'loser': match.loser_id, 'winning_score': match.winning_score,
+                'losing_score': match.losing_score, 'draw': match.draw,
+            }, league=self.league)
+            self.assertTrue(form.is_valid(), form.errors)
+        self.assertTrue(PlayerRating.objects.filter(league=self.league).exists())
+        self.assertTrue(any(match.winner_delta for match in Match.objects.filter(league=self.league)))
+
+    def test_seed_is_reproducible(self):
+        """Test that the same seed gives the same matches."""
+        other = League.objects.create(name='Other', slug='other')
+        seed_league(self.league, 10, 50, seed=3)
+        seed_league(other, 10, 50, seed=3)
+        scores = [
+            list(Match.objects.filter(league=league).order_by('id').values_list('winning_score', 'losing_score'))
+            for league in (self.league, other)
+        ]
+        self.assertEqual(scores[0], scores[1])
+
+    def test_seed_command(self):
+        """Test that the command adds players and matches to a new league."""
+        call_command('seed_benchmark', players=5, matches=30, league='office', seed=0, stdout=io.StringIO())
+        self.assertEqual(Match.objects.filter(league__slug='office').count(), 30)
+
+
+class BenchmarkTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_run_benchmarks(self):
+        """Test that every hot path is timed at every scale."""
+        results = run_benchmarks([(5, 20), (10, 60)], repeat=2)
+        self.assertEqual([(result['players'], result['matches']) for result in results['results']], [(5, 20), (10, 60)])
+        benchmarks = results['results'][1]['benchmarks']
+        self.assertEqual(set(benchmarks), {
+            'home_page', 'all_matches_first_page', 'all_matches_last_page', 'match_submission', 'generate_ratings',
+        })
+        self.assertEqual(benchmarks['home_page']['repeat'], 2)
+        self.assertGreater(results['results'][0]['elo_updates_per_second'], 0)
+        self.assertEqual(Match.objects.filter(league__slug='benchmark-10-60').count(), 60)  # submissions rolled back
+
+    def test_json_output(self):
+        """Test that the command writes its results as JSON."""
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command('run_benchmarks', scales=['4x10'], repeat=1, output=output.name,
+                         stdout=io.StringIO())
+            results = json.load(output)
+        self.assertEqual(results['results'][0]['matches'], 10)
@@ -0,0 +1,94 @@
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from leaderboard.bootstrap import rating_intervals, sample_ratings
+from leaderboard.caching import RATING_INTERVALS, get_for_ratings, get_ratings_version
+from leaderboard.models import Match, Player
+from leaderboard.rankings import EloRating
+
+
+class SampleRatingsTest(TestCase):
+
+    def setUp(self):
+        """Set up a history where player 0 mostly beats player 1."""
+        self.winners = np.array([0, 0, 0, 1, 0, 0])
+        self.losers = np.array([1, 1, 1, 0, 1, 1])
+        self.draws = np.zeros(6, dtype=bool)
+
+    def test_shuffle_preserves_match_results(self):
+        """Test that a reshuffled history has the same total rating change direction."""
+        ratings = sample_ratings(self.winners, self.losers, self.draws, 2, 50, method='shuffle', seed=1)
+        self.assertTrue((ratings[:, 0] > ratings[:, 1]).all())
+
+    def test_single_sample_matches_elo_rating(self):
+        """Test that the engine replays like EloRating, without rounding."""
+        ratings = sample_ratings(self.winners[:1], self.losers[:1], self.draws[:1], 2, 1, seed=1)
+        elo_rating = EloRating()
+        elo_rating.update_ratings(0, 1)
+        self.assertEqual(ratings[0].tolist(), [elo_rating.get_rating(0), elo_rating.get_rating(1)])
+
+    def test_unknown_method(self):
+        """Test that an unknown resampling method raises an error."""
+        with self.assertRaises(ValueError):
+            sample_ratings(self.winners, self.losers, self.draws, 2, 10, method='unknown')
+
+    def test_intervals_are_ordered_and_reproducible(self):
+        """Test that intervals are ordered and the same for the same seed on a pool."""
+        lower, median, upper = rating_intervals(
+            self.winners, self.losers, self.draws, 2, num_samples=200, samples_per_worker=50, seed=3
+        )
+        self.assertTrue((lower <= median).all() and (median <= upper).all())
+        pooled = rating_intervals(
+            self.winners, self.losers, self.draws, 2, num_samples=200, samples_per_worker=50, seed=3, workers=2
+        )
+        self.assertEqual(lower.tolist(), pooled[0].tolist())
+
+
+class ComputeRatingIntervalsCommandTest(TestCase):
+
+    def setUp(self):
+        """Set up players with a few matches."""
+        cache.clear()
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        for losing_score in range(3):
+            Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=losing_score)
+
+    def test_caches_intervals_for_current_ratings(self):
+        """Test that intervals are cached for the current ratings version."""
+        call_command('compute_rating_intervals', '--samples', '20', '--workers', '1', stdout=StringIO())
+        intervals = get_for_ratings(RATING_INTERVALS, self.player1.league_id)
+        self.assertEqual(set(intervals), {self.player1.id, self.player2.id})
+        self.assertGreaterEqual(intervals[self.player1.id]['high'], 0)
+
+    def test_new_match_invalidates_intervals(self):
+        """Test that new ratings make the cached intervals stale, showing the last ones until recomputed."""
+        call_command('compute_rating_intervals', '--samples', '20', '--workers', '1', stdout=StringIO())
+        version = get_ratings_version(self.player1.league_id)
+        intervals = get_for_ratings(RATING_INTERVALS, self.player1.league_id)
+        Match.objects.create(winner=self.player2, loser=self.player1, winning_score=7, losing_score=5)
+        self.assertNotEqual(get_ratings_version(self.player1.league_id), version)
+        self.assertIsNone(get_for_ratings(RATING_INTERVALS, self.player1.league_id, fallback=False))
+        self.assertEqual(get_for_ratings(RATING_INTERVALS, self.player1.league_id), intervals)
+
+    def test_intervals_expire(self):
+        """Test that intervals replace the previous ones and expire with the results timeout."""
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            call_command('compute_rating_intervals', '--samples', '20', '--workers', '1', stdout=StringIO())
+            Match.objects.create(winner=self.player2, loser=self.player1, winning_score=7, losing_score=5)
+            call_command('compute_rating_intervals', '--samples', '20', '--workers', '1', stdout=StringIO())
+        stored = [call for call in cache_set.call_args_list if 'rating_intervals' in call[0][0]]
+        self.assertEqual(len({call[0][0] for call in stored}), 1)
+        self.assertEqual(stored[0][1]['timeout'], settings.LEADERBOARD_RESULTS_CACHE_TIMEOUT)
+
+    def test_home_page_shows_intervals(self):
+        """Test that the leaderboard shows the cached interval next to the rating."""
+        call_command('compute_rating_intervals', '--samples', '20', '--workers', '1', stdout=StringIO())
+        response = self.client.get('/')
+        self.assertContains(response, 'rating-interval', count=2)
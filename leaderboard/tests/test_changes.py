@@ -0,0 +1,111 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from leaderboard.models import ChangeLogEntry, League, Match, Player, PlayerRating, RatingAdjustment
+
+
+class ChangeLogTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+
+    def kinds(self, since=0):
+        return [change['kind'] for change in ChangeLogEntry.get_page(self.player1.league_id, since=since)]
+
+    def test_player_save_is_logged(self):
+        """Test that adding a player logs the player."""
+        change = ChangeLogEntry.get_page(self.player1.league_id)[0]
+        self.assertEqual(change['kind'], ChangeLogEntry.PLAYER)
+        self.assertEqual(change['data']['first_name'], 'Bob')
+
+    def test_match_save_is_logged(self):
+        """Test that a new match logs the match and both rating changes."""
+        since = ChangeLogEntry.objects.latest('seq').seq
+        match = Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+        changes = ChangeLogEntry.get_page(self.player1.league_id, since=since)
+        self.assertEqual(sorted(change['kind'] for change in changes), ['match', 'rating', 'rating'])
+        match_change = next(change for change in changes if change['kind'] == ChangeLogEntry.MATCH)
+        self.assertEqual(match_change['data']['winner_delta'], match.winner_delta)
+
+    def test_failed_save_is_not_logged(self):
+        """Test that the log is written in the same transaction as the match."""
+        count = ChangeLogEntry.objects.count()
+        with mock.patch.object(PlayerRating, 'add_ratings', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+        self.assertEqual(ChangeLogEntry.objects.count(), count)
+        self.assertEqual(Match.objects.count(), 0)
+
+    def test_replay_logs_rewritten_deltas(self):
+        """Test that deltas rewritten by a replay are logged."""
+        match = Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+        Match.objects.filter(pk=match.pk).update(winner_delta=0, loser_delta=0)
+        since = ChangeLogEntry.objects.latest('seq').seq
+        PlayerRating.generate_ratings()
+        changes = ChangeLogEntry.get_page(self.player1.league_id, since=since)
+        self.assertEqual(changes[-1]['data'], {'id': match.id, 'winner_delta': 15, 'loser_delta': -15})
+
+    def test_decay_is_logged(self):
+        """Test that decayed ratings are logged."""
+        Match.objects.create(
+            winner=self.player1, loser=self.player2, winning_score=7, losing_score=3,
+            datetime=timezone.now() - timedelta(weeks=8),
+        )
+        since = ChangeLogEntry.objects.latest('seq').seq
+        RatingAdjustment.apply_decay(4, 10)
+        change = ChangeLogEntry.get_page(self.player1.league_id, since=since)[0]
+        self.assertEqual(change['data'], {'player_id': self.player1.id, 'rating': 1455})
+
+    def test_changes_are_per_league(self):
+        """Test that a league's feed only has its own changes."""
+        office = League.objects.create(name='Office', slug='office')
+        Player.objects.create(league=office, first_name='Joe', last_name='Hope')
+        self.assertEqual(len(ChangeLogEntry.get_page(office.id)), 1)
+        self.assertEqual(self.kinds(), ['player', 'player'])
+
+    def test_seqs_are_contiguous_per_league(self):
+        """Test that every league numbers its changes from one without gaps, even after a rollback."""
+        office = League.objects.create(name='Office', slug='office')
+        Player.objects.create(league=office, first_name='Joe', last_name='Hope')
+        with mock.patch.object(PlayerRating, 'add_ratings', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+        Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+        for league_id in (self.player1.league_id, office.id):
+            seqs = list(ChangeLogEntry.objects.filter(league_id=league_id).order_by('seq').values_list(
+                'seq', flat=True
+            ))
+            self.assertEqual(seqs, list(range(1, len(seqs) + 1)))
+            self.assertEqual(League.objects.get(pk=league_id).last_change_seq, len(seqs))
+
+
+class ChangesEndpointTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+
+    def test_pages_until_caught_up(self):
+        """Test that following the cursor returns every change once."""
+        seen, since = [], 0
+        while True:
+            data = self.client.get('/api/changes/', {'since': since, 'limit': 2}).json()
+            seen += [change['seq'] for change in data['changes']]
+            since = data['next']
+            if not data['has_more']:
+                break
+        self.assertEqual(seen, list(ChangeLogEntry.objects.order_by('seq').values_list('seq', flat=True)))
+        data = self.client.get('/api/changes/', {'since': since}).json()
+        self.assertEqual((data['changes'], data['next']), ([], since))
+
+    def test_invalid_cursor(self):
+        """Test that invalid cursors are rejected."""
+        self.assertEqual(self.client.get('/api/changes/', {'since': 'abc'}).status_code, 400)
@@ -0,0 +1,93 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from leaderboard.models import Match, Player, PlayerRating, RatingAdjustment
+
+
+class RatingDecayTest(TestCase):
+
+    def setUp(self):
+        """Set up an inactive and an active player, both above the floor."""
+        self.now = timezone.now()
+        self.inactive = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.active = Player.objects.create(first_name='Sue', last_name='Hope')
+        self.opponent = Player.objects.create(first_name='Joe', last_name='Hope')
+        Match.objects.create(winner=self.inactive, loser=self.opponent, winning_score=7, losing_score=1,
+                             datetime=self.now - timedelta(weeks=10))
+        Match.objects.create(winner=self.active, loser=self.opponent, winning_score=7, losing_score=1,
+                             datetime=self.now - timedelta(days=1))
+
+    def rating(self, player):
+        return PlayerRating.objects.get(pk=player.id).rating
+
+    def test_decays_inactive_players(self):
+        """Test that only players inactive for the given weeks decay."""
+        inactive_rating, active_rating = self.rating(self.inactive), self.rating(self.active)
+        decayed = RatingAdjustment.apply_decay(4, 10, now=self.now)
+        self.assertEqual(decayed, {self.inactive.id: -10})
+        self.assertEqual(self.rating(self.inactive), inactive_rating - 10)
+        self.assertEqual(Player.objects.get(pk=self.inactive.id).rating, inactive_rating - 10)
+        self.assertEqual(self.rating(self.active), active_rating)
+
+    def test_records_adjustment(self):
+        """Test that every decay is recorded as an adjustment."""
+        RatingAdjustment.apply_decay(4, 10, now=self.now)
+        adjustment = RatingAdjustment.objects.get()
+        self.assertEqual((adjustment.player, adjustment.delta), (self.inactive, -10))
+
+    def test_never_below_floor(self):
+        """Test that ratings stop decaying at the floor."""
+        floor = self.rating(self.inactive) - 4
+        self.assertEqual(RatingAdjustment.apply_decay(4, 10, floor=floor, now=self.now), {self.inactive.id: -4})
+        self.assertEqual(RatingAdjustment.apply_decay(4, 10, floor=floor, now=self.now + timedelta(weeks=2)), {})
+
+    def test_decays_once_a_week(self):
+        """Test that running the job again within a week doesn't decay twice."""
+        RatingAdjustment.apply_decay(4, 10, now=self.now)
+        self.assertEqual(RatingAdjustment.apply_decay(4, 10, now=self.now + timedelta(days=1)), {})
+        self.assertEqual(len(RatingAdjustment.apply_decay(4, 10, now=self.now + timedelta(weeks=1))), 1)
+
+    def test_decay_survives_replay(self):
+        """Test that a full recompute keeps recorded adjustments."""
+        RatingAdjustment.apply_decay(4, 10, now=self.now)
+        rating = self.rating(self.inactive)
+        PlayerRating.generate_ratings()
+        self.assertEqual(self.rating(self.inactive), rating)
+
+    def test_replay_applies_decay_in_order(self):
+        """Test that a full recompute applies decay before the later matches, as the live ratings did."""
+        RatingAdjustment.apply_decay(4, 10, now=self.now - timedelta(weeks=2))
+        Match.objects.create(winner=self.opponent, loser=self.inactive, winning_score=7, losing_score=1,
+                             datetime=self.now - timedelta(hours=1))
+        ratings = dict(PlayerRating.objects.values_list('player_id', 'rating'))
+        PlayerRating.generate_ratings()
+        self.assertEqual(dict(PlayerRating.objects.values_list('player_id', 'rating')), ratings)
+
+    def test_players_without_matches_never_decay(self):
+        """Test that players who never played keep the rating they were added with."""
+        Player.objects.create(first_name='Ann', last_name='Hope', rating=1600)
+        self.assertEqual(RatingAdjustment.apply_decay(4, 10, now=self.now), {self.inactive.id: -10})
+
+    def test_dry_run(self):
+        """Test that a dry run changes nothing."""
+        rating = self.rating(self.inactive)
+        RatingAdjustment.apply_decay(4, 10, now=self.now, dry_run=True)
+        self.assertEqual(self.rating(self.inactive), rating)
+        self.assertFalse(RatingAdjustment.objects.exists())
+
+    def test_command(self):
+        """Test that the command reports decayed players."""
+        out = StringIO()
+        call_command('apply_rating_decay', '--weeks', '4', stdout=out)
+        self.assertIn('Bob Hope: -10', out.getvalue())
+
+    def test_command_disabled_by_default(self):
+        """Test that decay is off unless configured."""
+        out = StringIO()
+        call_command('apply_rating_decay', stdout=out)
+        self.assertIn('disabled', out.getvalue())
+        self.assertFalse(RatingAdjustment.objects.exists())
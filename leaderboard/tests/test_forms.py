@@ -47,6 +47,13 @@ class MatchFormTest(TestCase):
         for player in self.players:
             self.assertIn(player.full_name, str(loser_field))
 
+    def test_players_fetched_once(self):
+        """Test that both selects are rendered from one query of the players."""
+        with self.assertNumQueries(1):
+            form = MatchForm()
+            html = str(form['winner']) + str(form['loser'])
+        self.assertEqual(html.count(self.player1.full_name), 2)
+
     def test_winning_score_greater_than_20(self):
         """Test that the winning score must be greater than 20."""
         form = MatchForm(
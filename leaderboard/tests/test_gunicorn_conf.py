@@ -0,0 +1,66 @@
+import os
+from unittest import mock
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+CONFIG = os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+with open(CONFIG) as f:  # read up front, the tests patch open to fake the cgroup files
+    SOURCE = f.read()
+
+
+def run_config():
+    config = {}
+    exec(compile(SOURCE, CONFIG, 'exec'), config)
+    return config
+
+
+class GunicornConfigTest(SimpleTestCase):
+
+    def load(self, cpus=4, **environ):
+        with mock.patch.dict(os.environ, environ, clear=True), mock.patch('os.cpu_count', return_value=cpus), \
+                mock.patch('builtins.open', side_effect=FileNotFoundError):
+            config = run_config()
+            config['replay_workers'] = os.environ['LEADERBOARD_REPLAY_WORKERS']
+        return config
+
+    def test_defaults(self):
+        """Test that gthread workers follow the CPU count and share the CPUs for replays."""
+        config = self.load()
+        self.assertEqual((config['worker_class'], config['workers'], config['threads']), ('gthread', 4, 32))
+        self.assertEqual((config['max_requests'], config['max_requests_jitter']), (1000, 100))
+        self.assertEqual(config['bind'], '0.0.0.0:8000')
+        self.assertTrue(config['preload_app'])
+        self.assertEqual(config['replay_workers'], '1')
+
+    def test_sync_workers(self):
+        config = self.load(GUNICORN_WORKER_CLASS='sync', PORT='80')
+        self.assertEqual((config['workers'], config['threads'], config['bind']), (9, 1, '0.0.0.0:80'))
+
+    def test_environment(self):
+        """Test that the worker model can be tuned through the environment."""
+        config = self.load(WEB_CONCURRENCY='2', WEB_THREADS='10', GUNICORN_PRELOAD='false', GUNICORN_TIMEOUT='300')
+        self.assertEqual((config['workers'], config['threads'], config['timeout']), (2, 10, 300))
+        self.assertFalse(config['preload_app'])
+        self.assertEqual(config['replay_workers'], '2')
+
+    def test_cpu_quota(self):
+        """Test that the container's CPU quota limits the workers, not the host's CPU count."""
+        quota = mock.mock_open(read_data='150000 100000\n')
+        with mock.patch.dict(os.environ, {}, clear=True), mock.patch('os.cpu_count', return_value=16), \
+                mock.patch('builtins.open', quota):
+            self.assertEqual(run_config()['workers'], 2)
+
+    def test_gevent_workers(self):
+        """Test that gevent workers hold many connections each and import the app after patching."""
+        config = self.load(GUNICORN_WORKER_CLASS='gevent')
+        self.assertEqual((config['workers'], config['threads'], config['worker_connections']), (4, 1, 1000))
+        self.assertFalse(config['preload_app'])
+        psycogreen = mock.Mock()
+        with mock.patch.dict('sys.modules', {'psycogreen': psycogreen, 'psycogreen.gevent': psycogreen.gevent}):
+            config['post_fork'](mock.Mock(), mock.Mock())
+        psycogreen.gevent.patch_psycopg.assert_called_once_with()
+
+    def test_unknown_worker_class(self):
+        with self.assertRaises(ValueError):
+            self.load(GUNICORN_WORKER_CLASS='tornado')
@@ -0,0 +1,94 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from leaderboard.caching import get_ratings_version
+from leaderboard.forms import MatchForm, PlayerForm
+from leaderboard.models import League, Match, Player, PlayerRating
+from leaderboard.rankings import DEFAULT_ELO_RATING
+
+
+class LeagueTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.default = League.get_default()
+        self.office = League.objects.create(name='Office', slug='office')
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        self.office1 = Player.objects.create(league=self.office, first_name='Bob', last_name='Hope')
+        self.office2 = Player.objects.create(league=self.office, first_name='Joe', last_name='Hope')
+
+    def test_default_league_id_is_cached(self):
+        """Test that the committed default league is resolved without a query, until it is deleted."""
+        self.assertIsNone(League.default_id)  # the test's transaction never commits
+        self.addCleanup(setattr, League, 'default_id', None)
+        with mock.patch('django.db.transaction.on_commit', lambda callback: callback()):
+            League.get_default()
+        with self.assertNumQueries(0):
+            self.assertEqual(League.resolve_id(), self.default.id)
+        self.default.delete()
+        self.assertIsNone(League.default_id)
+        self.assertNotEqual(League.resolve_id(), self.default.id)
+
+    def test_players_default_to_default_league(self):
+        """Test that players created without a league join the default league."""
+        self.assertEqual(self.player1.league, self.default)
+
+    def test_same_name_in_different_leagues(self):
+        """Test that player names only have to be unique within a league."""
+        form = PlayerForm(data={'first_name': 'Sue', 'last_name': 'Hope', 'rating': 1450}, league=self.office)
+        self.assertTrue(form.is_valid())
+        form = PlayerForm(data={'first_name': 'Sue', 'last_name': 'Hope', 'rating': 1450}, league=self.default)
+        self.assertFalse(form.is_valid())
+
+    def test_match_joins_league_of_players(self):
+        """Test that a match belongs to the league of its players."""
+        match = Match.objects.create(winner=self.office1, loser=self.office2, winning_score=7, losing_score=3)
+        self.assertEqual(match.league, self.office)
+
+    def test_ratings_are_scoped_to_league(self):
+        """Test that a match only changes the ratings of its own league."""
+        Match.objects.create(winner=self.office1, loser=self.office2, winning_score=7, losing_score=3)
+        self.assertEqual(set(PlayerRating.get_current_ratings(self.default.id).ratings), {self.player1.id, self.player2.id})
+        self.assertEqual(PlayerRating.objects.get(pk=self.player1.id).rating, DEFAULT_ELO_RATING)
+        self.assertGreater(PlayerRating.objects.get(pk=self.office1.id).rating, DEFAULT_ELO_RATING)
+
+    def test_generate_ratings_keeps_other_leagues(self):
+        """Test that replaying one league leaves the ratings of others alone."""
+        Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+        Match.objects.create(winner=self.office1, loser=self.office2, winning_score=7, losing_score=3)
+        before = dict(PlayerRating.objects.values_list('player_id', 'rating'))
+        PlayerRating.generate_ratings(self.office.id)
+        self.assertEqual(dict(PlayerRating.objects.values_list('player_id', 'rating')), before)
+
+    def test_cache_versions_are_per_league(self):
+        """Test that new ratings in one league keep the cached results of others."""
+        default_version = get_ratings_version(self.default.id)
+        office_version = get_ratings_version(self.office.id)
+        Match.objects.create(winner=self.office1, loser=self.office2, winning_score=7, losing_score=3)
+        self.assertEqual(get_ratings_version(self.default.id), default_version)
+        self.assertNotEqual(get_ratings_version(self.office.id), office_version)
+
+    def test_match_form_limited_to_league(self):
+        """Test that the match form only offers players of its league."""
+        form = MatchForm(league=self.office)
+        self.assertEqual(set(form.fields['winner'].queryset), {self.office1, self.office2})
+
+    def test_league_home_page(self):
+        """Test that the league home page only lists the league's players."""
+        response = self.client.get('/leagues/office/')
+        self.assertEqual(response.context['league'], self.office)
+        players = response.context['unranked_players']
+        self.assertEqual({rated['id'] for rated in players}, {self.office1.id, self.office2.id})
+        self.assertContains(response, 'href="/leagues/office/matches/"')
+
+    def test_unknown_league(self):
+        """Test that unknown leagues are not found."""
+        self.assertEqual(self.client.get('/leagues/unknown/').status_code, 404)
+
+    def test_league_api(self):
+        """Test that the API is served per league."""
+        response = self.client.get('/leagues/office/api/win-probabilities/')
+        self.assertEqual(set(response.json()['players']), {self.office1.id, self.office2.id})
@@ -0,0 +1,96 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from leaderboard.live import Broadcaster, event_stream
+from leaderboard.models import League, Match, Player
+
+
+def parse_event(event):
+    fields = dict(line.split(': ', 1) for line in event.strip().split('\n'))
+    return fields['event'], json.loads(fields['data'])
+
+
+class BroadcasterTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        self.league_id = self.player1.league_id
+        self.broadcaster = Broadcaster()
+
+    def test_new_client_gets_leaderboard(self):
+        """Test that new clients get the current leaderboard on the next poll."""
+        client = self.broadcaster.subscribe(self.league_id)
+        self.broadcaster.poll()
+        event, data = parse_event(client.get_nowait())
+        self.assertEqual(event, 'leaderboard')
+        self.assertEqual(len(data['unranked']), 2)
+        self.assertEqual(data['matches'], [])
+
+    def test_match_is_pushed_to_every_client(self):
+        """Test that a new match reaches all clients with one set of queries."""
+        self.broadcaster.poll()
+        clients = [self.broadcaster.subscribe(self.league_id) for _ in range(3)]
+        self.broadcaster.poll()
+        for client in clients:
+            client.get_nowait()
+        Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+        with self.assertNumQueries(6):  # changes, leaderboard, cached intervals and new matches
+            self.broadcaster.poll()
+        events = [parse_event(client.get_nowait()) for client in clients]
+        self.assertEqual(events[0], events[2])
+        self.assertEqual(events[0][1]['matches'][0]['winner'], 'Bob Hope')
+
+    def test_late_client_gets_snapshot(self):
+        """Test that a client joining later gets the latest board without the old matches."""
+        self.broadcaster.subscribe(self.league_id)
+        self.broadcaster.poll()
+        Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+        self.broadcaster.poll()
+        with self.assertNumQueries(0):
+            client = self.broadcaster.subscribe(self.league_id)
+        event, data = parse_event(client.get_nowait())
+        self.assertEqual(data['matches'], [])
+        self.assertEqual(data['unranked'][0]['games_played'], 1)
+
+    def test_other_leagues_are_not_pushed(self):
+        """Test that clients only get updates of their league."""
+        office = League.objects.create(name='Office', slug='office')
+        client = self.broadcaster.subscribe(office.id)
+        self.broadcaster.poll()
+        client.get_nowait()
+        Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+        self.broadcaster.poll()
+        self.assertTrue(client.empty())
+
+    def test_event_ids_are_league_seqs(self):
+        """Test that events carry the sequence number of the league's last change, to resume from."""
+        office = League.objects.create(name='Office', slug='office')
+        Player.objects.create(league=office, first_name='Joe', last_name='Hope')
+        client = self.broadcaster.subscribe(self.league_id)
+        self.broadcaster.poll()
+        client.get_nowait()
+        Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+        self.broadcaster.poll()
+        event = client.get_nowait()
+        self.assertTrue(event.startswith(f'id: {League.objects.get(pk=self.league_id).last_change_seq}\n'))
+
+    def test_stream_unsubscribes_on_close(self):
+        """Test that closing a stream removes its client."""
+        with mock.patch.object(Broadcaster, 'start'):
+            stream = event_stream(self.league_id, keepalive=0.01, broadcaster=self.broadcaster)
+            self.assertTrue(next(stream).startswith('retry:'))
+            self.assertEqual(next(stream), ': keepalive\n\n')
+            stream.close()
+        self.assertEqual(self.broadcaster.subscribers, {})
+
+    def test_stream_endpoint(self):
+        """Test that the endpoint answers with an event stream."""
+        response = self.client.get('/api/stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(response.streaming)
+        response.close()
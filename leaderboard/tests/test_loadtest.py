@@ -0,0 +1,57 @@
+import io
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+
+from leaderboard.benchmark import seed_league
+from leaderboard.loadtest import check_ratings, parse_mix, run_load_test
+from leaderboard.models import League, Match, PlayerRating
+
+
+@override_settings(LEADERBOARD_USER_WRITES_PER_MINUTE=0, LEADERBOARD_GLOBAL_WRITES_PER_MINUTE=0)
+class LoadTestTest(TransactionTestCase):  # the simulated users see the data through their own connections
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(setattr, League, 'default_id', None)  # the flush after the test deletes the league
+        self.league = League.objects.create(name='Load test', slug='loadtest')
+        seed_league(self.league, 10, 100, seed=1)
+
+    def test_run(self):
+        """Test that a single user runs every action and leaves consistent ratings."""
+        report = run_load_test(self.league, users=1, duration=1, seed=1,
+                               mix={'poll': 1, 'home': 1, 'browse': 1, 'submit': 1})
+        self.assertEqual(report['errors'], {})
+        self.assertEqual(set(report['actions']), {'poll', 'home', 'browse', 'submit'})
+        self.assertEqual(set(report['actions']['submit']['statuses']), {'302'})
+        self.assertIn('p99_ms', report['actions']['poll'])
+        self.assertEqual(report['matches_added'], report['matches_submitted'])
+        self.assertEqual(Match.objects.filter(league=self.league).count(), 100 + report['matches_added'])
+        self.assertTrue(report['ratings']['consistent'])
+        self.assertFalse(User.objects.filter(username__startswith='loadtest-').exists())
+
+    def test_lost_update_is_detected(self):
+        """Test that a rating which differs from a replay of the matches is reported."""
+        self.assertTrue(check_ratings(self.league.id)['consistent'])
+        rating = PlayerRating.objects.filter(league=self.league).first()
+        PlayerRating.objects.filter(player_id=rating.player_id).update(rating=rating.rating - 16)
+        result = check_ratings(self.league.id)
+        self.assertFalse(result['consistent'])
+        self.assertEqual((result['players_off'], result['max_rating_difference']), (1, 16))
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('poll=3,submit=1'), {'poll': 3, 'submit': 1})
+        with self.assertRaises(ValueError):
+            parse_mix('delete=1')
+
+    def test_command(self):
+        """Test that the command prints the report as JSON."""
+        out = io.StringIO()
+        call_command('load_test', '--league', 'loadtest', '--users', '1', '--duration', '0.5',
+                     '--mix', 'poll=1,browse=1', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual((report['league'], report['users']), ('loadtest', 1))
+        self.assertGreater(report['requests'], 0)
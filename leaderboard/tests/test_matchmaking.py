@@ -0,0 +1,102 @@
+import numpy as np
+from django.test import TestCase
+
+from leaderboard.matchmaking import expected_score_matrix, greedy_pairs, improve_pairs, suggest_matches
+from leaderboard.models import Match, Player, PlayerRating
+from leaderboard.rankings import EloRating
+
+
+class MatchmakingTest(TestCase):
+
+    def test_expected_score_matrix(self):
+        """Test that the matrix matches pairwise expected scores."""
+        ratings = [1600, 1450, 1300]
+        matrix = expected_score_matrix(ratings)
+        for i, player_rating in enumerate(ratings):
+            for j, opponent_rating in enumerate(ratings):
+                self.assertAlmostEqual(
+                    matrix[i, j], EloRating.calculate_expected_score(player_rating, opponent_rating)
+                )
+
+    def test_pairs_closest_ratings(self):
+        """Test that players are paired with the closest rated opponent."""
+        suggestions = suggest_matches([1000, 1800, 1010, 1790])
+        pairs = {frozenset(suggestion[:2]) for suggestion in suggestions}
+        self.assertEqual(pairs, {frozenset((0, 2)), frozenset((1, 3))})
+
+    def test_avoids_recent_repeats(self):
+        """Test that recent meetings push players towards other opponents."""
+        recent_meetings = np.zeros((4, 4))
+        recent_meetings[0, 2] = recent_meetings[2, 0] = 3
+        suggestions = suggest_matches([1000, 1005, 1010, 1015], recent_meetings)
+        pairs = {frozenset(suggestion[:2]) for suggestion in suggestions}
+        self.assertNotIn(frozenset((0, 2)), pairs)
+
+    def test_improves_on_greedy_pairing(self):
+        """Test that opponents are swapped when the best single pair is not optimal."""
+        score = np.array([
+            [0, -1, 0.6, 0.6],
+            [-1, 0, 0.6, 0.6],
+            [0.6, 0.6, 0, 0.9],
+            [0.6, 0.6, 0.9, 0],
+        ])
+        players, opponents = greedy_pairs(score)
+        players, opponents = improve_pairs(score, players, opponents)
+        self.assertAlmostEqual(score[players, opponents].sum(), 1.2)
+
+    def test_odd_player_sits_out(self):
+        """Test that one player sits out when the number of players is odd."""
+        self.assertEqual(len(suggest_matches([1000, 1100, 1200])), 1)
+
+
+class MatchmakingApiTest(TestCase):
+
+    def setUp(self):
+        """Set up players with different ratings."""
+        self.players = [
+            Player.objects.create(first_name=name, last_name='Hope', rating=rating)
+            for name, rating in [('Bob', 1500), ('Sue', 1495), ('Joe', 1200), ('Ann', 1210)]
+        ]
+
+    def test_win_probabilities(self):
+        """Test that the matrix is returned for the requested players."""
+        ids = [self.players[0].id, self.players[2].id]
+        response = self.client.get('/api/win-probabilities/', {'players': f'{ids[0]},{ids[1]}'})
+        data = response.json()
+        self.assertEqual(data['players'], ids)
+        self.assertEqual(data['expected_scores'][0][0], 0.5)
+        self.assertGreater(data['expected_scores'][0][1], 0.5)
+
+    def test_repeated_players_count_once(self):
+        """Test that a player listed twice is only suggested and compared once."""
+        ids = [self.players[0].id, self.players[2].id]
+        data = self.client.get('/api/win-probabilities/', {'players': f'{ids[0]},{ids[1]},{ids[0]}'}).json()
+        self.assertEqual(data['players'], ids)
+        self.assertEqual(len(data['expected_scores']), 2)
+        response = self.client.get('/api/suggested-matches/', {'players': f'{ids[0]},{ids[0]},{ids[1]}'})
+        self.assertEqual([(match['player'], match['opponent']) for match in response.json()['matches']], [
+            (ids[0], ids[1])
+        ])
+
+    def test_win_probabilities_unknown_player(self):
+        """Test that unknown players are rejected."""
+        response = self.client.get('/api/win-probabilities/', {'players': '999'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_suggested_matches(self):
+        """Test that similar players are suggested to play each other."""
+        response = self.client.get('/api/suggested-matches/')
+        pairs = {frozenset((match['player'], match['opponent'])) for match in response.json()['matches']}
+        self.assertEqual(pairs, {
+            frozenset((self.players[0].id, self.players[1].id)),
+            frozenset((self.players[2].id, self.players[3].id)),
+        })
+
+    def test_suggested_matches_avoid_recent_repeats(self):
+        """Test that pairs who just played are not suggested again."""
+        for _ in range(4):
+            Match.objects.create(winner=self.players[0], loser=self.players[1], winning_score=7, losing_score=5)
+        PlayerRating.objects.update(rating=1500)  # make every other pairing an even match
+        response = self.client.get('/api/suggested-matches/')
+        pairs = {frozenset((match['player'], match['opponent'])) for match in response.json()['matches']}
+        self.assertNotIn(frozenset((self.players[0].id, self.players[1].id)), pairs)
@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from leaderboard import metrics
+from leaderboard.models import Match, Player, PlayerRating, Webhook
+
+
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(LEADERBOARD_METRICS_DIR=directory, LEADERBOARD_METRICS_TOKEN='')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.directory = directory
+        metrics.process_metrics.pid = None  # start with empty metrics for this process
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return response.content.decode()
+
+    def write_process(self, pid, values):
+        with open(os.path.join(self.directory, f'{pid}.json'), 'w') as f:
+            json.dump(values, f)
+
+    def test_request_histograms(self):
+        """Test that request latency and query counts are recorded per view."""
+        self.client.get('/')
+        self.client.get('/')
+        text = self.scrape()
+        self.assertIn('# TYPE pongboard_request_duration_seconds histogram', text)
+        self.assertIn('pongboard_request_duration_seconds_bucket{view="home_page",le="+Inf"} 2', text)
+        self.assertIn('pongboard_request_duration_seconds_count{view="home_page"} 2', text)
+        self.assertIn('pongboard_request_queries_bucket{view="home_page",le="500.0"} 2', text)
+
+    def test_replay_metrics(self):
+        """Test that replays record their duration and number of matches."""
+        Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+        PlayerRating.generate_ratings()
+        text = self.scrape()
+        self.assertIn('pongboard_replay_matches_sum 1.0', text)
+        self.assertIn('pongboard_replay_seconds_count 1', text)
+        self.assertIn('pongboard_rating_update_seconds_count', text)
+
+    def test_cache_lookups(self):
+        """Test that hits and misses of results cached for the ratings are counted."""
+        self.client.get('/')
+        self.assertIn('pongboard_results_cache_requests_total{name="rating_intervals",result="miss"} 1', self.scrape())
+
+    def test_processes_are_merged(self):
+        """Test that counters of all processes add up, and gauges only of running ones."""
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+        self.write_process(exited.pid, [
+            ['pongboard_write_rejections_total', [['limit', 'user']], 2],
+            ['pongboard_stream_clients', [], 5],
+        ])
+        self.write_process(1, [  # init, always running
+            ['pongboard_write_rejections_total', [['limit', 'user']], 3],
+            ['pongboard_stream_clients', [], 4],
+        ])
+        for _ in range(2):  # the exited process is archived on the first scrape
+            text = self.scrape()
+            self.assertIn('pongboard_write_rejections_total{limit="user"} 5', text)
+            self.assertIn('pongboard_stream_clients 4', text)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, f'{exited.pid}.json')))
+
+    def test_reused_pid_keeps_counters(self):
+        """Test that a process archives the file left under its pid by an exited process before writing its own."""
+        self.write_process(os.getpid(), [
+            ['pongboard_write_rejections_total', [['limit', 'user']], 2],
+            ['pongboard_stream_clients', [], 5],
+        ])
+        metrics.process_metrics.pid = None  # a new process with the same pid
+        metrics.inc('pongboard_write_rejections_total', {'limit': 'user'})
+        text = self.scrape()
+        self.assertIn('pongboard_write_rejections_total{limit="user"} 3', text)
+        self.assertNotIn('pongboard_stream_clients', text)
+
+    def test_webhook_backlog(self):
+        """Test that the changes waiting for each webhook are reported."""
+        Webhook.objects.create(name='Chat', url='http://127.0.0.1:9/')
+        Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+        self.assertRegex(self.scrape(), r'pongboard_webhook_pending_changes\{webhook="Chat"\} [1-9]')
+
+    def test_token(self):
+        """Test that scrapes need the token when one is set."""
+        with self.settings(LEADERBOARD_METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+            self.assertEqual(response.status_code, 200)
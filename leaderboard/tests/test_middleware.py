@@ -0,0 +1,40 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from leaderboard.models import Match, Player
+
+
+class QueryBudgetMiddlewareTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+
+    @override_settings(DEBUG=True)
+    def test_debug_headers(self):
+        """Test that the query count and timings are sent with DEBUG."""
+        response = self.client.get('/matches/')
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertIn('render;dur=', response['Server-Timing'])
+
+    def test_no_headers_in_production(self):
+        """Test that the numbers aren't exposed without DEBUG."""
+        response = self.client.get('/matches/')
+        self.assertFalse(response.has_header('X-Query-Count'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(LEADERBOARD_VIEW_BUDGETS={'all_matches': {'queries': 1, 'ms': 60000}})
+    def test_over_budget_is_logged(self):
+        """Test that a view going over its query budget is logged."""
+        with self.assertLogs('leaderboard.middleware', 'WARNING') as logs:
+            self.client.get('/matches/')
+        self.assertIn('(all_matches) over budget', logs.output[0])
+
+    @override_settings(LEADERBOARD_VIEW_BUDGETS={'all_matches': {'queries': 100, 'ms': 60000}})
+    def test_within_budget_is_not_logged(self):
+        """Test that views within budget aren't logged."""
+        with self.assertRaises(AssertionError):  # assertLogs fails when nothing is logged
+            with self.assertLogs('leaderboard.middleware', 'WARNING'):
+                self.client.get('/matches/')
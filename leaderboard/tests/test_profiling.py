@@ -0,0 +1,68 @@
+import marshal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from leaderboard.middleware import PROFILE_SKIPPED_HEADER, ProfilingMiddleware
+from leaderboard.models import Player, RequestProfile
+
+
+class ProfilingMiddlewareTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        Player.objects.create(first_name='Bob', last_name='Hope')
+        self.staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def test_profile_with_param(self):
+        """Test that a staff request with ?profile=1 stores its profile and links to it."""
+        response = self.client.get('/?profile=1')
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response['X-Profile-Url'], f'/profiles/{profile.id}/')
+        self.assertEqual((profile.path, profile.view, profile.user), ('/?profile=1', 'home_page', self.staff))
+        self.assertIn('home_page', profile.summary)
+        self.assertTrue(profile.allocations.startswith('Peak: '))
+
+    def test_profile_with_header(self):
+        """Test that the X-Profile header also asks for a profile."""
+        response = self.client.get('/matches/', HTTP_X_PROFILE='1')
+        self.assertTrue(response.has_header('X-Profile-Url'))
+
+    def test_one_profile_at_a_time(self):
+        """Test that requests asking for a profile while another is profiled are served unprofiled."""
+        with ProfilingMiddleware.lock:
+            response = self.client.get('/?profile=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header(PROFILE_SKIPPED_HEADER))
+        self.assertFalse(RequestProfile.objects.exists())
+        self.assertTrue(self.client.get('/?profile=1').has_header('X-Profile-Url'))
+
+    def test_only_staff_can_profile(self):
+        """Test that other users' requests aren't profiled."""
+        self.client.force_login(User.objects.create_user(username='player'))
+        response = self.client.get('/?profile=1')
+        self.assertFalse(response.has_header('X-Profile-Url'))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_download(self):
+        """Test that stored profiles download as pstats data or text."""
+        url = self.client.get('/?profile=1')['X-Profile-Url']
+        stats = marshal.loads(self.client.get(url).content)
+        self.assertTrue(any(function == 'home_page' for _, _, function in stats))
+        self.assertContains(self.client.get(url + '?format=text'), 'cumulative')
+
+    def test_download_requires_staff(self):
+        """Test that profiles can't be downloaded by other users."""
+        url = self.client.get('/?profile=1')['X-Profile-Url']
+        self.client.force_login(User.objects.create_user(username='player'))
+        self.assertEqual(self.client.get(url).status_code, 302)  # to the admin login
+
+    @override_settings(LEADERBOARD_PROFILES_KEPT=2)
+    def test_old_profiles_are_pruned(self):
+        """Test that only the newest profiles are kept."""
+        for _ in range(3):
+            self.client.get('/?profile=1')
+        self.assertEqual(RequestProfile.objects.count(), 2)
@@ -1,7 +1,19 @@
+import subprocess
+import sys
+from importlib import import_module
+
+from django.apps import apps
+from django.db import models
 from django.test import TestCase
 
-from leaderboard.rankings import EloRating, DEFAULT_ELO_RATING, DEFAULT_K_FACTOR
-from leaderboard.models import PlayerRating, Player
+from django.test import override_settings
+
+from leaderboard.rankings import (
+    EloRating, DEFAULT_ELO_RATING, DEFAULT_K_FACTOR, connected_components, replay_components, replay_matches
+)
+from leaderboard.models import Match, PlayerRating, Player, RatingAdjustment
+
+backfill_initial_ratings = import_module('leaderboard.migrations.0031_backfill_initial_rating').backfill_initial_ratings
 
 
 class EloRatingTest(TestCase):
@@ -75,6 +87,146 @@ class EloRatingTest(TestCase):
         """Test that the EloRating class can use current ratings."""
         player = Player.objects.create(first_name='Bob', last_name='Hope')
         test_rating = 1013
+        PlayerRating.objects.filter(player=player).delete()
         rated_player = PlayerRating.objects.create(player=player, rating=test_rating)
-        rating = EloRating(use_current_ratings=True)
-        self.assertEqual(test_rating, rating.get_rating(player))
+        rating = PlayerRating.get_current_ratings()
+        self.assertEqual(test_rating, rating.get_rating(player.id))
+
+    def test_starting_ratings(self):
+        """Test that the EloRating class can be seeded with ratings."""
+        rating = EloRating({'player1': 1600})
+        self.assertEqual(rating.get_rating('player1'), 1600)
+        self.assertEqual(rating.get_rating('player2'), DEFAULT_ELO_RATING)
+
+    def test_k_factor(self):
+        """Test that the K factor can be overridden."""
+        rating = EloRating(k_factor=10)
+        rating.update_ratings(winner='player1', loser='player2')
+        self.assertEqual(rating.get_rating('player1'), DEFAULT_ELO_RATING + 5)
+
+    def test_replay_matches(self):
+        """Test that replaying matches matches updating one by one."""
+        matches = [('a', 'b', False), ('b', 'c', True), ('c', 'a', False)]
+        expected = EloRating()
+        expected_updates = [expected.update_ratings(*match) for match in matches]
+        elo_rating, updates = replay_matches(matches)
+        self.assertEqual(elo_rating.ratings, expected.ratings)
+        self.assertEqual(updates, expected_updates)
+
+    def test_replay_adjustments_in_order(self):
+        """Test that adjustments change the ratings later matches start from."""
+        matches = [('a', 'b', False), ('a', 'b', False)]
+        expected = EloRating()
+        expected.update_ratings('a', 'b')
+        expected.set_rating('a', expected.get_rating('a') - 40)
+        expected_updates = [expected.update_ratings('a', 'b')]
+        expected.set_rating('c', DEFAULT_ELO_RATING - 5)
+        elo_rating, updates = replay_matches(matches, adjustments=[(1, 'a', -40), (2, 'c', -5)])
+        self.assertEqual(elo_rating.ratings, expected.ratings)
+        self.assertEqual(updates[1:], expected_updates)
+
+    def test_import_without_django(self):
+        """Test that the rating engine does not import Django."""
+        code = 'import sys, leaderboard.rankings; sys.exit(\'django\' in sys.modules)'
+        self.assertEqual(subprocess.call([sys.executable, '-c', code]), 0)
+
+
+class ReplayComponentsTest(TestCase):
+
+    def setUp(self):
+        """Set up a history with two offices that never play each other."""
+        self.matches = [
+            ('a', 'b', False), ('x', 'y', False), ('b', 'c', True), ('y', 'z', False),
+            ('c', 'a', False), ('z', 'x', False), ('q', 'r', False),
+        ]
+
+    def test_connected_components(self):
+        """Test that matches are grouped by connected players."""
+        components = sorted(connected_components(self.matches))
+        self.assertEqual(components, [[0, 2, 4], [1, 3, 5], [6]])
+
+    def test_parallel_replay_matches_sequential(self):
+        """Test that replaying components concurrently gives the same result."""
+        ratings = {'a': 1500, 'x': 1400, 'unrated': 1450}
+        expected_rating, expected_updates = replay_matches(self.matches, ratings)
+        elo_rating, updates = replay_components(self.matches, ratings, workers=2, min_parallel_matches=0)
+        self.assertEqual(elo_rating.ratings, expected_rating.ratings)
+        self.assertEqual(updates, expected_updates)
+
+    def test_parallel_replay_with_adjustments(self):
+        """Test that adjustments are replayed at the same point of each component's history."""
+        adjustments = [(1, 'a', -20), (2, 'x', 15), (4, 'b', -10), (6, 'unrated', -5), (7, 'q', -3)]
+        expected_rating, expected_updates = replay_matches(self.matches, adjustments=adjustments)
+        elo_rating, updates = replay_components(
+            self.matches, workers=2, min_parallel_matches=0, adjustments=adjustments
+        )
+        self.assertEqual(elo_rating.ratings, expected_rating.ratings)
+        self.assertEqual(updates, expected_updates)
+
+    @override_settings(LEADERBOARD_REPLAY_WORKERS=2, LEADERBOARD_PARALLEL_REPLAY_MIN_MATCHES=0)
+    def test_generate_ratings_in_parallel(self):
+        """Test that a parallel full recompute stores the same ratings."""
+        players = [Player.objects.create(first_name=name, last_name='Hope') for name in 'ABCD']
+        for winner, loser in [(0, 1), (2, 3), (1, 0), (3, 2), (0, 1)]:
+            Match.objects.create(winner=players[winner], loser=players[loser], winning_score=7, losing_score=2)
+        with override_settings(LEADERBOARD_REPLAY_WORKERS=1):
+            PlayerRating.generate_ratings()
+        expected = dict(PlayerRating.objects.values_list('player_id', 'rating'))
+        PlayerRating.generate_ratings()
+        self.assertEqual(dict(PlayerRating.objects.values_list('player_id', 'rating')), expected)
+
+
+class StartingRatingTest(TestCase):
+
+    def setUp(self):
+        """Set up tests with a player added with a custom rating and one with the default."""
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope', rating=1600)
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        for losing_score in range(3):
+            Match.objects.create(winner=self.player2, loser=self.player1, winning_score=7, losing_score=losing_score)
+
+    def get_ratings(self):
+        return dict(PlayerRating.objects.values_list('player_id', 'rating'))
+
+    def test_initial_rating_is_kept(self):
+        """Test that a player remembers the rating they were added with."""
+        self.assertEqual(Player.objects.get(pk=self.player1.pk).initial_rating, 1600)
+        self.assertEqual(Player.objects.get(pk=self.player2.pk).initial_rating, DEFAULT_ELO_RATING)
+
+    def test_starting_ratings_ignore_current_ratings(self):
+        """Test that replays start from the initial ratings rather than the ratings after the matches."""
+        Player.objects.filter(pk=self.player1.pk).update(rating=2000)
+        self.assertEqual(
+            PlayerRating.get_starting_ratings(), {self.player1.id: 1600, self.player2.id: DEFAULT_ELO_RATING}
+        )
+
+    def test_players_without_initial_rating_start_from_default(self):
+        """Test that players whose initial rating is unknown start from the default rating."""
+        Player.objects.update(initial_rating=None)
+        self.assertEqual(set(PlayerRating.get_starting_ratings().values()), {DEFAULT_ELO_RATING})
+
+    def test_repeated_replays_are_stable(self):
+        """Test that replaying twice gives the incremental ratings instead of counting the matches again."""
+        ratings = self.get_ratings()
+        PlayerRating.generate_ratings()
+        self.assertEqual(self.get_ratings(), ratings)
+        PlayerRating.generate_ratings()
+        self.assertEqual(self.get_ratings(), ratings)
+
+    def test_backfill_initial_ratings(self):
+        """Test that existing players get the rating they had before their recorded matches and adjustments."""
+        RatingAdjustment.objects.create(player=self.player2, delta=-5)
+        Player.objects.filter(pk=self.player2.pk).update(rating=models.F('rating') - 5)
+        Player.objects.update(initial_rating=None)
+        backfill_initial_ratings(apps, None)
+        self.assertEqual(
+            dict(Player.objects.values_list('id', 'initial_rating')),
+            {self.player1.id: 1600, self.player2.id: DEFAULT_ELO_RATING},
+        )
+
+    def test_backfill_skips_matches_without_deltas(self):
+        """Test that players with matches from before the deltas were stored start from the default rating."""
+        Match.objects.filter(winner=self.player2).update(winner_delta=0, loser_delta=0)
+        Player.objects.update(initial_rating=None)
+        backfill_initial_ratings(apps, None)
+        self.assertEqual(list(Player.objects.values_list('initial_rating', flat=True)), [None, None])
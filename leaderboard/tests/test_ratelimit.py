@@ -0,0 +1,101 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from leaderboard import ratelimit
+from leaderboard.models import Match, Player, RateLimitBucket
+
+
+class TokenBucketTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_burst_then_wait(self):
+        """Test that a full bucket allows a burst and then one request per refill."""
+        waits = [ratelimit.take('bucket', 60, 3, now=100) for _ in range(4)]
+        self.assertEqual(waits, [0, 0, 0, 1])
+        self.assertEqual(ratelimit.take('bucket', 60, 3, now=100.5), 0.5)
+        self.assertEqual(ratelimit.take('bucket', 60, 3, now=101), 0)
+
+    def test_refill_is_capped(self):
+        """Test that an idle bucket doesn't save up more than its burst."""
+        ratelimit.take('bucket', 60, 2, now=100)
+        waits = [ratelimit.take('bucket', 60, 2, now=1000) for _ in range(3)]
+        self.assertEqual(waits, [0, 0, 1])
+
+    def test_empty_bucket_spends_nothing(self):
+        """Test that a token is only taken when every bucket has one."""
+        limits = [('client', 60, 3), ('all', 60, 1)]
+        self.assertEqual(ratelimit.take_all(limits, now=100), (None, 0))
+        self.assertEqual(ratelimit.take_all(limits, now=100), (1, 1))
+        self.assertEqual(RateLimitBucket.objects.get(key='client').tokens, 2)
+
+    def test_idle_buckets_are_pruned(self):
+        """Test that buckets idle for an hour are deleted."""
+        ratelimit.take('old', 60, 2, now=100)
+        ratelimit.take('new', 60, 2, now=3000)
+        ratelimit.prune(now=3800)
+        self.assertEqual(list(RateLimitBucket.objects.values_list('key', flat=True)), ['new'])
+
+
+@override_settings(LEADERBOARD_USER_WRITES_PER_MINUTE=6, LEADERBOARD_USER_WRITE_BURST=2,
+                   LEADERBOARD_GLOBAL_WRITES_PER_MINUTE=60, LEADERBOARD_GLOBAL_WRITE_BURST=3)
+class WriteRateLimitTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        self.match = {'winner': self.player1.id, 'loser': self.player2.id, 'winning_score': 7, 'losing_score': 3}
+
+    def post_match(self, **extra):
+        return self.client.post('/', self.match, **extra)
+
+    def test_client_limit(self):
+        """Test that a client over its limit gets a 429 with Retry-After and nothing is saved."""
+        self.assertEqual([self.post_match().status_code for _ in range(3)], [302, 302, 429])
+        response = self.post_match()
+        self.assertEqual(response['Retry-After'], '10')
+        self.assertEqual(Match.objects.count(), 2)
+
+    def test_reads_are_not_limited(self):
+        """Test that showing the leaderboard doesn't take tokens."""
+        for _ in range(5):
+            self.assertEqual(self.client.get('/').status_code, 200)
+        self.assertEqual(self.post_match().status_code, 302)
+
+    def test_global_limit(self):
+        """Test that clients share the global limit."""
+        statuses = [self.post_match(REMOTE_ADDR=f'10.0.0.{i}').status_code for i in range(4)]
+        self.assertEqual(statuses, [302, 302, 302, 429])
+
+    @override_settings(LEADERBOARD_TRUSTED_PROXIES=1)
+    def test_forwarded_address(self):
+        """Test that clients behind a trusted proxy are told apart by the address it forwarded."""
+        statuses = [
+            self.post_match(REMOTE_ADDR='10.1.1.1', HTTP_X_FORWARDED_FOR=f'1.2.3.4, 10.0.0.{i % 2}').status_code
+            for i in range(4)
+        ]
+        self.assertEqual(statuses, [302, 302, 302, 429])  # the global limit, not a shared client bucket
+        self.assertEqual(self.post_match(HTTP_X_FORWARDED_FOR='10.0.0.0').status_code, 429)
+
+    def test_rejections_are_counted(self):
+        """Test that rejected writes are counted per scope."""
+        for _ in range(3):
+            self.post_match()
+        for i in range(2):
+            self.post_match(REMOTE_ADDR=f'10.0.0.{i}')
+        self.assertEqual(ratelimit.get_rejections(), {'user': 1, 'global': 1})
+
+    def test_api_gets_json(self):
+        """Test that JSON submissions are rejected in JSON, per user."""
+        self.client.force_login(User.objects.create_user(username='testuser'))
+        body = json.dumps({'matches': [self.match]})
+        responses = [
+            self.client.post('/api/matches/batch/', body, content_type='application/json') for _ in range(3)
+        ]
+        self.assertEqual([response.status_code for response in responses], [201, 201, 429])
+        self.assertIn('error', responses[2].json())
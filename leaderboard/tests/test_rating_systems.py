@@ -0,0 +1,95 @@
+import numpy as np
+from django.test import TestCase, override_settings
+
+from leaderboard.models import Match, Player, PlayerRating
+from leaderboard.rankings import DEFAULT_ELO_RATING, EloRating
+from leaderboard.rating_systems import (
+    EloSystem, Glicko2Rating, TrueSkillRating, GLICKO2_SCALE, get_rating_system
+)
+
+
+class EloSystemTest(TestCase):
+
+    def test_matches_elo_rating(self):
+        """Test that the Elo system gives the same ratings as EloRating."""
+        matches = [('a', 'b', False, 0), ('b', 'c', True, 0), ('c', 'a', False, 1)]
+        expected = EloRating()
+        for winner, loser, draw, _ in matches:
+            expected.update_ratings(winner, loser, draw=draw)
+        self.assertEqual(EloSystem().rate(matches), expected.ratings)
+
+
+class Glicko2RatingTest(TestCase):
+
+    def test_glickman_example(self):
+        """Test the worked example from Glickman's Glicko-2 paper."""
+        system = Glicko2Rating(default_rating=1500, tau=0.5)
+        mu = (np.array([1500, 1400, 1550, 1700.]) - 1500) / GLICKO2_SCALE
+        phi = np.array([200, 30, 100, 300.]) / GLICKO2_SCALE
+        sigma = np.full(4, 0.06)
+        # player 0 beats player 1 and loses to players 2 and 3
+        winners = np.array([0, 2, 3])
+        losers = np.array([1, 0, 0])
+        draws = np.zeros(3, dtype=bool)
+        new_mu, new_phi, new_sigma = system.rate_period((mu, phi, sigma), winners, losers, draws, 1)
+        self.assertAlmostEqual(new_mu[0] * GLICKO2_SCALE + 1500, 1464.06, delta=0.05)
+        self.assertAlmostEqual(new_phi[0] * GLICKO2_SCALE, 151.52, delta=0.05)
+        self.assertAlmostEqual(new_sigma[0], 0.05999, places=4)
+
+    def test_winner_gains_rating(self):
+        """Test that the winner is rated above the loser."""
+        ratings = Glicko2Rating().rate([('a', 'b', False, 0)])
+        self.assertGreater(ratings['a'], DEFAULT_ELO_RATING)
+        self.assertLess(ratings['b'], DEFAULT_ELO_RATING)
+
+    def test_draw_between_equals(self):
+        """Test that a draw between new players leaves their ratings unchanged."""
+        ratings = Glicko2Rating().rate([('a', 'b', True, 0)])
+        self.assertAlmostEqual(ratings['a'], DEFAULT_ELO_RATING)
+        self.assertAlmostEqual(ratings['b'], DEFAULT_ELO_RATING)
+
+    def test_unrated_players_keep_default(self):
+        """Test that players without matches keep their starting rating."""
+        ratings = Glicko2Rating().rate([('a', 'b', False, 0)], ratings={'c': None})
+        self.assertEqual(ratings['c'], DEFAULT_ELO_RATING)
+
+
+class TrueSkillRatingTest(TestCase):
+
+    def test_winner_gains_rating(self):
+        """Test that the winner is rated above the loser."""
+        ratings = TrueSkillRating().rate([('a', 'b', False, 0)])
+        self.assertGreater(ratings['a'], DEFAULT_ELO_RATING)
+        self.assertLess(ratings['b'], DEFAULT_ELO_RATING)
+
+    def test_draw_pulls_ratings_together(self):
+        """Test that a draw moves the stronger player down and the weaker up."""
+        system = TrueSkillRating()
+        ratings = system.rate(
+            [('a', 'b', False, 0), ('a', 'b', False, 1), ('a', 'b', True, 2)]
+        )
+        before = system.rate([('a', 'b', False, 0), ('a', 'b', False, 1)])
+        self.assertLess(ratings['a'], before['a'])
+        self.assertGreater(ratings['b'], before['b'])
+
+
+class GetRatingSystemTest(TestCase):
+
+    def test_get_rating_system(self):
+        """Test that rating systems are looked up by name."""
+        self.assertIsInstance(get_rating_system('glicko2'), Glicko2Rating)
+
+    def test_unknown_rating_system(self):
+        """Test that an unknown rating system raises an error."""
+        with self.assertRaises(ValueError):
+            get_rating_system('unknown')
+
+    @override_settings(LEADERBOARD_RATING_SYSTEM='glicko2')
+    def test_match_uses_active_system(self):
+        """Test that the leaderboard is rated with the system in settings."""
+        player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        match = Match.objects.create(winner=player1, loser=player2, winning_score=7, losing_score=3)
+        expected = Glicko2Rating().rate([(player1.id, player2.id, False, 0)])
+        self.assertEqual(PlayerRating.objects.get(pk=player1.id).rating, round(expected[player1.id]))
+        self.assertEqual(match.winner_delta, round(expected[player1.id]) - DEFAULT_ELO_RATING)
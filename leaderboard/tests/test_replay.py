@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytz
+from django.test import TestCase
+
+from leaderboard.models import Match, Player, PlayerRating
+from leaderboard.replay import PlayerStatsConsumer, ReplayConsumer, ReplayPipeline
+
+
+class RecordingConsumer(ReplayConsumer):
+    """Consumer that remembers the matches it was given."""
+
+    def __init__(self):
+        self.match_ids = []
+        self.finished = False
+
+    def consume(self, match):
+        self.match_ids.append(match.id)
+
+    def finish(self):
+        self.finished = True
+
+
+class ReplayPipelineTest(TestCase):
+
+    def setUp(self):
+        """Set up tests with matches saved out of chronological order."""
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        start = pytz.utc.localize(datetime(2020, 1, 1))
+        self.matches = []
+        for day in [3, 1, 4, 0, 2]:
+            self.matches.append(Match.objects.create(
+                winner=self.player1 if day % 2 else self.player2,
+                loser=self.player2 if day % 2 else self.player1,
+                winning_score=7,
+                losing_score=day,
+                datetime=start + timedelta(days=day)
+            ))
+        self.chronological_ids = [match.id for match in sorted(self.matches, key=lambda match: match.datetime)]
+
+    def test_consumers_get_chronological_matches(self):
+        """Test that every consumer receives all matches in order across chunks."""
+        consumers = [RecordingConsumer(), RecordingConsumer()]
+        ReplayPipeline(consumers, chunk_size=2).run()
+        for consumer in consumers:
+            self.assertEqual(consumer.match_ids, self.chronological_ids)
+            self.assertTrue(consumer.finished)
+
+    def test_generate_ratings_stores_match_deltas(self):
+        """Test that a full replay stores the rating deltas of each match."""
+        Match.objects.update(winner_delta=0, loser_delta=0)
+        PlayerRating.generate_ratings()
+        for match in Match.objects.order_by('datetime'):
+            self.assertNotEqual(match.winner_delta, 0)
+            self.assertEqual(match.winner_delta, -match.loser_delta)
+
+    def test_generate_ratings_with_extra_consumers(self):
+        """Test that extra consumers share the replay of generate_ratings."""
+        stats = PlayerStatsConsumer()
+        PlayerRating.generate_ratings(consumers=[stats])
+        self.assertEqual(stats.stats[self.player1.id]['wins'], 2)
+        self.assertEqual(stats.stats[self.player2.id]['wins'], 3)
+        self.assertEqual(stats.stats[self.player2.id]['points_lost'], 7 + 7 + 0 + 2 + 4)
+
+    def test_stats_streak(self):
+        """Test that streaks count consecutive wins and losses."""
+        stats = ReplayPipeline([PlayerStatsConsumer()]).run()[0].stats
+        # the last match on day 4 was won by player 2, after a loss on day 3
+        self.assertEqual(stats[self.player2.id]['streak'], 1)
+        self.assertEqual(stats[self.player1.id]['streak'], -1)
+
@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.test import TestCase, override_settings
+
+from leaderboard import scoring
+from leaderboard.models import League, LiveGame, Match, Player, PlayerRating
+
+
+class ScoringTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['live'].clear()
+        self.league = League.get_default()
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        self.game_id = scoring.start_game(self.league, self.player1, self.player2)['id']
+
+    def play(self, log):
+        state = scoring.get_state(self.game_id)
+        for side in log:
+            state = scoring.record_point(self.game_id, side, len(state['log']))
+        return state
+
+    def test_points_update_score(self):
+        """Test that rallies are counted for the side that won them."""
+        state = self.play('aab')
+        self.assertEqual(state['score'], [2, 1])
+        self.assertEqual(state['log'], 'aab')
+
+    def test_points_are_not_written_one_by_one(self):
+        """Test that recording a point doesn't touch the database."""
+        self.play('ab')
+        with self.assertNumQueries(0):
+            scoring.record_point(self.game_id, 'a', 2)
+
+    @override_settings(LEADERBOARD_LIVE_FLUSH_POINTS=3)
+    def test_point_log_is_flushed(self):
+        """Test that the point log is written every few points."""
+        self.play('ab')
+        self.assertEqual(LiveGame.objects.get(pk=self.game_id).points, '')
+        self.play('a')
+        self.assertEqual(LiveGame.objects.get(pk=self.game_id).points, 'aba')
+
+    @override_settings(LEADERBOARD_LIVE_FLUSH_POINTS=3)
+    def test_state_restored_from_flush(self):
+        """Test that a lost cache entry is restored from the last flushed log."""
+        self.play('abaa')
+        caches['live'].clear()
+        self.assertEqual(scoring.get_state(self.game_id)['log'], 'aba')
+
+    def test_stale_point_conflicts(self):
+        """Test that a retried point isn't counted twice."""
+        self.play('a')
+        with self.assertRaises(scoring.ScoreConflict):
+            scoring.record_point(self.game_id, 'a', 0)
+        self.assertEqual(scoring.get_state(self.game_id)['score'], [1, 0])
+
+    def test_concurrent_retries_count_once(self):
+        """Test that a point sent twice at the same time is counted once."""
+        get_state = scoring.get_state
+
+        def slow_get_state(game_id):
+            state = get_state(game_id)
+            time.sleep(0.05)  # lets the other request read the same state when not locked
+            return state
+
+        results = []
+
+        def record():
+            try:
+                results.append(scoring.record_point(self.game_id, 'a', 0)['score'])
+            except scoring.ScoreConflict:
+                results.append('conflict')
+
+        scoring.get_state(self.game_id)
+        with mock.patch.object(scoring, 'get_state', slow_get_state):
+            threads = [threading.Thread(target=record) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(sorted(results, key=str), [[1, 0], 'conflict'])
+        self.assertEqual(scoring.get_state(self.game_id)['score'], [1, 0])
+
+    def test_finished_game_cant_be_finished_again(self):
+        """Test that a second finish of the same game doesn't save another match."""
+        self.play('aaaaaaa')
+        scoring.finish_game(self.game_id)
+        with self.assertRaises(LiveGame.DoesNotExist):
+            scoring.finish_game(self.game_id)
+        self.assertEqual(Match.objects.count(), 1)
+
+    def test_undo(self):
+        """Test that the last point can be taken back."""
+        self.play('ab')
+        state = scoring.record_point(self.game_id, scoring.UNDO, 2)
+        self.assertEqual((state['log'], state['score']), ('a', [1, 0]))
+
+    def test_finish_saves_match(self):
+        """Test that finishing saves the final score as a rated match."""
+        self.play('abaaaaaa')
+        match = scoring.finish_game(self.game_id)
+        self.assertEqual((match.winner, match.winning_score, match.losing_score), (self.player1, 7, 1))
+        self.assertEqual(PlayerRating.objects.get(pk=self.player1.id).rating, 1465)
+        self.assertEqual(LiveGame.objects.get(pk=self.game_id).points, 'abaaaaaa')
+        with self.assertRaises(LiveGame.DoesNotExist):
+            scoring.get_state(self.game_id)
+
+    def test_finish_validates_score(self):
+        """Test that an unfinished score can't be saved as a match."""
+        self.play('ab' + 'a' * 4)
+        with self.assertRaises(ValueError):
+            scoring.finish_game(self.game_id)
+        self.assertEqual(Match.objects.count(), 0)
+
+
+class LiveApiTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches['live'].clear()
+        self.client.force_login(User.objects.create_user(username='testuser'))
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+
+    def post(self, url, data=None):
+        return self.client.post(url, json.dumps(data or {}), content_type='application/json')
+
+    def test_score_a_game(self):
+        """Test starting, scoring, watching and finishing a game."""
+        game = self.post('/api/live/', {'player_a': self.player1.id, 'player_b': self.player2.id}).json()
+        url = f'/api/live/{game["id"]}/'
+        for seq in range(7):
+            self.assertEqual(self.post(url + 'point/', {'side': 'b', 'seq': seq}).status_code, 200)
+        self.assertEqual(self.client.get(url).json()['score'], [0, 7])
+        self.assertEqual(len(self.client.get('/api/live/').json()['games']), 1)
+        response = self.post(url + 'finish/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['winner'], 'Sue Hope')
+        self.assertEqual(self.client.get('/api/live/').json()['games'], [])
+
+    def test_retried_point_conflicts(self):
+        """Test that a point sent twice is answered with the current state."""
+        game = self.post('/api/live/', {'player_a': self.player1.id, 'player_b': self.player2.id}).json()
+        url = f'/api/live/{game["id"]}/point/'
+        self.post(url, {'side': 'a', 'seq': 0})
+        response = self.post(url, {'side': 'a', 'seq': 0})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['score'], [1, 0])
+
+    def test_scoring_requires_login(self):
+        """Test that anonymous users can watch but not start games."""
+        self.client.logout()
+        response = self.post('/api/live/', {'player_a': self.player1.id, 'player_b': self.player2.id})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.get('/api/live/').status_code, 200)
@@ -0,0 +1,104 @@
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from leaderboard.models import Player
+from leaderboard.simulation import round_robin, simulate_rank_counts, simulate_rank_probabilities
+
+
+class SimulationTest(TestCase):
+
+    def test_round_robin(self):
+        """Test that every pair meets once per round."""
+        self.assertEqual(round_robin([1, 2, 3], rounds=2), [(1, 2), (1, 3), (2, 3)] * 2)
+
+    def test_probabilities_sum_to_one(self):
+        """Test that every player and every rank has a total probability of one."""
+        probabilities = simulate_rank_probabilities([1600, 1450, 1300], round_robin(range(3)), 2000, seed=1)
+        np.testing.assert_allclose(probabilities.sum(axis=0), 1)
+        np.testing.assert_allclose(probabilities.sum(axis=1), 1)
+
+    def test_stronger_player_more_likely_first(self):
+        """Test that the highest rated player is the most likely winner."""
+        probabilities = simulate_rank_probabilities([1800, 1450, 1300], round_robin(range(3)), 2000, seed=1)
+        self.assertEqual(probabilities[:, 0].argmax(), 0)
+
+    def test_no_fixtures_keeps_ranking(self):
+        """Test that without fixtures the current ranking is certain."""
+        counts = simulate_rank_counts(np.array([1400, 1500]), np.array([], dtype=int), np.array([], dtype=int), 10)
+        self.assertEqual(counts.tolist(), [[0, 10], [10, 0]])
+
+    def test_pool_matches_serial(self):
+        """Test that running batches on a process pool gives the same result."""
+        args = ([1600, 1450, 1300], round_robin(range(3)), 4000)
+        serial = simulate_rank_probabilities(*args, simulations_per_batch=1000, seed=7)
+        pooled = simulate_rank_probabilities(*args, simulations_per_batch=1000, seed=7, workers=2)
+        np.testing.assert_array_equal(serial, pooled)
+
+
+class SeasonOddsTest(TestCase):
+
+    def setUp(self):
+        """Set up players with different ratings."""
+        cache.clear()
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope', rating=1700)
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope', rating=1300)
+
+    def test_odds_endpoint(self):
+        """Test that the endpoint returns rank probabilities per player."""
+        response = self.client.get('/api/odds/', {'simulations': 500})
+        players = response.json()['players']
+        self.assertEqual([player['id'] for player in players], [self.player1.id, self.player2.id])
+        self.assertAlmostEqual(sum(players[0]['rank_probabilities']), 1)
+
+    def test_odds_endpoint_fixtures(self):
+        """Test that fixtures can be passed as player id pairs."""
+        response = self.client.get('/api/odds/', {'fixtures': f'{self.player1.id}-{self.player2.id}'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_odds_endpoint_rejects_unknown_players(self):
+        """Test that fixtures with unknown players are rejected."""
+        response = self.client.get('/api/odds/', {'fixtures': f'{self.player1.id}-999'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_odds_endpoint_rejects_self_fixtures(self):
+        """Test that a player can't be given a fixture against themselves."""
+        response = self.client.get('/api/odds/', {'fixtures': f'{self.player1.id}-{self.player1.id}'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_odds_endpoint_limits_work(self):
+        """Test that rounds and fixtures times simulations are capped."""
+        response = self.client.get('/api/odds/', {'rounds': 11, 'simulations': 500})
+        self.assertEqual(response.status_code, 400)
+        fixtures = ','.join([f'{self.player1.id}-{self.player2.id}'] * 101)
+        response = self.client.get('/api/odds/', {'fixtures': fixtures, 'simulations': 100000})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most', response.json()['error'])
+
+    def test_default_odds_are_precomputed(self):
+        """Test that the default odds are only served once the background command cached them."""
+        response = self.client.get('/api/odds/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '60')
+        call_command('simulate_season', '--cache', '--simulations', '100', '--workers', '1', stdout=StringIO())
+        with mock.patch('leaderboard.simulation.simulate_rank_probabilities') as simulate:
+            response = self.client.get('/api/odds/')
+        simulate.assert_not_called()
+        self.assertEqual(response.json()['simulations'], 100)
+        self.assertEqual(len(response.json()['players']), 2)
+
+    def test_odds_are_cached(self):
+        """Test that repeat views are served from the cache."""
+        self.client.get('/api/odds/', {'simulations': 500})
+        with self.assertNumQueries(4):  # league, players, ratings version and cached odds
+            self.client.get('/api/odds/', {'simulations': 500})
+
+    def test_command_prints_odds(self):
+        """Test that the command prints a row per player."""
+        out = StringIO()
+        call_command('simulate_season', '--simulations', '100', '--workers', '1', stdout=out)
+        self.assertIn('Bob Hope', out.getvalue())
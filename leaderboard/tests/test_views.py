@@ -1,10 +1,13 @@
+from unittest import mock
+
 from django.test import TestCase
 from django.utils.html import escape
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
 
-from leaderboard.models import Player, Match
+from leaderboard.models import Player, Match, PlayerRating
 from leaderboard.forms import MatchForm, PlayerForm, DUPLICATE_ERROR
+from leaderboard.tests.queries import assert_no_repeated_queries
 
 
 class HomePageTest(TestCase):
@@ -50,6 +53,40 @@ class HomePageTest(TestCase):
         )
         self.assertEqual(Match.objects.count(), 1)
 
+    def test_retried_match_submission(self):
+        """Test that a retried post with the same idempotency key saves the match once."""
+        data = dict(self.valid_match_data, idempotency_key='abc123')
+        self.client.post(self.match_submission_url, data)
+        rating = PlayerRating.objects.get(pk=self.player1.id).rating
+        response = self.client.post(self.match_submission_url, data)
+        self.assertRedirects(response, '/')
+        self.assertEqual(Match.objects.count(), 1)
+        self.assertEqual(PlayerRating.objects.get(pk=self.player1.id).rating, rating)
+
+    def test_successful_post_skips_leaderboard(self):
+        """Test that a saved match redirects without building the page."""
+        with mock.patch.object(PlayerRating, 'get_leaderboard') as get_leaderboard:
+            response = self.client.post(self.match_submission_url, self.valid_match_data)
+        self.assertRedirects(response, '/')
+        get_leaderboard.assert_not_called()
+
+    def test_reused_key_with_other_match(self):
+        """Test that a form key posted again with another result is rejected."""
+        data = dict(self.valid_match_data, idempotency_key='abc123')
+        self.client.post(self.match_submission_url, data)
+        response = self.client.post(self.match_submission_url, dict(data, losing_score=10))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Match.objects.count(), 1)
+
+    def test_no_query_per_row(self):
+        """Test that the leaderboard and game history don't run a query per row."""
+        players = [Player.objects.create(first_name=name, last_name='Hope') for name in ('Ann', 'Joe', 'Tim')]
+        for winner, loser in zip(players, players[1:] + [self.player1, self.player2]):
+            Match.objects.create(winner=winner, loser=loser, winning_score=21, losing_score=19)
+        with assert_no_repeated_queries(self):
+            response = self.client.get('/')
+        self.assertContains(response, 'Ann Hope')
+
     def test_correct_match_form(self):
         """Test that the correct match form is used."""
         response = self.client.get('/')
@@ -205,3 +242,9 @@ class AllMatchesTest(TestCase):
         response = self.client.get('/matches/?page=2')
         matches = response.context['matches']
         self.assertEqual(len(matches), 1)
+
+    def test_no_query_per_row(self):
+        """Test that listing a page of matches doesn't run a query per match."""
+        with assert_no_repeated_queries(self):
+            response = self.client.get('/matches/')
+        self.assertContains(response, 'Sue Hope')
@@ -0,0 +1,147 @@
+import json
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from leaderboard import webhooks
+from leaderboard.models import ChangeLogEntry, League, Match, Player, Webhook
+
+
+class StubReceiver(object):
+    """Local HTTP server recording the webhook requests it gets and answering with a set status."""
+
+    def __init__(self):
+        self.requests = []
+        self.status = 200
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                receiver.requests.append((dict(self.headers), body))
+                self.send_response(receiver.status)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}/hook'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def changes(self, i=-1):
+        return json.loads(self.requests[i][1])['changes']
+
+
+class WebhookTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.receiver = StubReceiver()
+        self.addCleanup(self.receiver.close)
+        self.player1 = Player.objects.create(first_name='Bob', last_name='Hope')
+        self.player2 = Player.objects.create(first_name='Sue', last_name='Hope')
+        self.webhook = Webhook.objects.create(name='Chat', url=self.receiver.url, kinds='match', secret='s3cret')
+
+    def play(self, num_matches=1):
+        for _ in range(num_matches):
+            Match.objects.create(winner=self.player1, loser=self.player2, winning_score=7, losing_score=3)
+
+    def test_only_new_changes_are_sent(self):
+        """Test that a new webhook doesn't get the changes made before it."""
+        self.assertEqual(webhooks.dispatch(), 0)
+        self.assertEqual(self.receiver.requests, [])
+
+    def test_matches_are_delivered(self):
+        """Test that new matches are sent and not sent again."""
+        self.play(2)
+        self.assertEqual(webhooks.dispatch(), 2)
+        changes = self.receiver.changes()
+        self.assertEqual([change['kind'] for change in changes], ['match', 'match'])
+        self.assertEqual(changes[0]['data']['winner_id'], self.player1.id)
+        self.assertEqual(webhooks.dispatch(), 0)
+        self.assertEqual(len(self.receiver.requests), 1)
+
+    def test_batches(self):
+        """Test that pending changes are sent in batches."""
+        self.play(5)
+        self.assertEqual(webhooks.dispatch(batch_size=2), 5)
+        self.assertEqual([len(json.loads(body)['changes']) for _, body in self.receiver.requests], [2, 2, 1])
+
+    def test_signature(self):
+        """Test that batches are signed with the webhook secret."""
+        self.play()
+        webhooks.dispatch()
+        headers, body = self.receiver.requests[0]
+        self.assertEqual(headers[webhooks.SIGNATURE_HEADER], webhooks.sign('s3cret', body))
+
+    @override_settings(LEADERBOARD_WEBHOOK_RETRY_SECONDS=30)
+    def test_failed_delivery_is_retried_with_backoff(self):
+        """Test that a failing receiver gets the same batch again after a growing delay."""
+        self.receiver.status = 500
+        self.play()
+        with self.assertLogs('leaderboard.webhooks', 'WARNING'):
+            self.assertEqual(webhooks.dispatch(), 0)
+        self.webhook.refresh_from_db()
+        self.assertEqual(self.webhook.failures, 1)
+        self.assertIn('500', self.webhook.last_error)
+        self.assertGreater(self.webhook.next_attempt, timezone.now() + timedelta(seconds=20))
+        self.assertEqual(webhooks.dispatch(), 0)  # not due yet
+        self.assertEqual(len(self.receiver.requests), 1)
+
+        Webhook.objects.update(next_attempt=timezone.now())
+        self.receiver.status = 200
+        self.assertEqual(webhooks.dispatch(), 1)
+        self.assertEqual(self.receiver.changes(0), self.receiver.changes(1))
+        self.webhook.refresh_from_db()
+        self.assertEqual((self.webhook.failures, self.webhook.last_error), (0, ''))
+
+    def test_unreachable_receiver(self):
+        """Test that an unreachable receiver is retried later."""
+        self.receiver.close()
+        self.play()
+        with self.assertLogs('leaderboard.webhooks', 'WARNING'):
+            self.assertEqual(webhooks.dispatch(timeout=1), 0)
+        self.assertEqual(Webhook.objects.get().failures, 1)
+
+    def test_backoff_is_capped(self):
+        """Test that the retry delay doubles up to the maximum."""
+        with self.settings(LEADERBOARD_WEBHOOK_RETRY_SECONDS=30, LEADERBOARD_WEBHOOK_MAX_RETRY_SECONDS=100):
+            self.assertEqual([webhooks.backoff(n).seconds for n in range(1, 5)], [30, 60, 100, 100])
+
+    def test_filters(self):
+        """Test that webhooks only get changes of their league and kinds."""
+        office = League.objects.create(name='Office', slug='office')
+        Webhook.objects.create(name='Office', url=self.receiver.url, league=office)
+        self.play()
+        webhooks.dispatch()
+        self.assertEqual(len(self.receiver.requests), 1)
+        self.assertEqual({change['kind'] for change in self.receiver.changes()}, {ChangeLogEntry.MATCH})
+
+    def test_cursors_are_per_league(self):
+        """Test that every league is delivered from its own cursor, including leagues added later."""
+        office = League.objects.create(name='Office', slug='office')
+        joe = Player.objects.create(league=office, first_name='Joe', last_name='Hope')
+        ann = Player.objects.create(league=office, first_name='Ann', last_name='Hope')
+        self.play()
+        Match.objects.create(winner=joe, loser=ann, winning_score=7, losing_score=3)
+        self.assertEqual(webhooks.dispatch(), 2)
+        changes = self.receiver.changes()
+        self.assertEqual([(change['league_id'], change['seq']) for change in changes], [
+            (self.player1.league_id, ChangeLogEntry.objects.get(kind='match', league_id=self.player1.league_id).seq),
+            (office.id, ChangeLogEntry.objects.get(kind='match', league=office).seq),
+        ])
+        self.assertEqual(dict(self.webhook.cursors.values_list('league_id', 'last_seq')), {
+            change['league_id']: change['seq'] for change in changes
+        })
+        self.play()
+        self.assertEqual(webhooks.dispatch(), 1)
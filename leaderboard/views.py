@@ -1,33 +1,80 @@
-from django.shortcuts import render, redirect
+import uuid
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import transaction
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.utils.http import urlencode
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
 
-from leaderboard.models import Match, PlayerRating
+from leaderboard import metrics
+from leaderboard.models import (
+    RANKED_MIN_GAMES, League, Match, PlayerRating, RequestProfile, SubmissionKey, Webhook,
+)
 from leaderboard.forms import MatchForm, PlayerForm
+from leaderboard.caching import RATING_INTERVALS, get_for_ratings
+from leaderboard.ratelimit import write_rate_limited
+
 
+def get_league(league_slug=None):
+    """Return the league of the given slug, or the default league for the root URLs."""
+    if league_slug is None:
+        return League.get_default()
+    return get_object_or_404(League, slug=league_slug)
 
-def home_page(request):
+
+@write_rate_limited
+def home_page(request, league_slug=None):
     """Render view for home page."""
-    recent_matches = Match.get_recent_matches(num_matches=20)
-    rated_players = PlayerRating.objects.all().order_by('-rating')
-    ranked_players = [player for player in rated_players if player.games_played >= 5]
-    unranked_players = [player for player in rated_players if player.games_played < 5]
-    match_form = MatchForm()
-    player_form = PlayerForm()
+    league = get_league(league_slug)
+    match_form = player_form = None
     if request.method == 'POST':
         if 'winner' in request.POST:  # only occurs for match submissions
-            match_form = MatchForm(request.POST)
+            match_form = MatchForm(request.POST, league=league)
             if match_form.is_valid():
-                match_form.save()
-                return redirect('/')
+                idempotency_key = request.POST.get('idempotency_key')
+                with transaction.atomic():
+                    if idempotency_key and request.user.is_authenticated:
+                        request_hash = SubmissionKey.hash_request(urlencode(sorted(
+                            (field, value) for field, value in request.POST.items()
+                            if field not in ('csrfmiddlewaretoken', 'idempotency_key')
+                        )))
+                        if not SubmissionKey.claim(request.user, idempotency_key, request_hash):
+                            # occurs for retried posts, which have nothing left to save
+                            previous = SubmissionKey.get_previous(request.user, idempotency_key)
+                            if previous is not None and previous.request_hash != request_hash:
+                                return HttpResponse('This form was already submitted with another result.',
+                                                    status=422, content_type='text/plain')
+                            return redirect(request.path)
+                    match_form.save()
+                return redirect(request.path)
         elif 'first_name' in request.POST:  # only occurs for player submissions
-            player_form = PlayerForm(request.POST)
+            player_form = PlayerForm(request.POST, league=league)
             if player_form.is_valid():
                 player_form.save()
-                return redirect('/')
-    return render(
+                return redirect(request.path)
+    # the page is only built when rendered, successful posts redirect before
+    recent_matches = Match.get_recent_matches(num_matches=20, league_id=league.id)
+    # one row of stats per player from a few grouped queries, not a query per player and stat
+    rated_players = PlayerRating.get_leaderboard(league.id)
+    # filled in the background by compute_rating_intervals
+    rating_intervals = get_for_ratings(RATING_INTERVALS, league.id, {})
+    for rated_player in rated_players:
+        rated_player['interval'] = rating_intervals.get(rated_player['id'])
+    ranked_players = [player for player in rated_players if player['games_played'] >= RANKED_MIN_GAMES]
+    unranked_players = [player for player in rated_players if player['games_played'] < RANKED_MIN_GAMES]
+    if match_form is None:
+        match_form = MatchForm(league=league)
+    if player_form is None:
+        player_form = PlayerForm(league=league)
+    return TemplateResponse(
         request,
         'home.html',
         context={
+            'league': league,
+            'idempotency_key': uuid.uuid4().hex,  # one per rendered form, so retries of a post share it
             'recent_matches': recent_matches,
             'match_form': match_form,
             'player_form': player_form,
@@ -37,9 +84,10 @@ def home_page(request):
     )
 
 
-def all_matches(request):
+def all_matches(request, league_slug=None):
     """Render page to view all matches."""
-    all_matches = Match.objects.all().order_by('-datetime')
+    league = get_league(league_slug)
+    all_matches = Match.objects.filter(league=league).select_related('winner', 'loser').order_by('-datetime')
     paginator = Paginator(all_matches, per_page=50)
     page = request.GET.get('page')
     try:
@@ -48,10 +96,37 @@ def all_matches(request):
         matches = paginator.page(1)
     except EmptyPage:  # occurs when page is out of range
         matches = paginator.page(paginator.num_pages)  # deliver last page of results
-    return render(
+    return TemplateResponse(
         request,
         'all_matches.html',
         context={
+            'league': league,
             'matches': matches
         }
     )
+
+
+@staff_member_required
+def download_profile(request, profile_id):
+    """Download a stored request profile, as pstats data or with format=text as the text reports."""
+    profile = get_object_or_404(RequestProfile, pk=profile_id)
+    if request.GET.get('format') == 'text':
+        return HttpResponse(
+            f'{profile}\n\n{profile.summary}\n{profile.allocations}', content_type='text/plain; charset=utf-8'
+        )
+    response = HttpResponse(bytes(profile.stats), content_type='application/octet-stream')
+    response['Content-Disposition'] = f'attachment; filename="profile-{profile.id}.prof"'
+    return response
+
+
+def prometheus_metrics(request):
+    """Render the metrics of all workers of this host in the Prometheus text format."""
+    token = settings.LEADERBOARD_METRICS_TOKEN
+    if token and request.META.get('HTTP_AUTHORIZATION') != f'Bearer {token}':
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    values = metrics.collect()
+    for webhook in Webhook.objects.filter(active=True):  # read from the database, the same on every host
+        values[('pongboard_webhook_pending_changes', (('webhook', webhook.name),))] = (
+            webhook.get_pending_changes().count()
+        )
+    return HttpResponse(metrics.render(values), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,91 @@
+"""
+Delivery of change log entries to webhook receivers.
+
+Runs from `manage.py dispatch_webhooks`, outside the request cycle, so slow
+or unreachable receivers never add latency to match submission. Each
+webhook gets its pending changes in batches as one JSON POST; a failed batch
+is retried with exponential backoff and resent in full, so receivers should
+ignore entries with a ``seq`` they already processed. Sequence numbers are
+counted per league, so receivers of several leagues keep one per
+``league_id``.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import urllib.error
+import urllib.request
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from leaderboard.models import Webhook
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'X-Pongboard-Signature'
+
+
+def sign(secret, body):
+    """Return the signature header value of a request body."""
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def post(webhook, changes, timeout):
+    """POST a batch of changes to the receiver, raising on connection errors and non 2xx responses."""
+    body = json.dumps({'webhook': webhook.name, 'changes': changes}, cls=DjangoJSONEncoder).encode()
+    request = urllib.request.Request(webhook.url, data=body, method='POST', headers={
+        'Content-Type': 'application/json', 'User-Agent': 'pongboard-webhooks',
+    })
+    if webhook.secret:
+        request.add_header(SIGNATURE_HEADER, sign(webhook.secret, body))
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+def backoff(failures):
+    """Return the delay before the next attempt after a number of consecutive failures."""
+    return timedelta(seconds=min(settings.LEADERBOARD_WEBHOOK_RETRY_SECONDS * 2 ** (failures - 1),
+                                 settings.LEADERBOARD_WEBHOOK_MAX_RETRY_SECONDS))
+
+
+def deliver(webhook, batch_size, timeout, max_batches=10):
+    """
+    Send the pending changes of the webhook in batches and return the number delivered.
+
+    Stops at the first failed batch and schedules the next attempt with backoff.
+    """
+    delivered = 0
+    for _ in range(max_batches):
+        changes = webhook.get_pending(batch_size)
+        if not changes:
+            break
+        try:
+            post(webhook, changes, timeout)
+        except (urllib.error.URLError, OSError, ValueError) as e:  # HTTPError is a URLError
+            webhook.failures += 1
+            webhook.next_attempt = timezone.now() + backoff(webhook.failures)
+            webhook.last_error = str(e)
+            Webhook.objects.filter(pk=webhook.pk).update(
+                failures=webhook.failures, next_attempt=webhook.next_attempt, last_error=webhook.last_error,
+            )
+            logger.warning('Delivering %d changes to webhook %s failed: %s', len(changes), webhook, e)
+            break
+        webhook.advance(changes)
+        webhook.failures = 0
+        webhook.last_error = ''
+        Webhook.objects.filter(pk=webhook.pk).update(failures=0, last_error='')
+        delivered += len(changes)
+    return delivered
+
+
+def dispatch(batch_size=None, timeout=None):
+    """Deliver the pending changes of every active webhook due for an attempt and return the number delivered."""
+    batch_size = batch_size or settings.LEADERBOARD_WEBHOOK_BATCH_SIZE
+    timeout = timeout or settings.LEADERBOARD_WEBHOOK_TIMEOUT
+    return sum(
+        deliver(webhook, batch_size, timeout)
+        for webhook in Webhook.objects.filter(active=True, next_attempt__lte=timezone.now())
+    )
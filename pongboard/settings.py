@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 """
 
 import os
+import tempfile
 import dj_database_url
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -54,6 +55,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'leaderboard.middleware.ProfilingMiddleware',
+    'leaderboard.middleware.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'pongboard.urls'
@@ -89,6 +92,23 @@ DATABASES = {
     }
 }
 
+# Cache shared by all workers and management commands (create with `manage.py createcachetable`),
+# and the fast cache of the live scoring state, which changes on every rally: Redis at REDIS_URL
+# (needs django-redis) or, for a single web process, this process' memory
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'leaderboard_cache',
+    },
+    'live': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    } if os.environ.get('REDIS_URL') else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'leaderboard-live',
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -134,5 +154,85 @@ STATIC_URL = '/static/'
 # Redirect to home URL after login (Default redirects to /accounts/profile/)
 LOGIN_REDIRECT_URL = '/'
 
-# Configure database according to env
-DATABASES['default'].update(dj_database_url.config(conn_max_age=500))
+# Rating system used for the leaderboard: 'elo', 'glicko2' or 'trueskill'
+LEADERBOARD_RATING_SYSTEM = os.environ.get('LEADERBOARD_RATING_SYSTEM', 'elo')
+
+# Length in days of a rating period for the batch rating systems (glicko2, trueskill)
+LEADERBOARD_RATING_PERIOD_DAYS = int(os.environ.get('LEADERBOARD_RATING_PERIOD_DAYS', 7))
+
+# Processes used to replay disconnected groups of players concurrently in a full Elo recompute,
+# for histories of at least LEADERBOARD_PARALLEL_REPLAY_MIN_MATCHES matches
+LEADERBOARD_REPLAY_WORKERS = int(os.environ.get('LEADERBOARD_REPLAY_WORKERS', os.cpu_count() or 1))
+LEADERBOARD_PARALLEL_REPLAY_MIN_MATCHES = int(os.environ.get('LEADERBOARD_PARALLEL_REPLAY_MIN_MATCHES', 5000))
+
+# Matches played within this many days count as recent repeats for match suggestions
+LEADERBOARD_MATCHMAKING_RECENT_DAYS = 7
+
+# Seconds to keep results derived from the ratings (they are also keyed on the ratings version)
+LEADERBOARD_RESULTS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Weekly inactivity decay applied by `manage.py apply_rating_decay` to players who haven't played
+# for LEADERBOARD_DECAY_INACTIVE_WEEKS (unset disables it); ratings never decay below the floor
+LEADERBOARD_DECAY_INACTIVE_WEEKS = (
+    int(os.environ['LEADERBOARD_DECAY_INACTIVE_WEEKS']) if os.environ.get('LEADERBOARD_DECAY_INACTIVE_WEEKS') else None
+)
+LEADERBOARD_DECAY_POINTS = int(os.environ.get('LEADERBOARD_DECAY_POINTS', 10))
+LEADERBOARD_DECAY_FLOOR = int(os.environ.get('LEADERBOARD_DECAY_FLOOR', 1450))
+
+# Seconds between checks of the change log for live leaderboard streams, and between keepalive
+# comments on idle streams; streams are served by gevent workers (see the stream process in the Procfile)
+LEADERBOARD_STREAM_POLL_SECONDS = float(os.environ.get('LEADERBOARD_STREAM_POLL_SECONDS', 1))
+LEADERBOARD_STREAM_KEEPALIVE_SECONDS = 15
+
+# Live point-by-point scoring keeps each game's state in the live cache for LEADERBOARD_LIVE_TIMEOUT
+# seconds and writes its point log to the database every few points or seconds
+LEADERBOARD_LIVE_FLUSH_POINTS = 10
+LEADERBOARD_LIVE_FLUSH_SECONDS = 30
+LEADERBOARD_LIVE_TIMEOUT = 60 * 60 * 6
+
+# Token bucket limits of match and player submissions, per client (user or address) and across
+# all clients; a limit of 0 writes per minute disables it
+LEADERBOARD_USER_WRITES_PER_MINUTE = int(os.environ.get('LEADERBOARD_USER_WRITES_PER_MINUTE', 30))
+LEADERBOARD_USER_WRITE_BURST = 10
+LEADERBOARD_GLOBAL_WRITES_PER_MINUTE = int(os.environ.get('LEADERBOARD_GLOBAL_WRITES_PER_MINUTE', 600))
+LEADERBOARD_GLOBAL_WRITE_BURST = 60
+# Proxies in front of the app that add the client address to X-Forwarded-For, such as the
+# ingress; 0 uses the address of the connection
+LEADERBOARD_TRUSTED_PROXIES = int(os.environ.get('LEADERBOARD_TRUSTED_PROXIES', 0))
+
+# Webhooks are delivered by `manage.py dispatch_webhooks` in batches of up to
+# LEADERBOARD_WEBHOOK_BATCH_SIZE changes; failed batches are retried after a delay doubling
+# from LEADERBOARD_WEBHOOK_RETRY_SECONDS up to LEADERBOARD_WEBHOOK_MAX_RETRY_SECONDS
+LEADERBOARD_WEBHOOK_BATCH_SIZE = 100
+LEADERBOARD_WEBHOOK_TIMEOUT = 5
+LEADERBOARD_WEBHOOK_RETRY_SECONDS = 30
+LEADERBOARD_WEBHOOK_MAX_RETRY_SECONDS = 60 * 60
+
+# Query count and wall time (ms) budgets per view function; requests over budget are logged
+LEADERBOARD_VIEW_BUDGETS = {
+    'home_page': {'queries': 10, 'ms': 500},
+    'all_matches': {'queries': 10, 'ms': 500},
+}
+LEADERBOARD_DEFAULT_VIEW_BUDGET = {'queries': 50, 'ms': 1000}
+
+# Idempotency keys of match submissions are kept for LEADERBOARD_SUBMISSION_KEY_SECONDS, within
+# which retries with the same key get the first result
+LEADERBOARD_SUBMISSION_KEY_SECONDS = 60 * 60 * 24
+
+# Staff users can profile a request with ?profile=1 or an X-Profile: 1 header; the newest
+# LEADERBOARD_PROFILES_KEPT reports are kept for download from /profiles/<id>/
+LEADERBOARD_PROFILES_KEPT = 50
+LEADERBOARD_PROFILE_TRACEBACK_FRAMES = 1
+
+# Prometheus metrics: every worker process writes its metrics to a file in LEADERBOARD_METRICS_DIR
+# (shared by the workers of one host) every few seconds, and /metrics merges them; set
+# LEADERBOARD_METRICS_TOKEN to require "Authorization: Bearer <token>" for scrapes
+LEADERBOARD_METRICS_DIR = os.environ.get(
+    'LEADERBOARD_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'pongboard-metrics')
+)
+LEADERBOARD_METRICS_FLUSH_SECONDS = 5
+LEADERBOARD_METRICS_TOKEN = os.environ.get('LEADERBOARD_METRICS_TOKEN', '')
+
+# Configure database according to env; every web thread keeps its own connection open for
+# DATABASE_CONN_MAX_AGE seconds (see gunicorn.conf.py for the number of threads)
+DATABASES['default'].update(dj_database_url.config(conn_max_age=int(os.environ.get('DATABASE_CONN_MAX_AGE', 500))))
@@ -17,11 +17,34 @@ Including another URLconf
 from django.conf.urls import url, include
 from django.contrib import admin
 
-from leaderboard.views import home_page, all_matches
+from leaderboard.views import home_page, all_matches, download_profile, prometheus_metrics
+from leaderboard import api
+
+# served at the root for the default league and under leagues/<slug>/ for every league
+league_urlpatterns = [
+    url(r'^$', view=home_page, name='home'),
+    url(r'^matches/', view=all_matches, name='all_matches'),
+    url(r'^api/leaderboard/$', view=api.leaderboard, name='api_leaderboard'),
+    url(r'^api/players/$', view=api.players, name='api_players'),
+    url(r'^api/players/(?P<player_id>\d+)/$', view=api.player, name='api_player'),
+    url(r'^api/matches/$', view=api.matches, name='api_matches'),
+    url(r'^api/matches/batch/$', view=api.submit_matches, name='api_submit_matches'),
+    url(r'^api/changes/$', view=api.changes, name='api_changes'),
+    url(r'^api/stream/$', view=api.stream, name='api_stream'),
+    url(r'^api/live/$', view=api.live_games, name='api_live_games'),
+    url(r'^api/live/(?P<game_id>\d+)/$', view=api.live_game, name='api_live_game'),
+    url(r'^api/live/(?P<game_id>\d+)/point/$', view=api.live_point, name='api_live_point'),
+    url(r'^api/live/(?P<game_id>\d+)/finish/$', view=api.finish_live_game, name='api_finish_live_game'),
+    url(r'^api/odds/$', view=api.season_odds, name='api_season_odds'),
+    url(r'^api/win-probabilities/$', view=api.win_probabilities, name='api_win_probabilities'),
+    url(r'^api/suggested-matches/$', view=api.suggested_matches, name='api_suggested_matches'),
+]
 
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
-    url(r'^$', view=home_page, name='home'),
     url(r'accounts/', include('django.contrib.auth.urls')),
-    url(r'matches/', view=all_matches, name='all_matches'),
+    url(r'^metrics$', view=prometheus_metrics, name='metrics'),
+    url(r'^profiles/(?P<profile_id>\d+)/$', view=download_profile, name='download_profile'),
+    url(r'^leagues/(?P<league_slug>[-\w]+)/', include(league_urlpatterns)),
+    url(r'^', include(league_urlpatterns)),
 ]